@@ -1,13 +1,14 @@
-from flask import Flask, send_from_directory
+from flask import Flask, send_from_directory, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_wtf.csrf import CSRFProtect
 from config import Config
+from app.replicas import RoutingSession
 import os
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 csrf = CSRFProtect()
@@ -16,8 +17,17 @@ def create_app(config_class=Config):
     app = Flask(__name__, static_folder='../../dist/public', static_url_path='')
     app.config.from_object(config_class)
     
+    # Pool sizing, recycling, pre-ping and statement timeout from the DB_POOL_* settings
+    from app.db_pool import engine_options, pool_monitor, ping
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    
+    # Read replicas for the SELECTs of GET requests
+    from app.replicas import replica_router
+    replica_router.init_app(app)
+    
     # Initialize extensions
     db.init_app(app)
+    pool_monitor.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     
@@ -33,6 +43,28 @@ def create_app(config_class=Config):
     from app.routes import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # Broadcast cache invalidations to the other workers; with a bus, caches can keep entries longer
+    from app.invalidation import invalidation_bus, BUS_CACHE_TTL
+    from app.principals import principal_cache, PRINCIPAL_TTL
+    from app.slot_index import free_slot_index, INDEX_MAX_AGE
+    from app.directory import doctor_directory, DIRECTORY_MAX_AGE
+    invalidation_bus.init_app(app)
+    principal_cache.ttl = BUS_CACHE_TTL if invalidation_bus.broadcasting else PRINCIPAL_TTL
+    free_slot_index.max_age = BUS_CACHE_TTL if invalidation_bus.broadcasting else INDEX_MAX_AGE
+    doctor_directory.max_age = BUS_CACHE_TTL if invalidation_bus.broadcasting else DIRECTORY_MAX_AGE
+    
+    # Hash passwords in a process pool instead of on the request threads
+    from app.passwords import password_hasher
+    password_hasher.init_app(app)
+    
+    # Rate limits and load shedding for the auth and booking routes
+    from app.rate_limits import rate_limiter
+    rate_limiter.init_app(app)
+    
+    # Replay stored responses to booking requests retried with the same Idempotency-Key
+    from app.idempotency import idempotency_store
+    idempotency_store.init_app(app)
+    
     # Exempt specific routes from CSRF protection if needed
     from app.routes import availability_routes, profile_routes
     csrf.exempt(availability_routes)
@@ -53,6 +85,36 @@ def create_app(config_class=Config):
     def health_check():
         return {'status': 'ok'}, 200
     
+    # Readiness for load balancers: the primary and every read replica answer and this worker has
+    # a free connection. A saturated pool is reported without waiting for a connection, so the
+    # probe stays fast.
+    @app.route('/ready')
+    def readiness_check():
+        from sqlalchemy.exc import SQLAlchemyError
+        pool = pool_monitor.stats(db.engine.pool)
+        if pool.get('saturated'):
+            return {'status': 'saturated', 'pool': pool}, 503
+        try:
+            database = {'latency_ms': round(ping(db.engine) * 1000, 2)}
+            if replica_router.replicas:
+                database['replicas'] = {key: {'latency_ms': round(ping(db.engines[key]) * 1000, 2)}
+                                        for key in replica_router.replicas}
+        except SQLAlchemyError as e:
+            current_app.logger.warning("Readiness check failed: %s", e)
+            return {'status': 'unavailable', 'pool': pool}, 503
+        return {'status': 'ready', 'database': database, 'pool': pool_monitor.stats(db.engine.pool)}, 200
+    
+    # Per-worker counters: public reads coalesced into another request's query, requests refused
+    # by the rate limits, the adaptive concurrency limits of the auth and booking routes and
+    # booking retries answered from the idempotency store, the database connection pool and the
+    # statements sent to the primary and to read replicas
+    @app.route('/metrics')
+    def metrics():
+        from app.single_flight import public_reads
+        return {'single_flight': public_reads.stats(), 'rate_limits': rate_limiter.stats(),
+                'idempotency': idempotency_store.stats(), 'db_pool': pool_monitor.stats(db.engine.pool),
+                'replicas': replica_router.stats()}, 200
+    
     # Add a route for session-based auth
     @app.route('/api/user', methods=['GET'])
     def current_user_route():
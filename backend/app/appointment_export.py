@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import User, Appointment
+from app.timezones import utc_to_chicago_isoformats
+
+# Rows fetched from the server-side cursor per round trip; memory use is bounded by this, not by the range
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Exported fields, in CSV column order; the same keys as Appointment.to_dict() plus both names
+EXPORT_FIELDS = ('id', 'patientId', 'patientName', 'doctorId', 'doctorName',
+                 'date', 'duration', 'type', 'status', 'notes')
+
+def export_query(doctor_id=None, patient_id=None):
+    """Appointments joined with doctor and patient names, selected as plain columns.
+    Plain rows are not kept in the session's identity map, so streaming them holds no ORM state."""
+    doctor = aliased(User)
+    patient = aliased(User)
+    query = db.session.query(
+        Appointment.id, Appointment.patient_id, patient.full_name,
+        Appointment.doctor_id, doctor.full_name,
+        Appointment.date, Appointment.duration, Appointment.type, Appointment.status, Appointment.notes
+    ).outerjoin(doctor, doctor.id == Appointment.doctor_id)\
+        .outerjoin(patient, patient.id == Appointment.patient_id)
+    if doctor_id is not None:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    if patient_id is not None:
+        query = query.filter(Appointment.patient_id == patient_id)
+    return query
+
+def export_records(rows):
+    """Exported fields of a batch of export_query rows, converting their dates together"""
+    dates = utc_to_chicago_isoformats([row[5] for row in rows])
+    return [export_record(row, date) for row, date in zip(rows, dates)]
+
+def export_record(row, date):
+    """Exported fields of one export_query row, given its date already rendered in Chicago time"""
+    appointment_id, patient_id, patient_name, doctor_id, doctor_name, _, duration, type_, status, notes = row
+    return {
+        'id': appointment_id,
+        'patientId': patient_id,
+        'patientName': patient_name,
+        'doctorId': doctor_id,
+        'doctorName': doctor_name,
+        'date': date,
+        'duration': duration,
+        'type': type_,
+        'status': status,
+        'notes': notes
+    }
+
+def iter_export_rows(query, batch_size=EXPORT_BATCH_SIZE):
+    """Run an export query ordered by (date, id) and yield its rows batch by batch.
+    yield_per streams from a server-side cursor where the driver supports one (psycopg2 named cursors)."""
+    statement = query.order_by(Appointment.date, Appointment.id).statement
+    result = db.session.execute(statement, execution_options={'yield_per': batch_size})
+    for partition in result.partitions():
+        yield partition
+
+def stream_appointments(query, fmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield an export query as NDJSON lines or CSV text, one chunk of output per batch of rows"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        for rows in iter_export_rows(query, batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(export_records(rows))
+            yield buffer.getvalue()
+        return
+
+    for rows in iter_export_rows(query, batch_size):
+        yield ''.join(json.dumps(record) + '\n' for record in export_records(rows))
@@ -0,0 +1,250 @@
+import csv
+import json
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, Appointment
+from app.timezones import parse_iso_in_chicago
+from app.versions import bump_appointment_versions
+from app.booking import parse_duration
+
+# Rows resolved and inserted per statement; memory use is bounded by this, not by the file size
+IMPORT_CHUNK_SIZE = 1000
+
+# Per-row errors kept in the report (the count keeps going past this)
+IMPORT_MAX_ERRORS = 1000
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+APPOINTMENT_STATUSES = ('scheduled', 'completed', 'cancelled')
+
+class ImportReport:
+    """Running totals and per-row errors of an import"""
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errorsTruncated': self.failed > len(self.errors)
+        }
+
+def read_lines(stream):
+    """Yield (line number, text) for each line of a binary stream, with None as the text of
+    lines that aren't valid UTF-8"""
+    for line_number, raw in enumerate(stream, 1):
+        try:
+            yield line_number, raw.decode('utf-8')
+        except UnicodeDecodeError:
+            yield line_number, None
+
+def read_csv_records(stream):
+    """Yield (line number, record, error) for each row of a binary CSV stream. Undecodable lines
+    and malformed rows are reported as errors and reading carries on with the next line."""
+    position = {'line': 0}
+    undecodable = []
+
+    def texts():
+        for line_number, text in read_lines(stream):
+            position['line'] = line_number
+            if text is None:
+                undecodable.append(line_number)
+            else:
+                yield text
+
+    reader = csv.DictReader(texts())
+    while True:
+        error = None
+        try:
+            record = next(reader)
+        except StopIteration:
+            record = None
+        except csv.Error as e:
+            record, error = None, f'Invalid CSV: {e}'
+        for line_number in undecodable:
+            yield line_number, None, 'Invalid UTF-8'
+        undecodable.clear()
+        if record is None and error is None:
+            return
+        yield position['line'], record, error
+
+def read_records(stream, fmt):
+    """Yield (line number, record, error) for each row of a binary CSV or NDJSON stream"""
+    if fmt == 'csv':
+        yield from read_csv_records(stream)
+        return
+
+    for line_number, line in read_lines(stream):
+        if line is None:
+            yield line_number, None, 'Invalid UTF-8'
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'Invalid JSON'
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'Each line must be a JSON object'
+            continue
+        yield line_number, record, None
+
+def field(record, name):
+    """A field of a record with empty CSV cells treated as missing"""
+    value = record.get(name)
+    return None if value == '' else value
+
+def user_lookups(records):
+    """Resolve every doctor/patient reference in a chunk of records with one query"""
+    ids, usernames, emails = set(), set(), set()
+    for record in records:
+        for prefix in ('doctor', 'patient'):
+            try:
+                if field(record, f'{prefix}Id') is not None:
+                    ids.add(int(field(record, f'{prefix}Id')))
+            except (TypeError, ValueError):
+                pass
+            if field(record, f'{prefix}Username') is not None:
+                usernames.add(str(field(record, f'{prefix}Username')))
+            if field(record, f'{prefix}Email') is not None:
+                emails.add(str(field(record, f'{prefix}Email')))
+
+    lookups = {'id': {}, 'username': {}, 'email': {}}
+    if not (ids or usernames or emails):
+        return lookups
+
+    users = User.query.with_entities(User.id, User.username, User.email, User.role)\
+        .filter(or_(User.id.in_(ids), User.username.in_(usernames), User.email.in_(emails)))\
+        .all()
+    for user in users:
+        lookups['id'][user.id] = user
+        lookups['username'][user.username] = user
+        lookups['email'][user.email] = user
+    return lookups
+
+def resolve_user(record, prefix, role, lookups):
+    """Id of the doctor or patient a record refers to by id, username or email"""
+    if field(record, f'{prefix}Id') is not None:
+        try:
+            user = lookups['id'].get(int(field(record, f'{prefix}Id')))
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid {prefix}Id')
+    elif field(record, f'{prefix}Username') is not None:
+        user = lookups['username'].get(str(field(record, f'{prefix}Username')))
+    elif field(record, f'{prefix}Email') is not None:
+        user = lookups['email'].get(str(field(record, f'{prefix}Email')))
+    else:
+        return None
+
+    if user is None or user.role != role:
+        raise ValueError(f'{prefix.capitalize()} not found')
+    return user.id
+
+def build_row(record, lookups, doctor_id=None):
+    """Validate a record and return the appointments row to insert, raising ValueError with the reason"""
+    record_doctor_id = resolve_user(record, 'doctor', 'doctor', lookups)
+    if doctor_id is not None:
+        if record_doctor_id not in (None, doctor_id):
+            raise ValueError('Can only import your own appointments')
+        record_doctor_id = doctor_id
+    if record_doctor_id is None:
+        raise ValueError('Missing doctorId, doctorUsername or doctorEmail')
+
+    patient_id = resolve_user(record, 'patient', 'patient', lookups)
+    if patient_id is None:
+        raise ValueError('Missing patientId, patientUsername or patientEmail')
+
+    if field(record, 'date') is None or field(record, 'type') is None:
+        raise ValueError('Missing required fields')
+
+    try:
+        date = parse_iso_in_chicago(str(field(record, 'date')))
+    except ValueError:
+        raise ValueError('Invalid date format. Use ISO format')
+
+    try:
+        duration = int(field(record, 'duration') or 30)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid duration')
+    duration = parse_duration(duration)
+
+    status = field(record, 'status') or 'scheduled'
+    if status not in APPOINTMENT_STATUSES:
+        raise ValueError(f"Invalid status. Use one of: {', '.join(APPOINTMENT_STATUSES)}")
+
+    return {
+        'doctor_id': record_doctor_id,
+        'patient_id': patient_id,
+        'date': date,
+        'duration': duration,
+        'type': str(field(record, 'type')),
+        'status': status,
+        'notes': field(record, 'notes') or ''
+    }
+
+def import_chunk(chunk, report, doctor_id=None):
+    """Validate and insert one chunk of (line, record) pairs"""
+    lookups = user_lookups(record for _, record in chunk)
+
+    rows = []
+    for line, record in chunk:
+        try:
+            rows.append((line, build_row(record, lookups, doctor_id)))
+        except ValueError as e:
+            report.add_error(line, str(e))
+    if not rows:
+        return
+
+    try:
+        db.session.execute(insert(Appointment), [row for _, row in rows])
+        bump_appointment_versions({row[key] for _, row in rows for key in ('doctor_id', 'patient_id')})
+        db.session.commit()
+        report.imported += len(rows)
+    except IntegrityError:
+        # Some row clashes with an existing scheduled appointment; insert one by one to find it
+        db.session.rollback()
+        for line, row in rows:
+            try:
+                db.session.execute(insert(Appointment), [row])
+                bump_appointment_versions([row['doctor_id'], row['patient_id']])
+                db.session.commit()
+                report.imported += 1
+            except IntegrityError:
+                db.session.rollback()
+                report.add_error(line, 'Doctor already has a scheduled appointment at this time')
+
+def import_appointments(stream, fmt, doctor_id=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Stream appointments from a binary CSV or NDJSON stream into the database.
+
+    Rows reference doctors and patients by doctorId/doctorUsername/doctorEmail and
+    patientId/patientUsername/patientEmail, plus date (ISO, Chicago time when no offset),
+    type, and optional duration, status and notes. Rows are processed in chunks, each
+    resolved with one user query and inserted with one bulk statement and committed, so
+    invalid rows are reported without aborting the rest of the load. With `doctor_id`,
+    every row must belong to that doctor. Returns an ImportReport."""
+    report = ImportReport()
+    chunk = []
+    for line, record, error in read_records(stream, fmt):
+        report.processed += 1
+        if error:
+            report.add_error(line, error)
+            continue
+        chunk.append((line, record))
+        if len(chunk) >= chunk_size:
+            import_chunk(chunk, report, doctor_id)
+            chunk = []
+    if chunk:
+        import_chunk(chunk, report, doctor_id)
+    return report
@@ -0,0 +1,130 @@
+from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models import Availability
+from app.versions import bump_availability_version
+from app.slot_bitmap import slots_to_bitmap, range_to_bitmap, bitmap_bounds
+
+# Columns overwritten when an upserted entry already exists
+UPSERT_COLUMNS = ('day_of_week', 'start_time', 'end_time', 'is_available', 'available_slots', 'slot_bitmap')
+
+def parse_availability_entry(data):
+    """Validate one availability entry from the API and return the column values to store.
+    Raises ValueError with a client-facing message when the entry is invalid."""
+    # Check for required fields - support both the old format and new format with availableSlots
+    if not isinstance(data, dict) or not all(k in data for k in ('dayOfWeek', 'isAvailable')):
+        raise ValueError('Missing required fields')
+
+    # Check for either availableSlots or the start/end time pair
+    if 'availableSlots' not in data and not all(k in data for k in ('startTime', 'endTime')):
+        raise ValueError('Missing required fields. Either provide availableSlots or startTime/endTime')
+
+    if not isinstance(data['dayOfWeek'], int) or not 0 <= data['dayOfWeek'] <= 6:
+        raise ValueError('Invalid dayOfWeek. Use 0 (Sunday) to 6 (Saturday)')
+
+    # Encode the slots as a bitmap, which also checks that they sit on the 30-minute slot grid
+    available_slots = data.get('availableSlots') or []
+    try:
+        if not isinstance(available_slots, list):
+            raise TypeError(available_slots)
+        slot_bitmap = slots_to_bitmap(available_slots)
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError('Invalid availableSlots. Use HH:MM times on the 30-minute grid')
+
+    # Default startTime and endTime to the first and last slot; an empty slot list (a day off) has no bounds
+    if 'startTime' in data and 'endTime' in data:
+        start_time, end_time = data['startTime'], data['endTime']
+    else:
+        start_time, end_time = bitmap_bounds(slot_bitmap) or ('00:00', '00:00')
+
+    try:
+        range_bitmap = range_to_bitmap(start_time, end_time)
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError('Invalid startTime/endTime. Use HH:MM')
+
+    # If date is provided, we're dealing with a specific date availability
+    specific_date = None
+    if data.get('date'):
+        try:
+            specific_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            raise ValueError('Invalid date format. Use YYYY-MM-DD')
+
+    return {
+        'day_of_week': data['dayOfWeek'],
+        'date': specific_date,
+        'start_time': start_time,
+        'end_time': end_time,
+        'is_available': bool(data['isAvailable']),
+        # Stored as the client sent them ('8:00', not '08:00') so its pages can match them again;
+        # the bitmap is what the slot computations use
+        'available_slots': available_slots,
+        'slot_bitmap': slot_bitmap if slot_bitmap else range_bitmap
+    }
+
+def availability_key(values):
+    """Identity of an entry: its specific date, or its day of week for weekly rows"""
+    return ('date', values['date']) if values['date'] is not None else ('day', values['day_of_week'])
+
+def upsert_availability(doctor_id, entries):
+    """Insert or update parsed entries of one doctor in a single transaction.
+
+    Weekly rows and specific-date rows have different unique keys, so each kind is written with
+    one INSERT ... ON CONFLICT DO UPDATE. Returns [(availability, created)] in entry order.
+    Entries must have distinct keys."""
+    weekly = [values for values in entries if values['date'] is None]
+    dated = [values for values in entries if values['date'] is not None]
+
+    def matching_rows(query):
+        conditions = []
+        if weekly:
+            conditions.append(and_(Availability.date.is_(None),
+                                   Availability.day_of_week.in_([v['day_of_week'] for v in weekly])))
+        if dated:
+            conditions.append(Availability.date.in_([v['date'] for v in dated]))
+        return query.filter(Availability.doctor_id == doctor_id, or_(*conditions))
+
+    # Find out which entries already exist so the response can say created or updated
+    existing = {availability_key({'date': date, 'day_of_week': day})
+                for day, date in matching_rows(db.session.query(Availability.day_of_week, Availability.date))}
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        table = Availability.__table__
+        for rows, index_elements, index_where in (
+            (weekly, ['doctor_id', 'day_of_week'], table.c.date.is_(None)),
+            (dated, ['doctor_id', 'date'], table.c.date.isnot(None))
+        ):
+            if not rows:
+                continue
+            statement = insert(table).values([{**values, 'doctor_id': doctor_id} for values in rows])
+            # ON CONFLICT DO UPDATE doesn't apply column onupdate defaults, so bump them here
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                index_where=index_where,
+                set_={**{column: statement.excluded[column] for column in UPSERT_COLUMNS},
+                      'updated_at': datetime.utcnow(), 'version': table.c.version + 1}
+            )
+            db.session.execute(statement)
+    else:
+        # Other databases: the same result with a lookup per entry, still in one transaction
+        for values in entries:
+            if values['date'] is not None:
+                row = Availability.query.filter_by(doctor_id=doctor_id, date=values['date']).first()
+            else:
+                row = Availability.query.filter_by(doctor_id=doctor_id, day_of_week=values['day_of_week'],
+                                                   date=None).first()
+            if row is None:
+                row = Availability(doctor_id=doctor_id)
+                db.session.add(row)
+            for column, value in values.items():
+                setattr(row, column, value)
+
+    bump_availability_version(doctor_id)
+    db.session.commit()
+
+    rows = {availability_key({'date': row.date, 'day_of_week': row.day_of_week}): row
+            for row in matching_rows(Availability.query)}
+    return [(rows[availability_key(values)], availability_key(values) not in existing) for values in entries]
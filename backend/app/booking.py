@@ -0,0 +1,80 @@
+from datetime import timedelta
+import pytz
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, Appointment
+from app.slots import BOOKING_LOOKBACK
+from app.versions import bump_appointment_versions
+
+# How many times a booking is retried after losing a race on the unique slot index
+BOOKING_RETRIES = 2
+
+# Longest appointment in minutes. find_conflict only looks BOOKING_LOOKBACK back for
+# appointments that could still be running, so no appointment may be longer than that.
+MAX_DURATION = int(BOOKING_LOOKBACK.total_seconds() // 60)
+
+class BookingConflict(Exception):
+    """Raised when an appointment would overlap another scheduled appointment of the same doctor"""
+
+def as_utc(value):
+    """Treat naive datetimes (as stored) as UTC and return an aware UTC datetime"""
+    return pytz.utc.localize(value) if value.tzinfo is None else value.astimezone(pytz.utc)
+
+def parse_duration(value):
+    """Validate an appointment duration in minutes from the API.
+    Raises ValueError with a client-facing message unless it is an integer from 1 to MAX_DURATION."""
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_DURATION:
+        raise ValueError(f'Invalid duration. Use whole minutes from 1 to {MAX_DURATION}')
+    return value
+
+def lock_doctor(doctor_id):
+    """Serialize bookings for one doctor by locking the doctor's users row until commit.
+    Bookings for other doctors are not blocked. SQLite has no row locks, so there the
+    partial unique index on (doctor_id, date) is what catches concurrent bookings."""
+    db.session.query(User.id).filter(User.id == doctor_id).with_for_update().one_or_none()
+
+def find_conflict(appointment):
+    """Return the id of a scheduled appointment of the same doctor overlapping `appointment`, or None"""
+    start = as_utc(appointment.date)
+    end = start + timedelta(minutes=appointment.duration or 30)
+
+    query = db.session.query(Appointment.id, Appointment.date, Appointment.duration)\
+        .filter(
+            Appointment.doctor_id == appointment.doctor_id,
+            Appointment.status == 'scheduled',
+            Appointment.date >= start - BOOKING_LOOKBACK,
+            Appointment.date < end
+        )
+    if appointment.id is not None:
+        query = query.filter(Appointment.id != appointment.id)
+
+    for other_id, other_date, other_duration in query:
+        if as_utc(other_date) + timedelta(minutes=other_duration or 30) > start:
+            return other_id
+    return None
+
+def save_booking(apply_changes, check_conflicts=True):
+    """Commit a new or changed appointment unless it overlaps another booking of the doctor.
+
+    `apply_changes()` builds the new Appointment or applies the edits to an existing one and
+    returns it. It is called again on every retry because a rollback discards pending changes.
+    The appointment list versions of the doctor and patient are bumped in the same transaction.
+    Raises BookingConflict when the slot is taken."""
+    for attempt in range(BOOKING_RETRIES + 1):
+        appointment = apply_changes()
+        if check_conflicts and appointment.status == 'scheduled':
+            lock_doctor(appointment.doctor_id)
+            if find_conflict(appointment) is not None:
+                db.session.rollback()
+                raise BookingConflict()
+
+        db.session.add(appointment)
+        try:
+            bump_appointment_versions([appointment.doctor_id, appointment.patient_id])
+            db.session.commit()
+            return appointment
+        except IntegrityError:
+            # Another request booked the same start time between our check and commit
+            db.session.rollback()
+
+    raise BookingConflict()
@@ -0,0 +1,132 @@
+from collections import deque
+import threading
+import time
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Connection pool defaults, overridden by the DB_POOL_* settings in config.py
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30
+DB_POOL_RECYCLE = 1800
+
+# Milliseconds a Postgres statement may run before the server cancels it (0 for no limit)
+DB_STATEMENT_TIMEOUT_MS = 30000
+
+# Checkout waits kept for the percentiles in /metrics and /ready
+POOL_WAIT_WINDOW = 1000
+
+# A checkout waiting longer than this (seconds) means requests are queueing for connections
+POOL_SLOW_WAIT = 0.1
+
+def engine_options(config, url=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the app database (or the database at `url`) from the
+    DB_POOL_* settings.
+
+    Postgres and SQLite files get a TimedQueuePool of DB_POOL_SIZE connections plus
+    DB_MAX_OVERFLOW on demand, recycled after DB_POOL_RECYCLE seconds and (with
+    DB_POOL_PRE_PING) tested before use so a connection dropped by the server or a proxy
+    fails over to a new one instead of failing the request. On Postgres every connection also
+    gets statement_timeout. In-memory SQLite keeps the pool Flask-SQLAlchemy picks for it.
+    """
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': config.get('DB_POOL_PRE_PING', True)}
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=config.get('DB_POOL_SIZE', DB_POOL_SIZE),
+        max_overflow=config.get('DB_MAX_OVERFLOW', DB_MAX_OVERFLOW),
+        pool_timeout=config.get('DB_POOL_TIMEOUT', DB_POOL_TIMEOUT),
+        pool_recycle=config.get('DB_POOL_RECYCLE', DB_POOL_RECYCLE),
+    )
+    statement_timeout = config.get('DB_STATEMENT_TIMEOUT_MS', DB_STATEMENT_TIMEOUT_MS)
+    if statement_timeout and url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout)}'}
+    return options
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout took to pool_monitor: the wait for a free
+    connection plus, for a new one, connecting"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            pool_monitor.record(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_monitor.record(time.perf_counter() - started)
+        return record
+
+class PoolMonitor:
+    """Checkout wait statistics of this process's TimedQueuePool, with the pool's own counters"""
+
+    def __init__(self, window=POOL_WAIT_WINDOW):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self._reset()
+
+    def _reset(self):
+        self._waits.clear()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.slow = 0
+        self.max_wait = 0.0
+
+    def init_app(self, app):
+        with self._lock:
+            self._reset()
+
+    def record(self, elapsed, timed_out=False):
+        with self._lock:
+            self._waits.append(elapsed)
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.slow += elapsed > POOL_SLOW_WAIT
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def saturated(self, pool):
+        """Whether every connection the pool may open is checked out, so the next checkout waits"""
+        # max_overflow=-1 means no limit
+        if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+            return False
+        return pool.checkedout() >= pool.size() + pool._max_overflow
+
+    def stats(self, pool):
+        with self._lock:
+            waits = sorted(self._waits)
+            wait = {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'slow': self.slow,
+                'p50_ms': round(percentile(waits, 0.5) * 1000, 2),
+                'p99_ms': round(percentile(waits, 0.99) * 1000, 2),
+                'max_ms': round(self.max_wait * 1000, 2),
+            }
+        if not isinstance(pool, QueuePool):
+            return {'status': pool.status(), 'wait': wait}
+        return {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'saturated': self.saturated(pool),
+            'wait': wait,
+        }
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def ping(engine):
+    """Seconds a `SELECT 1` round trip takes on a pooled connection"""
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+    return time.perf_counter() - started
+
+# Shared by all requests of this process
+pool_monitor = PoolMonitor()
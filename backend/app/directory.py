@@ -0,0 +1,96 @@
+from collections import namedtuple
+import gzip
+import hashlib
+import threading
+import time
+from app import db
+from app.models import User
+from app.serializers import field_row, dumps
+from app.invalidation import invalidation_bus
+from app.replicas import primary
+
+# Public doctor directory fields that can be requested with ?fields=, mapped to User columns
+DOCTOR_DIRECTORY_FIELDS = {
+    'id': 'id',
+    'username': 'username',
+    'email': 'email',
+    'fullName': 'full_name',
+    'role': 'role',
+    'phone': 'phone',
+    'address': 'address',
+    'city': 'city',
+    'state': 'state',
+    'zipCode': 'zip_code',
+    'dateOfBirth': 'date_of_birth',
+    'gender': 'gender',
+    'profilePicture': 'profile_picture',
+    'specialization': 'specialization',
+    'licenseNumber': 'license_number',
+    'education': 'education',
+    'experienceYears': 'experience_years',
+    'hospitalAffiliation': 'hospital_affiliation',
+    'boardCertification': 'board_certification',
+    'bio': 'bio',
+    'consultationFee': 'consultation_fee'
+}
+
+# Rebuild the snapshot at least this often (seconds) to pick up writes the invalidation bus didn't deliver
+DIRECTORY_MAX_AGE = 300
+
+# Compression level of the pre-gzipped body; built once per change, so favour size over speed
+DIRECTORY_GZIP_LEVEL = 9
+
+# entries: every doctor's directory entry (all fields) ordered by id; body/gzipped: the JSON of the
+# unfiltered directory, plain and gzip-compressed; etag: a hash of body
+Snapshot = namedtuple('Snapshot', ['entries', 'body', 'gzipped', 'etag'])
+
+class DoctorDirectory:
+    """Materialized public doctor directory.
+
+    The whole directory is read with one query, serialized and gzipped once, and kept in
+    memory until a doctor is registered or changes their profile (the 'directory' entity on
+    the invalidation bus). The unfiltered listing is served from the stored bytes; filtered
+    and paginated listings are computed from the in-memory entries. Either way public reads
+    don't touch the database between rebuilds.
+    """
+
+    def __init__(self, max_age=DIRECTORY_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0
+        self._stale = True
+
+    def invalidate(self, doctor_id=None):
+        """Rebuild on the next read after a doctor's directory entry changed"""
+        self._stale = True
+
+    def current(self):
+        """The current Snapshot, rebuilt first if it is stale. Concurrent readers wait for one rebuild."""
+        with self._lock:
+            if self._stale or self._snapshot is None or time.monotonic() - self._built_at > self.max_age:
+                # Cleared before building so an invalidation during the build triggers another one
+                self._stale = False
+                # Kept until the next invalidation, so built from the primary rather than a lagging replica
+                with primary():
+                    self._snapshot = self._build()
+                self._built_at = time.monotonic()
+            return self._snapshot
+
+    def _build(self):
+        fields = list(DOCTOR_DIRECTORY_FIELDS)
+        columns = [getattr(User, column) for column in DOCTOR_DIRECTORY_FIELDS.values()]
+        rows = db.session.query(*columns).filter(User.role == 'doctor').order_by(User.id).all()
+        entries = [field_row(row, fields) for row in rows]
+
+        body = dumps(entries)
+        return Snapshot(
+            entries=entries,
+            body=body,
+            gzipped=gzip.compress(body, DIRECTORY_GZIP_LEVEL),
+            etag=hashlib.sha1(body).hexdigest()
+        )
+
+# Shared by all requests of this process
+doctor_directory = DoctorDirectory()
+invalidation_bus.subscribe('directory', doctor_directory.invalidate)
@@ -0,0 +1,197 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import wraps
+import hashlib
+import threading
+from flask import request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import IdempotencyKey
+
+# Seconds a stored response is replayed for retries of the same key
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# Seconds a key stays claimed by a request that hasn't finished (e.g. its worker died)
+IDEMPOTENCY_PENDING_TTL = 60
+
+# Longest Idempotency-Key accepted
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Keys claimed by this process between deletes of the expired ones
+IDEMPOTENCY_PURGE_EVERY = 1000
+
+# The outcome of a request, replayed for retries with the same key. fingerprint identifies the
+# request (method, path and body) so a reused key with different content is refused.
+StoredResponse = namedtuple('StoredResponse', ['fingerprint', 'status', 'body', 'mimetype'])
+
+# Results of IdempotencyStore.begin other than a StoredResponse
+NEW, PENDING, MISMATCH = 'new', 'pending', 'mismatch'
+
+# Columns a new claim writes over an expired key
+CLAIM_COLUMNS = ('fingerprint', 'status', 'body', 'mimetype', 'expires_at')
+
+class IdempotencyStore:
+    """(user id, Idempotency-Key) -> StoredResponse in the idempotency_keys table, so a retry is
+    answered the same whichever worker it reaches.
+
+    begin() claims a key for the request about to run with one INSERT ... ON CONFLICT that only
+    takes over expired keys; complete() stores its response and abandon() releases the key when
+    there is nothing worth replaying. Keys are scoped by user, so two clients can't see each
+    other's responses by guessing keys. Each call commits on a connection of its own, apart from
+    the request's session and its rollbacks.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, pending_ttl=IDEMPOTENCY_PENDING_TTL):
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.replayed = 0
+        self._claims = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('IDEMPOTENCY_TTL', IDEMPOTENCY_TTL)
+        with self._lock:
+            self.replayed = 0
+            self._claims = 0
+
+    def begin(self, key, fingerprint):
+        """NEW (the key is now claimed by the caller), PENDING (another request with the key is
+        running), MISMATCH (the key was used for a different request) or the StoredResponse"""
+        table = IdempotencyKey.__table__
+        user_id, idempotency_key = key
+        now = datetime.utcnow()
+        claim = {'user_id': user_id, 'key': idempotency_key, 'fingerprint': fingerprint, 'status': None,
+                 'body': None, 'mimetype': None, 'expires_at': now + timedelta(seconds=self.pending_ttl)}
+
+        with db.engine.begin() as conn:
+            if self._claim(conn, claim, now):
+                self._purge(conn, now)
+                return NEW
+            row = conn.execute(
+                select(table.c.fingerprint, table.c.status, table.c.body, table.c.mimetype)
+                .where(table.c.user_id == user_id, table.c.key == idempotency_key)
+            ).first()
+
+        # Released between the claim and the lookup: the retry after Retry-After claims it
+        if row is None:
+            return PENDING
+        if row.fingerprint != fingerprint:
+            return MISMATCH
+        if row.status is None:
+            return PENDING
+        with self._lock:
+            self.replayed += 1
+        return StoredResponse(row.fingerprint, row.status, row.body, row.mimetype)
+
+    def complete(self, key, stored):
+        table = IdempotencyKey.__table__
+        user_id, idempotency_key = key
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.key == idempotency_key,
+                       table.c.fingerprint == stored.fingerprint)
+                .values(status=stored.status, body=stored.body, mimetype=stored.mimetype,
+                        expires_at=datetime.utcnow() + timedelta(seconds=self.ttl))
+            )
+
+    def abandon(self, key):
+        table = IdempotencyKey.__table__
+        user_id, idempotency_key = key
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.user_id == user_id, table.c.key == idempotency_key,
+                                             table.c.status.is_(None)))
+
+    def stats(self):
+        with self._lock:
+            return {'replayed': self.replayed}
+
+    def _claim(self, conn, claim, now):
+        """Insert the key, or take it over if it has expired; whether the caller now holds it"""
+        table = IdempotencyKey.__table__
+        dialect = conn.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            upsert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            statement = upsert(table).values(claim)
+            statement = statement.on_conflict_do_update(
+                index_elements=['user_id', 'key'],
+                set_={column: statement.excluded[column] for column in CLAIM_COLUMNS},
+                where=table.c.expires_at <= now
+            )
+            return conn.execute(statement).rowcount == 1
+
+        # Other databases: take over an expired key, or insert a new one
+        taken = conn.execute(
+            update(table)
+            .where(table.c.user_id == claim['user_id'], table.c.key == claim['key'], table.c.expires_at <= now)
+            .values(**{column: claim[column] for column in CLAIM_COLUMNS})
+        )
+        if taken.rowcount:
+            return True
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(table).values(claim))
+            return True
+        except IntegrityError:
+            return False
+
+    def _purge(self, conn, now):
+        """Delete the expired keys every IDEMPOTENCY_PURGE_EVERY claims of this process"""
+        with self._lock:
+            self._claims += 1
+            if self._claims % IDEMPOTENCY_PURGE_EVERY:
+                return
+        table = IdempotencyKey.__table__
+        conn.execute(delete(table).where(table.c.expires_at <= now))
+
+def request_fingerprint():
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+def idempotent(view):
+    """Decorator for JWT-protected writes: a request repeated with the same Idempotency-Key header
+    gets the first response again (with Idempotent-Replayed: true) without running the view.
+    Responses that asked the client to retry (429, 5xx) are not stored. Put it below @jwt_required()."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters'}), 400
+
+        store_key = (get_jwt_identity(), key)
+        fingerprint = request_fingerprint()
+        state = idempotency_store.begin(store_key, fingerprint)
+        if state == PENDING:
+            response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+            response.headers['Retry-After'] = '1'
+            return response, 409
+        if state == MISMATCH:
+            return jsonify({'error': 'This Idempotency-Key was already used for a different request'}), 422
+        if state != NEW:
+            response = current_app.response_class(state.body, status=state.status, mimetype=state.mimetype)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.abandon(store_key)
+            raise
+
+        if response.status_code == 429 or response.status_code >= 500:
+            idempotency_store.abandon(store_key)
+        else:
+            idempotency_store.complete(store_key, StoredResponse(
+                fingerprint, response.status_code, response.get_data(), response.mimetype
+            ))
+        return response
+    return wrapper
+
+# Shared by all requests of this process; the keys themselves are shared by every worker
+idempotency_store = IdempotencyStore()
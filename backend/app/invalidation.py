@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from sqlalchemy import create_engine, func, select as sql_select
+
+logger = logging.getLogger(__name__)
+
+# Channel used with Postgres LISTEN/NOTIFY
+INVALIDATION_CHANNEL = 'cache_invalidation'
+
+# Seconds between checks for new messages (file backend) or for a stop request (Postgres backend)
+INVALIDATION_POLL_INTERVAL = 0.2
+
+# Seconds to wait before reconnecting after the listener loses its connection
+INVALIDATION_RECONNECT_DELAY = 5
+
+# Cache TTL (seconds) once writes from every worker are broadcast
+BUS_CACHE_TTL = 3600
+
+class FileBackend:
+    """Stand-in for LISTEN/NOTIFY for tests and single-host development: messages are appended as
+    JSON lines to a shared file that every process tails"""
+
+    def __init__(self, path):
+        self.path = path
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, message):
+        # A single O_APPEND write of a short line is not interleaved with other writers
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(message) + '\n').encode())
+        finally:
+            os.close(fd)
+
+    def start(self, receive, resync):
+        # Only messages published after this process started matter; the file keeps every message,
+        # so nothing is missed and resync isn't needed
+        offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+        def tail():
+            nonlocal offset
+            pending = b''
+            while not self._stop.wait(INVALIDATION_POLL_INTERVAL):
+                if not os.path.exists(self.path):
+                    continue
+                with open(self.path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+                offset += len(data)
+                *lines, pending = (pending + data).split(b'\n')
+                for line in lines:
+                    if line:
+                        receive(line)
+
+        self._thread = threading.Thread(target=tail, name='invalidation-file-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+class PostgresBackend:
+    """Broadcasts messages with pg_notify and receives them on a dedicated LISTEN connection"""
+
+    def __init__(self, url, channel=INVALIDATION_CHANNEL):
+        self.channel = channel
+        # A small engine of its own so the listener never holds a connection of the app's pool
+        self.engine = create_engine(url, pool_size=1, max_overflow=1, pool_pre_ping=True)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, message):
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(sql_select(func.pg_notify(self.channel, json.dumps(message))))
+
+    def start(self, receive, resync):
+        def listen():
+            while not self._stop.is_set():
+                try:
+                    with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                        conn.exec_driver_sql(f'LISTEN {self.channel}')
+                        # Notifications sent while no connection was listening are lost
+                        resync()
+                        raw = conn.connection.dbapi_connection
+                        while not self._stop.is_set():
+                            if select.select([raw], [], [], INVALIDATION_POLL_INTERVAL) == ([], [], []):
+                                continue
+                            raw.poll()
+                            while raw.notifies:
+                                receive(raw.notifies.pop(0).payload)
+                except Exception as e:
+                    logger.warning("Invalidation listener lost its connection: %s", e)
+                    self._stop.wait(INVALIDATION_RECONNECT_DELAY)
+
+        self._thread = threading.Thread(target=listen, name='invalidation-pg-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+class InvalidationBus:
+    """Broadcasts entity-version bumps to the in-process caches of every worker.
+
+    Caches subscribe a handler per entity ('user', 'schedule'). Writers call bump(entity, id)
+    after committing: local handlers run immediately and the bump is published to the other
+    workers through the configured backend, whose listener thread runs their handlers. Without
+    a backend (INVALIDATION_BUS_URL unset) bumps only reach this process. Whenever the
+    backend's listener (re)connects, bumps may have been missed, so every handler is called
+    with None: drop everything cached for the entity.
+
+    relay(channel, payload) forwards an arbitrary JSON payload to the listeners of a channel
+    in the other workers only, for in-process publishers that deliver locally themselves.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.backend = None
+        self._handlers = {}  # entity -> [handler(entity_id)]
+        self._listeners = {}  # channel -> [listener(payload)]
+        self._versions = {}  # (entity, entity_id) -> number of bumps seen by this process
+        self._lock = threading.Lock()
+
+    def subscribe(self, entity, handler):
+        self._handlers.setdefault(entity, []).append(handler)
+
+    def listen(self, channel, listener):
+        self._listeners.setdefault(channel, []).append(listener)
+
+    def version(self, entity, entity_id):
+        """How many times this process has seen the entity change"""
+        return self._versions.get((entity, entity_id), 0)
+
+    def bump(self, entity, entity_id):
+        """Record that an entity changed (call after commit) and tell every worker"""
+        self._apply(entity, entity_id)
+        if self.backend is not None:
+            try:
+                self.backend.publish({'origin': self.origin, 'entity': entity, 'id': entity_id})
+            except Exception as e:
+                # The write is committed; other workers fall back to their cache TTL
+                logger.warning("Failed to publish invalidation of %s %s: %s", entity, entity_id, e)
+
+    def relay(self, channel, payload):
+        """Send a payload to the channel's listeners in every other worker (not this one)"""
+        if self.backend is not None:
+            try:
+                self.backend.publish({'origin': self.origin, 'channel': channel, 'payload': payload})
+            except Exception as e:
+                logger.warning("Failed to relay %s message: %s", channel, e)
+
+    def _apply(self, entity, entity_id):
+        with self._lock:
+            key = (entity, entity_id)
+            self._versions[key] = self._versions.get(key, 0) + 1
+        self._notify(self._handlers.get(entity, ()), entity_id)
+
+    def _notify(self, callbacks, argument):
+        # A failing cache must not keep the others (or the listener thread) from running
+        for callback in callbacks:
+            try:
+                callback(argument)
+            except Exception:
+                logger.exception("Invalidation handler %r failed", callback)
+
+    def _resync(self):
+        """Drop every subscribed cache's entries after bumps may have been missed"""
+        for handlers in list(self._handlers.values()):
+            self._notify(handlers, None)
+
+    def _receive(self, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning("Ignoring malformed invalidation message: %r", raw)
+            return
+        # Our own bumps were applied (and relayed payloads delivered) when they were published
+        if message.get('origin') == self.origin:
+            return
+        if 'channel' in message:
+            self._notify(self._listeners.get(message['channel'], ()), message['payload'])
+        else:
+            self._apply(message['entity'], message['id'])
+
+    def init_app(self, app):
+        """Start the backend named by INVALIDATION_BUS_URL: 'postgresql' (the app database),
+        a postgresql:// URL, or file:///path for the file stand-in"""
+        if self.backend is not None:
+            self.backend.stop()
+            self.backend = None
+
+        url = app.config.get('INVALIDATION_BUS_URL')
+        if not url:
+            return
+        if url.startswith('file://'):
+            self.backend = FileBackend(url[len('file://'):])
+        elif url == 'postgresql':
+            self.backend = PostgresBackend(app.config['SQLALCHEMY_DATABASE_URI'])
+        elif url.startswith('postgresql://'):
+            self.backend = PostgresBackend(url)
+        else:
+            raise ValueError(f"Unsupported INVALIDATION_BUS_URL: {url}")
+        self.backend.start(self._receive, self._resync)
+
+    @property
+    def broadcasting(self):
+        """Whether bumps reach other workers, so caches can trust longer TTLs"""
+        return self.backend is not None
+
+# Shared by all requests of this process
+invalidation_bus = InvalidationBus()
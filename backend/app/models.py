@@ -1,9 +1,15 @@
 from datetime import datetime
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.slot_bitmap import offered_bitmap
+from app.timezones import utc_to_chicago_isoformat
+from app.passwords import password_hasher
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Doctor directory: role filter with optional specialization filter
+        db.Index('ix_users_role_specialization', 'role', 'specialization'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True, nullable=False)
@@ -22,24 +28,24 @@ class User(db.Model):
     gender = db.Column(db.String(20))
     profile_picture = db.Column(db.String(256))  # URL to profile picture
     
-    # Doctor-specific fields
+    # Doctor-specific fields (long text columns are deferred so list queries don't load them)
     specialization = db.Column(db.String(128))
     license_number = db.Column(db.String(128))
-    education = db.Column(db.Text)
+    education = db.deferred(db.Column(db.Text), group='doctor_details')
     experience_years = db.Column(db.Integer)
     hospital_affiliation = db.Column(db.String(256))
     board_certification = db.Column(db.String(256))
-    bio = db.Column(db.Text)
+    bio = db.deferred(db.Column(db.Text), group='doctor_details')
     consultation_fee = db.Column(db.Float)
     
-    # Patient-specific fields
+    # Patient-specific fields (medical text columns are deferred and loaded together on first access)
     insurance_provider = db.Column(db.String(128))
     insurance_id = db.Column(db.String(128))
     emergency_contact_name = db.Column(db.String(128))
     emergency_contact_phone = db.Column(db.String(20))
-    medical_history = db.Column(db.Text)
-    allergies = db.Column(db.Text)
-    current_medications = db.Column(db.Text)
+    medical_history = db.deferred(db.Column(db.Text), group='patient_medical')
+    allergies = db.deferred(db.Column(db.Text), group='patient_medical')
+    current_medications = db.deferred(db.Column(db.Text), group='patient_medical')
     blood_type = db.Column(db.String(10))
     height = db.Column(db.Float)  # Height in cm
     weight = db.Column(db.Float)  # Weight in kg
@@ -47,16 +53,21 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Change counters bumped in the same transaction as writes; they version the ETags of a
+    # doctor's availability and of a user's appointment list
+    availability_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    appointments_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
     # Define relationships
     doctor_appointments = db.relationship('Appointment', foreign_keys='Appointment.doctor_id', backref='doctor', lazy='dynamic')
     patient_appointments = db.relationship('Appointment', foreign_keys='Appointment.patient_id', backref='patient', lazy='dynamic')
     availabilities = db.relationship('Availability', backref='doctor', lazy='dynamic')
     
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
     
     def to_dict(self):
         data = {
@@ -105,6 +116,19 @@ class User(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # Doctor schedules and booked-slot lookups filter on doctor, status and a date range
+        db.Index('ix_appointments_doctor_status_date', 'doctor_id', 'status', 'date'),
+        # Patient appointment lists filter on patient and a date range
+        db.Index('ix_appointments_patient_date', 'patient_id', 'date'),
+        # A doctor can have only one scheduled appointment starting at a given time
+        db.Index('uq_appointments_doctor_scheduled_date', 'doctor_id', 'date', unique=True,
+                 postgresql_where=db.text("status = 'scheduled'"),
+                 sqlite_where=db.text("status = 'scheduled'")),
+        # Change feeds page through a doctor's or patient's appointments by (updated_at, id)
+        db.Index('ix_appointments_doctor_updated', 'doctor_id', 'updated_at', 'id'),
+        db.Index('ix_appointments_patient_updated', 'patient_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -115,20 +139,17 @@ class Appointment(db.Model):
     status = db.Column(db.String(20), default='scheduled')  # 'scheduled', 'completed', 'cancelled'
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Moved by every write; version counts them (1 = as created) so change feed clients can deduplicate
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, onupdate=db.text('version + 1'), nullable=False)
     
     def to_dict(self):
-        import pytz
-        
-        # Convert UTC date to Chicago timezone for consistent handling with frontend
-        chicago_tz = pytz.timezone('America/Chicago')
-        utc_date = pytz.utc.localize(self.date) if self.date.tzinfo is None else self.date
-        chicago_date = utc_date.astimezone(chicago_tz)
-        
         return {
             'id': self.id,
             'patientId': self.patient_id,
             'doctorId': self.doctor_id,
-            'date': chicago_date.isoformat(),
+            # Convert UTC date to Chicago timezone for consistent handling with frontend
+            'date': utc_to_chicago_isoformat(self.date),
             'duration': self.duration,
             'type': self.type,
             'status': self.status,
@@ -137,6 +158,19 @@ class Appointment(db.Model):
 
 class Availability(db.Model):
     __tablename__ = 'availability'  # Changed to match schema
+    __table_args__ = (
+        # Specific-date availability lookups
+        db.Index('ix_availability_doctor_date', 'doctor_id', 'date'),
+        # Weekly template lookups (date IS NULL) by day of week
+        db.Index('ix_availability_doctor_day_date', 'doctor_id', 'day_of_week', 'date'),
+        # One weekly row per day of week and one row per specific date (targets for bulk upserts)
+        db.Index('uq_availability_doctor_weekly', 'doctor_id', 'day_of_week', unique=True,
+                 postgresql_where=db.text('date IS NULL'),
+                 sqlite_where=db.text('date IS NULL')),
+        db.Index('uq_availability_doctor_date', 'doctor_id', 'date', unique=True,
+                 postgresql_where=db.text('date IS NOT NULL'),
+                 sqlite_where=db.text('date IS NOT NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -146,6 +180,26 @@ class Availability(db.Model):
     end_time = db.Column(db.String(10), nullable=False)  # Added to match schema
     is_available = db.Column(db.Boolean, default=True, nullable=False)  # Added to match schema
     available_slots = db.Column(db.JSON, default=list, nullable=True)  # New field for individual time slots
+    slot_bitmap = db.Column(db.BigInteger, nullable=True)  # One bit per 30-minute slot, see app/slot_bitmap.py
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, onupdate=db.text('version + 1'), nullable=False)
+    
+    def set_slots(self, available_slots, start_time, end_time):
+        """Store the offered slots as JSON (API shape) and as a bitmap (for computation)"""
+        self.available_slots = available_slots
+        self.start_time = start_time
+        self.end_time = end_time
+        self.slot_bitmap = self.compute_slot_bitmap()
+    
+    def compute_slot_bitmap(self):
+        """Bitmap of the offered slots: explicit available_slots win, otherwise the start/end range"""
+        return offered_bitmap(self.available_slots, self.start_time, self.end_time)
+    
+    def offered_slot_bitmap(self):
+        """Stored bitmap, falling back to the JSON/start-end columns for rows written before it existed"""
+        if self.slot_bitmap is not None:
+            return self.slot_bitmap
+        return self.compute_slot_bitmap()
     
     def to_dict(self):
         return {
@@ -157,4 +211,19 @@ class Availability(db.Model):
             'endTime': self.end_time,
             'isAvailable': self.is_available,
             'availableSlots': self.available_slots
-        }
\ No newline at end of file
+        }
+class IdempotencyKey(db.Model):
+    """Outcome of a request sent with an Idempotency-Key, shared by every worker (see app/idempotency.py)"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        # Purging expired keys
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+    
+    user_id = db.Column(db.String(64), primary_key=True)  # JWT identity of the client
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # Method, path and body of the request
+    status = db.Column(db.Integer, nullable=True)  # None while the first request is still running
+    body = db.Column(db.LargeBinary, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
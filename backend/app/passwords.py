@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+import multiprocessing
+import os
+import threading
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug method string for new hashes; parameters left out take werkzeug's current defaults
+PASSWORD_HASH_METHOD = 'scrypt'
+
+# Hashing jobs queued or running in the pool before further ones are refused
+PASSWORD_HASH_QUEUE_MAX = 32
+
+# Seconds a request waits for its hashing job
+PASSWORD_HASH_TIMEOUT = 10
+
+# Pool processes are forked where possible: spawned ones would re-import the entry module
+# (run.py creates the app at import). They only ever run the two functions below.
+POOL_CONTEXT = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full (or a job timed out); the caller should answer 503
+    and have the client retry"""
+
+def _hash(password, method):
+    return generate_password_hash(password, method)
+
+def _verify(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+def hash_parameters(password_hash):
+    """Method and parameters of a werkzeug hash, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:1000000'"""
+    return password_hash.split('$', 1)[0]
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a bounded process pool.
+
+    Key derivation costs a few hundred milliseconds of CPU per call. Run on the request thread,
+    a burst of logins starves every other request of the worker; in the pool it runs on other
+    cores while the request thread just waits. At most `queue_max` jobs are queued or running
+    per worker process, beyond that HashingBusy is raised instead of letting requests pile up.
+    With workers=0 hashing runs inline (development, tests, single-core hosts).
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=0, queue_max=PASSWORD_HASH_QUEUE_MAX,
+                 timeout=PASSWORD_HASH_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.queue_max = queue_max
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._pending = 0
+        self._parameters = None
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', PASSWORD_HASH_METHOD)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self.queue_max = app.config.get('PASSWORD_HASH_QUEUE_MAX', PASSWORD_HASH_QUEUE_MAX)
+        # Once per process at startup, inline, so needs_rehash never waits on the pool
+        self._parameters = hash_parameters(_hash('', self.method))
+        self.shutdown()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than new hashes get"""
+        if self._parameters is None:
+            self._parameters = hash_parameters(_hash('', self.method))
+        return hash_parameters(password_hash) != self._parameters
+
+    @property
+    def pending(self):
+        """Jobs queued or running in the pool"""
+        return self._pending
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+
+        with self._lock:
+            if self._pending >= self.queue_max:
+                raise HashingBusy()
+            self._pending += 1
+            # Started on first use in each process; a pool inherited across fork is unusable
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=POOL_CONTEXT)
+                self._pool_pid = os.getpid()
+            pool = self._pool
+
+        try:
+            return pool.submit(function, *args).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+# Shared by all requests of this process
+password_hasher = PasswordHasher()
@@ -0,0 +1,73 @@
+from collections import OrderedDict, namedtuple
+import threading
+import time
+from app import db
+from app.models import User
+from app.invalidation import invalidation_bus
+from app.replicas import primary
+
+# Users whose principal is kept in memory per process, least recently used dropped first
+PRINCIPAL_CACHE_SIZE = 10000
+
+# Seconds a cached principal is trusted; bounds staleness for writes this process doesn't see
+PRINCIPAL_TTL = 60
+
+# The slice of a user that authorization checks need
+Principal = namedtuple('Principal', ['id', 'role'])
+
+class PrincipalCache:
+    """Bounded TTL/LRU cache of user id -> Principal.
+
+    Handlers that only check who the caller is and what role they have read the principal
+    from here instead of loading the whole users row on every request. Writes that change a
+    user's role must bump the 'user' entity on the invalidation bus after committing."""
+
+    def __init__(self, max_size=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (expires_at, Principal)
+
+    def get(self, user_id):
+        """Principal of a user id (JWT identity string, session value or int), or None if there is no such user"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        # Cached for longer than replicas lag, so read from the primary
+        with primary():
+            row = db.session.query(User.id, User.role).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        principal = Principal(row.id, row.role)
+
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, principal)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id):
+        """Drop a user's cached principal after a write to their row (every user's with None)"""
+        if user_id is None:
+            self.clear()
+            return
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Shared by all requests of this process, invalidated by every worker's user writes
+principal_cache = PrincipalCache()
+invalidation_bus.subscribe('user', principal_cache.invalidate)
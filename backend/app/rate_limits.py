@@ -0,0 +1,268 @@
+from collections import OrderedDict, deque, namedtuple
+from functools import wraps
+import hashlib
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from flask import request, jsonify
+
+# Token bucket: `rate` tokens per second refill a bucket of at most `burst` tokens; a request takes one
+RateLimit = namedtuple('RateLimit', ['rate', 'burst'])
+
+# Per route group, the bucket of each client IP and of each identity (user id, or for logins the
+# username together with the client IP)
+RATE_LIMITS = {
+    'login': {'ip': RateLimit(rate=20 / 60, burst=20), 'identity': RateLimit(rate=5 / 60, burst=5)},
+    'register': {'ip': RateLimit(rate=5 / 60, burst=10)},
+    'booking': {'ip': RateLimit(rate=1, burst=60), 'identity': RateLimit(rate=0.5, burst=30)},
+}
+
+# Adaptive concurrency per group: the in-flight limit starts at max_limit, shrinks while the p99
+# latency is above target (seconds) and grows back while it is below
+ConcurrencyPolicy = namedtuple('ConcurrencyPolicy', ['max_limit', 'min_limit', 'target'])
+
+CONCURRENCY_LIMITS = {
+    'auth': ConcurrencyPolicy(max_limit=16, min_limit=2, target=2.0),
+    'booking': ConcurrencyPolicy(max_limit=64, min_limit=4, target=0.5),
+}
+
+# Latencies kept per group for the p99, and completed requests between limit adjustments
+LATENCY_WINDOW = 200
+ADJUST_EVERY = 50
+
+# Factor the limit is cut by while the p99 is over target
+LIMIT_DECREASE = 0.75
+
+# Seconds clients are asked to wait after a 503 from load shedding
+SHED_RETRY_AFTER = 1
+
+# Buckets kept by the in-process backend, least recently used dropped first
+MEMORY_BUCKETS = 100000
+
+# Slots of the shared-memory bucket table and how many are probed per key
+SHARED_BUCKETS = 65536
+SHARED_PROBES = 8
+
+def refill(tokens, updated, now, limit):
+    """Tokens in a bucket at `now`"""
+    return min(limit.burst, tokens + (now - updated) * limit.rate)
+
+def wait_for(tokens, limit):
+    """Seconds until a bucket holding `tokens` has one to give, or 0"""
+    return 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+
+class MemoryBackend:
+    """Buckets in a dict of this process; each worker limits on its own"""
+
+    def __init__(self, max_size=MEMORY_BUCKETS):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+
+    def take(self, buckets):
+        """Take a token from every (key, limit) bucket if each has one; otherwise take none and
+        return the seconds until they all do"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = [refill(*self._buckets.get(key, (limit.burst, now)), now, limit) for key, limit in buckets]
+            wait = max((wait_for(available, limit) for available, (_, limit) in zip(tokens, buckets)), default=0.0)
+            if wait:
+                return wait
+            for available, (key, _) in zip(tokens, buckets):
+                self._buckets.pop(key, None)
+                self._buckets[key] = (available - 1, now)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return 0.0
+
+class SharedMemoryBackend:
+    """Buckets in a named shared-memory table that every worker on the host maps, guarded by a
+    file lock. Each slot holds a key hash, tokens and the last update (CLOCK_MONOTONIC is host
+    wide); a key that finds no free slot among its probes replaces the least recently used."""
+
+    SLOT = struct.Struct('Qdd')
+
+    def __init__(self, name, slots=SHARED_BUCKETS):
+        import fcntl  # POSIX only, like the multi-worker servers this backend is for
+        self._fcntl = fcntl
+        self.slots = slots
+        size = slots * self.SLOT.size
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._memory = shared_memory.SharedMemory(name=name)
+        # The table outlives any one worker; don't let this process's exit unlink it
+        resource_tracker.unregister(self._memory._name, 'shared_memory')
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'a')
+        self._thread_lock = threading.Lock()
+
+    def take(self, buckets):
+        """Take a token from every (key, limit) bucket if each has one; otherwise take none and
+        return the seconds until they all do"""
+        digests = [int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+                   for key, _ in buckets]
+        now = time.monotonic()
+        with self._thread_lock:
+            self._fcntl.flock(self._lock_file, self._fcntl.LOCK_EX)
+            try:
+                tokens = []
+                for digest, (_, limit) in zip(digests, buckets):
+                    _, stored, updated = self._find(digest, limit.burst, now)
+                    tokens.append(refill(stored, updated, now, limit))
+                wait = max((wait_for(available, limit) for available, (_, limit) in zip(tokens, buckets)), default=0.0)
+                if wait:
+                    return wait
+                # Looked up again so a bucket written just before can't be given the same free slot
+                for digest, available, (_, limit) in zip(digests, tokens, buckets):
+                    offset, _, _ = self._find(digest, limit.burst, now)
+                    self.SLOT.pack_into(self._memory.buf, offset, digest, available - 1, now)
+            finally:
+                self._fcntl.flock(self._lock_file, self._fcntl.LOCK_UN)
+        return 0.0
+
+    def _find(self, digest, burst, now):
+        """(offset, tokens, updated) of a key's slot, or of the slot a new bucket (full at `now`)
+        goes in. Call with the lock held."""
+        buffer = self._memory.buf
+        target, oldest = None, None
+        for probe in range(SHARED_PROBES):
+            offset = ((digest + probe) % self.slots) * self.SLOT.size
+            slot_key, slot_tokens, slot_updated = self.SLOT.unpack_from(buffer, offset)
+            if slot_key == digest:
+                return offset, slot_tokens, slot_updated
+            if slot_key == 0 and target is None:
+                target = offset
+            if oldest is None or slot_updated < oldest[1]:
+                oldest = (offset, slot_updated)
+        return (target if target is not None else oldest[0]), burst, now
+
+class ConcurrencyLimiter:
+    """In-flight limit of one route group in this worker, adapted to its latency (AIMD).
+
+    Every ADJUST_EVERY completed requests the p99 of the recent latencies is compared with the
+    target: above it the limit is cut by LIMIT_DECREASE, below it the limit grows by one. A
+    request that arrives with the limit reached is shed instead of queueing behind the others."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.limit = policy.max_limit
+        self.in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._completed = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, elapsed):
+        with self._lock:
+            self.in_flight -= 1
+            self._latencies.append(elapsed)
+            self._completed += 1
+            if self._completed % ADJUST_EVERY == 0:
+                if self._p99() > self.policy.target:
+                    self.limit = max(self.policy.min_limit, int(self.limit * LIMIT_DECREASE))
+                    # Judge the new limit by the latencies it produces
+                    self._latencies.clear()
+                elif self.limit < self.policy.max_limit:
+                    self.limit += 1
+
+    def _p99(self):
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'in_flight': self.in_flight, 'shed': self.shed,
+                    'p99_ms': round(self._p99() * 1000, 1)}
+
+class RateLimiter:
+    """Per-client token buckets and adaptive concurrency limits for the auth and booking routes.
+
+    Bucket state lives in a backend chosen by RATE_LIMIT_STORAGE_URL: unset keeps it in each
+    process, shm://<name> shares it between the workers of a host through shared memory.
+    Concurrency limits are always per worker, since they track that worker's own latency.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.backend = MemoryBackend()
+        self.limits = RATE_LIMITS
+        self.concurrency = {group: ConcurrencyLimiter(policy) for group, policy in CONCURRENCY_LIMITS.items()}
+        self._limited = {}  # route group -> requests refused with 429
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMITS_ENABLED', True)
+        self.limits = app.config.get('RATE_LIMITS', RATE_LIMITS)
+        policies = app.config.get('CONCURRENCY_LIMITS', CONCURRENCY_LIMITS)
+        self.concurrency = {group: ConcurrencyLimiter(policy) for group, policy in policies.items()}
+        self._limited = {}
+
+        url = app.config.get('RATE_LIMIT_STORAGE_URL')
+        if not url:
+            self.backend = MemoryBackend()
+        elif url.startswith('shm://'):
+            self.backend = SharedMemoryBackend(url[len('shm://'):])
+        else:
+            raise ValueError(f"Unsupported RATE_LIMIT_STORAGE_URL: {url}")
+
+    def check(self, name, identity=None):
+        """Seconds the client has to wait before this request is allowed, or 0. A refused request
+        takes no token, so requests refused for one bucket don't drain the others."""
+        limits = self.limits.get(name, {})
+        buckets = [(f'{name}:ip:{request.remote_addr}', limits['ip'])] if 'ip' in limits else []
+        if identity is not None and 'identity' in limits:
+            buckets.append((f'{name}:identity:{identity}', limits['identity']))
+        wait = self.backend.take(buckets) if buckets else 0.0
+        if wait:
+            self._limited[name] = self._limited.get(name, 0) + 1
+        return wait
+
+    def stats(self):
+        return {
+            'limited': dict(self._limited),
+            'concurrency': {group: limiter.stats() for group, limiter in self.concurrency.items()}
+        }
+
+    def limited(self, name, group, identity=None):
+        """Decorator: answer 429 when a bucket of the client is empty and 503 when the group is at
+        its concurrency limit. `identity()` names the client beyond its IP (None to skip); put the
+        decorator below @jwt_required() when it reads the JWT."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+
+                wait = self.check(name, identity() if identity else None)
+                if wait:
+                    return too_many_requests('Too many requests, please retry later', 429, wait)
+
+                limiter = self.concurrency[group]
+                if not limiter.acquire():
+                    return too_many_requests('Server is busy, please retry shortly', 503, SHED_RETRY_AFTER)
+                started = time.monotonic()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    limiter.release(time.monotonic() - started)
+            return wrapper
+        return decorator
+
+def too_many_requests(message, status, retry_after):
+    response = jsonify({'error': message})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, status
+
+# Shared by all requests of this process
+rate_limiter = RateLimiter()
@@ -0,0 +1,197 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import threading
+import time
+from flask import request, has_request_context, session, g
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from app.db_pool import engine_options
+from app.invalidation import invalidation_bus
+
+# Seconds a user's reads stay on the primary after they wrote; should exceed the replication lag
+REPLICA_STICKY_SECONDS = 10
+
+# Users kept sticky per process, least recently written dropped first
+REPLICA_STICKY_USERS = 100000
+
+# Bus channel that tells the other workers who just wrote
+READ_YOUR_WRITES_CHANNEL = 'read_your_writes'
+
+# Requests whose SELECTs may go to a replica
+READ_METHODS = ('GET', 'HEAD')
+
+# Session key holding the wall-clock time until which the browser's reads stay on the primary.
+# The session cookie is signed and sent with every request, also to the public routes that
+# don't identify the user otherwise.
+PRIMARY_READS_SESSION_KEY = 'primary_reads_until'
+
+_local = threading.local()
+
+@contextmanager
+def primary():
+    """Run the enclosed queries on the primary even in a read request, e.g. to fill a cache that
+    outlives the request and must not start out behind the primary"""
+    _local.depth = getattr(_local, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+
+def reads_primary(view):
+    """Decorator for read routes that must not see replication lag"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with primary():
+            return view(*args, **kwargs)
+    return wrapper
+
+def replica_binds(config):
+    """SQLALCHEMY_BINDS entries for REPLICA_DATABASE_URLS, pooled like the primary"""
+    urls = config.get('REPLICA_DATABASE_URLS') or []
+    return {
+        f'replica_{index}': {'url': url, **engine_options(config, url)}
+        for index, url in enumerate(urls, 1)
+    }
+
+def request_identities():
+    """Ids (as strings) of the user behind the request: the JWT identity, checked here on routes
+    that don't require a JWT, and the session's user_id (availability writes authenticate with
+    it). Empty outside a request or for anonymous requests; resolved once per request."""
+    if not has_request_context():
+        return ()
+    identities = g.get('_replica_identities')
+    if identities is None:
+        identities = set()
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:
+            # No JWT check ran yet; a missing, expired or invalid token just means no identity
+            try:
+                verify_jwt_in_request(optional=True)
+                identity = get_jwt_identity()
+            except Exception:
+                identity = None
+        if identity is not None:
+            identities.add(str(identity))
+        if session.get('user_id') is not None:
+            identities.add(str(session['user_id']))
+        g._replica_identities = identities
+    return identities
+
+class ReplicaRouter:
+    """Decides which statements of a request may read from a replica.
+
+    SELECTs of GET and HEAD requests go to one of the replicas (round robin, one per request so
+    its queries see one snapshot of the data); everything else, and every statement of a session
+    that has written, goes to the primary. A user who committed a write keeps reading from the
+    primary for `sticky_seconds` so they see their own booking or availability change even while
+    the replicas lag behind: by user id in every worker (through the invalidation bus), and by a
+    mark in the signed session cookie for the routes a browser calls without identifying itself.
+    """
+
+    def __init__(self, sticky_seconds=REPLICA_STICKY_SECONDS, max_users=REPLICA_STICKY_USERS):
+        self.sticky_seconds = sticky_seconds
+        self.max_users = max_users
+        self.replicas = []  # bind keys
+        self._lock = threading.Lock()
+        self._next = 0
+        self._sticky = OrderedDict()  # user id -> monotonic time their reads may use replicas again
+        self._statements = {'primary': 0, 'replica': 0}
+
+    def init_app(self, app):
+        """Add the replica binds to the config; call before db.init_app"""
+        binds = replica_binds(app.config)
+        app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}), **binds}
+        self.replicas = list(binds)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', REPLICA_STICKY_SECONDS)
+        with self._lock:
+            self._next = 0
+            self._sticky.clear()
+            self._statements = {'primary': 0, 'replica': 0}
+
+    def choose(self):
+        with self._lock:
+            self._next += 1
+            return self.replicas[self._next % len(self.replicas)]
+
+    def reads_from_replica(self):
+        """Whether the current request's SELECTs may go to a replica"""
+        if not self.replicas or getattr(_local, 'depth', 0):
+            return False
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        if session.get(PRIMARY_READS_SESSION_KEY, 0) > time.time():
+            return False
+        return not any(self.is_sticky(identity) for identity in request_identities())
+
+    def count(self, target):
+        with self._lock:
+            self._statements[target] += 1
+
+    def wrote(self):
+        """Keep the current user's reads on the primary for a while, here and in the other workers"""
+        if not self.replicas or not has_request_context():
+            return
+        session[PRIMARY_READS_SESSION_KEY] = time.time() + self.sticky_seconds
+        for identity in request_identities():
+            self.stick(identity, self.sticky_seconds)
+            invalidation_bus.relay(READ_YOUR_WRITES_CHANNEL, {'user': identity, 'seconds': self.sticky_seconds})
+
+    def stick(self, identity, seconds):
+        with self._lock:
+            self._sticky[str(identity)] = time.monotonic() + seconds
+            self._sticky.move_to_end(str(identity))
+            while len(self._sticky) > self.max_users:
+                self._sticky.popitem(last=False)
+
+    def is_sticky(self, identity):
+        with self._lock:
+            until = self._sticky.get(str(identity))
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._sticky[str(identity)]
+                return False
+            return True
+
+    def _receive(self, payload):
+        self.stick(payload['user'], payload['seconds'])
+
+    def stats(self):
+        with self._lock:
+            return {'replicas': len(self.replicas), 'statements': dict(self._statements),
+                    'sticky_users': len(self._sticky)}
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from a replica where replica_router allows it"""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._replica = None
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and replica_router.replicas:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self._wrote = True
+            elif not self._wrote and is_plain_select(clause) and replica_router.reads_from_replica():
+                if self._replica is None:
+                    self._replica = replica_router.choose()
+                replica_router.count('replica')
+                return self._db.engines[self._replica]
+            replica_router.count('primary')
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        super().commit()
+        if self._wrote:
+            replica_router.wrote()
+
+def is_plain_select(clause):
+    """A SELECT that takes no row locks (those must run on the primary)"""
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+# Shared by all requests of this process
+replica_router = ReplicaRouter()
+invalidation_bus.listen(READ_YOUR_WRITES_CHANNEL, replica_router._receive)
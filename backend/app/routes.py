@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context, current_app
 from app import db
 from app.models import User, Appointment, Availability
 from flask_jwt_extended import (
@@ -10,42 +10,167 @@ from flask_jwt_extended import (
     set_refresh_cookies,
     unset_jwt_cookies
 )
+from sqlalchemy import and_, or_
 from datetime import datetime, timedelta
+import base64
 import pytz  # Add pytz for timezone handling
+from app.timezones import (
+    CHICAGO_TZ,
+    utc_to_chicago,
+    parse_iso_in_chicago,
+    chicago_day_start_utc,
+    utc_to_chicago_isoformat,
+    utc_to_chicago_isoformats
+)
+from app.slots import find_free_slots
+from app.slot_index import free_slot_index, INDEX_HORIZON_DAYS
+from app.booking import save_booking, parse_duration, BookingConflict
+from app.appointment_import import import_appointments, IMPORT_FORMATS
+from app.appointment_export import export_query, stream_appointments, EXPORT_FORMATS, EXPORT_MIMETYPES
+from app.availability import parse_availability_entry, availability_key, upsert_availability
+from app.principals import principal_cache
+from app.passwords import password_hasher, HashingBusy
+from app.rate_limits import rate_limiter
+from app.idempotency import idempotent
+from app.replicas import reads_primary
+from app.directory import doctor_directory, DOCTOR_DIRECTORY_FIELDS
+from app.invalidation import invalidation_bus
+from app.slot_events import slot_events, AVAILABILITY_CHANGED, SLOT_EVENT_RETRY
+from app.versions import (
+    bump_availability_version, bump_counterpart_versions, user_version, version_etag, not_modified, with_etag
+)
+from app.serializers import (
+    APPOINTMENT_COLUMNS, AVAILABILITY_COLUMNS, appointment_rows, availability_row, json_response,
+    json_body_response, dumps
+)
+from app.single_flight import public_reads
 
 bp = Blueprint('api', __name__)
 
-# Set Chicago timezone for consistent handling with frontend
-CHICAGO_TZ = pytz.timezone('America/Chicago')
-
-# Helper functions for timezone handling
-def utc_to_chicago(utc_dt):
-    """Convert UTC datetime to Chicago timezone"""
-    if utc_dt.tzinfo is None:
-        utc_dt = pytz.utc.localize(utc_dt)
-    return utc_dt.astimezone(CHICAGO_TZ)
-
-def chicago_to_utc(chicago_dt):
-    """Convert Chicago datetime to UTC timezone"""
-    if chicago_dt.tzinfo is None:
-        chicago_dt = CHICAGO_TZ.localize(chicago_dt)
-    return chicago_dt.astimezone(pytz.utc)
-
-def parse_iso_in_chicago(iso_string):
-    """Parse ISO string into a UTC datetime, interpreting offsets correctly and assuming Chicago local time when no offset is present"""
-    # Handle ISO strings ending with 'Z' (UTC)
-    if iso_string.endswith('Z'):
-        # Convert 'Z' to +00:00 for fromisoformat
-        dt = datetime.fromisoformat(iso_string.replace('Z', '+00:00'))
-        # Already in UTC, return as-is
-        return dt.astimezone(pytz.utc)
-    # Parse with possible offset
-    dt = datetime.fromisoformat(iso_string)
-    # If no tzinfo, assume it's in Chicago local time
-    if dt.tzinfo is None:
-        dt = CHICAGO_TZ.localize(dt)
-    # Convert to UTC for storage
-    return dt.astimezone(pytz.utc)
+# Page sizes for keyset-paginated appointment listings
+APPOINTMENT_PAGE_SIZE = 50
+APPOINTMENT_PAGE_SIZE_MAX = 200
+
+def filter_appointments(query, args):
+    """Apply the from/to (YYYY-MM-DD, Chicago, inclusive) and status filters from the query string"""
+    status = args.get('status')
+    if status:
+        query = query.filter(Appointment.status.in_(status.split(',')))
+    
+    if args.get('from'):
+        start_date = datetime.strptime(args['from'], '%Y-%m-%d').date()
+        query = query.filter(Appointment.date >= chicago_day_start_utc(start_date))
+    
+    if args.get('to'):
+        end_date = datetime.strptime(args['to'], '%Y-%m-%d').date()
+        query = query.filter(Appointment.date < chicago_day_start_utc(end_date + timedelta(days=1)))
+    
+    return query
+
+def encode_appointment_cursor(appointment):
+    """Encode the (date, id) keyset position of an appointment as an opaque cursor"""
+    return encode_keyset_cursor(appointment.date, appointment.id)
+
+def encode_keyset_cursor(timestamp, row_id):
+    """Encode a (timestamp, id) keyset position as an opaque cursor"""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_appointment_cursor(cursor):
+    """Decode a cursor produced by encode_appointment_cursor, raising ValueError if it is malformed"""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    date_part, id_part = raw.split('|')
+    return datetime.fromisoformat(date_part), int(id_part)
+
+def fetch_appointment_page(query, args):
+    """Run an appointment query with keyset pagination on (date, id).
+    Returns the rows of the requested page and the cursor of the next page (None on the last page)."""
+    limit = min(int(args.get('limit', APPOINTMENT_PAGE_SIZE)), APPOINTMENT_PAGE_SIZE_MAX)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_date, cursor_id = decode_appointment_cursor(cursor)
+        query = query.filter(or_(
+            Appointment.date > cursor_date,
+            and_(Appointment.date == cursor_date, Appointment.id > cursor_id)
+        ))
+    
+    # Fetch one extra row to find out whether another page follows
+    rows = query.order_by(Appointment.date, Appointment.id).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_appointment_cursor(rows[-1])
+    
+    return rows, next_cursor
+
+# Page sizes of the appointment change feed
+CHANGES_PAGE_SIZE = 200
+CHANGES_PAGE_SIZE_MAX = 1000
+
+# The change feed cursor never moves past changes younger than this. A transaction that stamped
+# updated_at earlier but commits later would otherwise be skipped; such rows are sent again
+# on the next poll instead, and clients deduplicate them by version.
+CHANGES_SETTLE = timedelta(seconds=5)
+
+def fetch_appointment_changes(query, args, now=None):
+    """Run an appointment query as a change feed ordered by (updated_at, id) after the `since` cursor.
+    Returns the changed rows, the cursor to poll with next and whether more changes are waiting."""
+    limit = min(int(args.get('limit', CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE_MAX)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    
+    since = None
+    if args.get('since'):
+        since = decode_appointment_cursor(args['since'])
+        query = query.filter(or_(
+            Appointment.updated_at > since[0],
+            and_(Appointment.updated_at == since[0], Appointment.id > since[1])
+        ))
+    
+    # Fetch one extra row to find out whether more changes are waiting
+    rows = query.order_by(Appointment.updated_at, Appointment.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    settled = ((now or datetime.utcnow()) - CHANGES_SETTLE, 0)
+    position = min((rows[-1].updated_at, rows[-1].id), settled) if rows else settled
+    if since is not None:
+        position = max(position, since)
+    # Held back at the settle horizon: the client polls again later rather than right away
+    has_more = has_more and position == (rows[-1].updated_at, rows[-1].id)
+    
+    return rows, encode_keyset_cursor(*position), has_more
+
+def doctor_appointments_query(doctor_id):
+    """A doctor's appointments, joining each patient's name in the same query instead of looking up each patient"""
+    return db.session.query(*APPOINTMENT_COLUMNS, User.full_name.label('patient_name'))\
+        .outerjoin(User, User.id == Appointment.patient_id)\
+        .filter(Appointment.doctor_id == doctor_id)
+
+def patient_appointments_query(patient_id):
+    """A patient's appointments, joining the doctor's name and specialization in the same query"""
+    return db.session.query(*APPOINTMENT_COLUMNS, User.id.label('doctor_user_id'),
+                            User.full_name.label('doctor_name'), User.specialization.label('doctor_specialization'))\
+        .outerjoin(User, User.id == Appointment.doctor_id)\
+        .filter(Appointment.patient_id == patient_id)
+
+def appointment_list_entries(rows, role):
+    """Serialize rows of doctor_appointments_query (role 'doctor') or patient_appointments_query"""
+    results = appointment_rows(rows)
+    if role == 'doctor':
+        # Include patient name in response
+        for row, data in zip(rows, results):
+            data['patientName'] = row.patient_name if row.patient_name is not None else "Unknown"
+    else:
+        # Include doctor name and specialization in response
+        for row, data in zip(rows, results):
+            data['doctorName'] = row.doctor_name if row.doctor_user_id is not None else "Unknown"
+            data['doctorSpecialization'] = row.doctor_specialization if row.doctor_user_id is not None else ""
+    return results
 
 # Create a separate blueprint for availability routes
 availability_routes = Blueprint('availability', __name__)
@@ -55,7 +180,25 @@ bp.register_blueprint(availability_routes)
 profile_routes = Blueprint('profile', __name__)
 bp.register_blueprint(profile_routes)
 
+# Seconds clients are asked to wait when the password hashing queue is full
+HASHING_RETRY_AFTER = 1
+
+def hashing_busy():
+    """503 for a login or registration refused because the password hashing queue is full"""
+    response = jsonify({'error': 'Too many sign-ins in progress, please retry shortly'})
+    response.headers['Retry-After'] = str(HASHING_RETRY_AFTER)
+    return response, 503
+
+def login_username():
+    """Rate limit identity of a login attempt: the account it targets from this address, so
+    failed attempts elsewhere can't lock the owner out"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or data.get('username') is None:
+        return None
+    return f"{data['username']}@{request.remote_addr}"
+
 @bp.route('/register', methods=['POST'])
+@rate_limiter.limited('register', 'auth')
 def register():
     data = request.get_json() or {}
     
@@ -80,11 +223,19 @@ def register():
         license_number=data.get('licenseNumber', ''),
         phone=data.get('phone', '')
     )
-    user.set_password(data['password'])
+    try:
+        user.set_password(data['password'])
+    except HashingBusy:
+        return hashing_busy()
     
     db.session.add(user)
     db.session.commit()
     
+    # A new doctor becomes searchable for open slots and appears in the directory
+    if user.role == 'doctor':
+        invalidation_bus.bump('schedule', user.id)
+        invalidation_bus.bump('directory', user.id)
+    
     # Generate tokens
     access_token = create_access_token(identity=str(user.id))
     refresh_token = create_refresh_token(identity=str(user.id))
@@ -108,6 +259,7 @@ def register():
     return resp, 201
 
 @bp.route('/login', methods=['POST'])
+@rate_limiter.limited('login', 'auth', identity=login_username)
 def login():
     data = request.get_json() or {}
     
@@ -116,8 +268,20 @@ def login():
     
     user = User.query.filter_by(username=data['username']).first()
     
-    if user is None or not user.check_password(data['password']):
-        return jsonify({'error': 'Invalid username or password'}), 401
+    try:
+        if user is None or not user.check_password(data['password']):
+            return jsonify({'error': 'Invalid username or password'}), 401
+    except HashingBusy:
+        return hashing_busy()
+    
+    # Upgrade a hash made with older parameters while the plain password is at hand. With the
+    # hashing queue full, skip it rather than fail a verified login; a later login upgrades it.
+    if password_hasher.needs_rehash(user.password):
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except HashingBusy:
+            pass
     
     # Generate tokens
     access_token = create_access_token(identity=str(user.id))
@@ -173,15 +337,200 @@ def logout():
     
     return resp, 200
 
+# Page sizes for the paginated doctor directory
+DOCTOR_PAGE_SIZE = 50
+DOCTOR_PAGE_SIZE_MAX = 200
+
 @bp.route('/doctors', methods=['GET'])
 def get_doctors():
-    doctors = User.query.filter_by(role='doctor').all()
-    return jsonify([doctor.to_dict() for doctor in doctors]), 200
+    """Public doctor directory, served from the in-memory snapshot without querying the database"""
+    snapshot = doctor_directory.current()
+    
+    # The unfiltered directory is sent as pre-serialized (and pre-gzipped) bytes
+    if not request.args:
+        response = not_modified(snapshot.etag)
+        if response is None:
+            if request.accept_encodings['gzip']:
+                response = current_app.response_class(snapshot.gzipped, mimetype='application/json')
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = current_app.response_class(snapshot.body, mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        return with_etag(response, snapshot.etag, cache_control='public, no-cache')
+    
+    # Project only the requested fields; default to everything the directory used to return
+    if request.args.get('fields'):
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in DOCTOR_DIRECTORY_FIELDS]
+        if unknown:
+            return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    else:
+        fields = list(DOCTOR_DIRECTORY_FIELDS)
+    
+    entries = snapshot.entries
+    
+    if request.args.get('specialization'):
+        entries = [e for e in entries if e['specialization'] == request.args['specialization']]
+    
+    if request.args.get('city'):
+        entries = [e for e in entries if e['city'] == request.args['city']]
+    
+    # Paginate (keyset on id) only when asked so existing callers keep getting a plain list
+    next_cursor = None
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    if paginated:
+        try:
+            limit = min(int(request.args.get('limit', DOCTOR_PAGE_SIZE)), DOCTOR_PAGE_SIZE_MAX)
+            if limit < 1:
+                raise ValueError('limit must be positive')
+            if request.args.get('cursor'):
+                cursor = int(request.args['cursor'])
+                entries = [e for e in entries if e['id'] > cursor]
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor or limit'}), 400
+        
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = str(entries[-1]['id'])
+    
+    doctors = [{field: entry[field] for field in fields} for entry in entries]
+    if paginated:
+        return json_response({'doctors': doctors, 'next_cursor': next_cursor})
+    
+    return json_response(doctors)
 
 @availability_routes.route('/doctors/<int:doctor_id>/availability', methods=['GET'])
 def get_doctor_availability(doctor_id):
-    availabilities = Availability.query.filter_by(doctor_id=doctor_id).all()
-    return jsonify([a.to_dict() for a in availabilities]), 200
+    # Answer revalidations from the doctor's availability version alone
+    etag = version_etag('availability', doctor_id, user_version(User.availability_version, doctor_id))
+    response = not_modified(etag)
+    if response:
+        return response
+    
+    # Concurrent requests for the same version of the availability share one query and body
+    def load_availability():
+        rows = db.session.query(*AVAILABILITY_COLUMNS).filter(Availability.doctor_id == doctor_id).all()
+        return dumps([availability_row(row) for row in rows])
+    
+    # Requests waiting on another request's query must not hold a pooled connection meanwhile
+    db.session.close()
+    body = public_reads.do(('availability', doctor_id, etag), load_availability)
+    return with_etag(json_body_response(body), etag)
+
+# Longest range the free-slot endpoint will expand in one request
+FREE_SLOTS_MAX_DAYS = 62
+
+@availability_routes.route('/doctors/<int:doctor_id>/free-slots', methods=['GET'])
+def get_doctor_free_slots(doctor_id):
+    """Public endpoint returning a doctor's open slots, grouped by Chicago date, between from and to (inclusive)"""
+    try:
+        if request.args.get('from'):
+            start_date = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        else:
+            start_date = utc_to_chicago(datetime.utcnow()).date()
+        
+        if request.args.get('to'):
+            end_date = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+        else:
+            end_date = start_date + timedelta(days=6)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if end_date < start_date:
+        return jsonify({'error': 'to must not be before from'}), 400
+    
+    if (end_date - start_date).days >= FREE_SLOTS_MAX_DAYS:
+        return jsonify({'error': f'Date range cannot exceed {FREE_SLOTS_MAX_DAYS} days'}), 400
+    
+    free_slots = find_free_slots([doctor_id], start_date, end_date)[doctor_id]
+    
+    # Group the slots by their Chicago calendar date (YYYY-MM-DD and HH:MM of the local ISO strings)
+    days = []
+    for local_start in utc_to_chicago_isoformats([start for start, end in free_slots]):
+        day = local_start[:10]
+        if not days or days[-1]['date'] != day:
+            days.append({'date': day, 'slots': []})
+        days[-1]['slots'].append(local_start[11:16])
+    
+    return jsonify({
+        'doctorId': doctor_id,
+        'from': start_date.isoformat(),
+        'to': end_date.isoformat(),
+        'days': days
+    }), 200
+
+@availability_routes.route('/doctors/<int:doctor_id>/slot-events', methods=['GET'])
+def stream_doctor_slot_events(doctor_id):
+    """Public Server-Sent Events stream of a doctor's slot changes: slot-booked and slot-cancelled
+    (Chicago start time and duration, no patient data) and availability-changed"""
+    doctor = principal_cache.get(doctor_id)
+    if not doctor or doctor.role != 'doctor':
+        return jsonify({'error': 'Doctor not found'}), 404
+
+    # Sent by browsers reconnecting a dropped EventSource
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    # Not wrapped in stream_with_context: an open stream holds no app context or database connection
+    def stream():
+        events = slot_events.subscribe(doctor_id, last_event_id)
+        try:
+            yield b'retry: %d\n\n' % SLOT_EVENT_RETRY
+            for event in events:
+                yield slot_events.format(event)
+        finally:
+            events.close()
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the stream
+    return response
+
+@bp.route('/search/earliest-slot', methods=['GET'])
+def search_earliest_slot():
+    """Public endpoint returning the earliest open slot of any doctor with a specialization"""
+    specialization = request.args.get('specialization')
+    if not specialization:
+        return jsonify({'error': 'specialization is required'}), 400
+    
+    today = utc_to_chicago(datetime.utcnow()).date()
+    try:
+        if request.args.get('from'):
+            start_date = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        else:
+            start_date = today
+        
+        if request.args.get('to'):
+            end_date = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+        else:
+            end_date = start_date + timedelta(days=6)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    if end_date < start_date:
+        return jsonify({'error': 'to must not be before from'}), 400
+    
+    if end_date >= today + timedelta(days=INDEX_HORIZON_DAYS):
+        return jsonify({'error': f'to must be within {INDEX_HORIZON_DAYS} days from today'}), 400
+    
+    result = free_slot_index.earliest_slot(specialization, start_date, end_date)
+    
+    slot = None
+    if result:
+        doctor_id, start = result
+        local_start = utc_to_chicago_isoformat(start)
+        slot = {
+            'doctorId': doctor_id,
+            'date': local_start[:10],
+            'time': local_start[11:16],
+            'start': local_start
+        }
+    
+    return jsonify({
+        'specialization': specialization,
+        'from': start_date.isoformat(),
+        'to': end_date.isoformat(),
+        'slot': slot
+    }), 200
 
 @availability_routes.route('/doctors/<int:doctor_id>/availability', methods=['POST'])
 def add_doctor_availability(doctor_id):
@@ -190,95 +539,120 @@ def add_doctor_availability(doctor_id):
     if not user_id:
         return jsonify({'error': 'Not authenticated'}), 401
         
-    user = User.query.get(user_id)
+    user = principal_cache.get(user_id)
     
     if not user or user.role != 'doctor' or user.id != doctor_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json() or {}
     
-    # Check for required fields - support both the old format and new format with availableSlots
-    required_fields = ('dayOfWeek', 'isAvailable')
-    if not all(k in data for k in required_fields):
-        return jsonify({'error': 'Missing required fields'}), 400
+    try:
+        values = parse_availability_entry(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Check for either availableSlots or the start/end time pair
-    if 'availableSlots' not in data and not all(k in data for k in ('startTime', 'endTime')):
-        return jsonify({'error': 'Missing required fields. Either provide availableSlots or startTime/endTime'}), 400
-    
-    # Set default startTime and endTime when using availableSlots
-    if 'availableSlots' in data and isinstance(data['availableSlots'], list) and data['availableSlots']:
-        # If we have available slots and no start/end times, calculate them from the slots
-        if 'startTime' not in data or 'endTime' not in data:
-            # Sort slots to find earliest and latest times
-            sorted_slots = sorted(data['availableSlots'])
-            if sorted_slots:
-                data['startTime'] = sorted_slots[0]
-                
-                # Get the last slot and add 30 minutes for the endTime
-                latest_slot = sorted_slots[-1]
-                hour, minute = map(int, latest_slot.split(':'))
-                
-                # Add 30 minutes
-                minute += 30
-                if minute >= 60:
-                    hour += 1
-                    minute -= 60
-                
-                data['endTime'] = f"{hour:02d}:{minute:02d}"
-    
-    # If date is provided, we're dealing with a specific date availability
-    specific_date = None
-    if 'date' in data and data['date']:
-        try:
-            specific_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-        except ValueError:
-            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
-        
+    if values['date'] is not None:
         # Check if availability already exists for this specific date
         existing = Availability.query.filter_by(
             doctor_id=doctor_id, 
-            date=specific_date
+            date=values['date']
         ).first()
     else:
         # Check if availability already exists for this day of week
         existing = Availability.query.filter_by(
             doctor_id=doctor_id, 
-            day_of_week=data['dayOfWeek'],
+            day_of_week=values['day_of_week'],
             date=None  # No specific date
         ).first()
     
-    # Extract available_slots from data
-    available_slots = data.get('availableSlots', [])
-    
     if existing:
         # Update existing availability
-        existing.start_time = data['startTime']
-        existing.end_time = data['endTime']
-        existing.is_available = data['isAvailable']
-        existing.available_slots = available_slots
+        existing.is_available = values['is_available']
+        existing.set_slots(values['available_slots'], values['start_time'], values['end_time'])
+        bump_availability_version(doctor_id)
         db.session.commit()
+        invalidation_bus.bump('schedule', doctor_id)
+        slot_events.publish(doctor_id, AVAILABILITY_CHANGED)
         return jsonify(existing.to_dict()), 200
     else:
         # Create new availability
         availability = Availability(
             doctor_id=doctor_id,
-            day_of_week=data['dayOfWeek'],
-            date=specific_date,
-            start_time=data['startTime'],
-            end_time=data['endTime'],
-            is_available=data['isAvailable'],
-            available_slots=available_slots
+            day_of_week=values['day_of_week'],
+            date=values['date'],
+            is_available=values['is_available']
         )
+        availability.set_slots(values['available_slots'], values['start_time'], values['end_time'])
         db.session.add(availability)
+        bump_availability_version(doctor_id)
         db.session.commit()
+        invalidation_bus.bump('schedule', doctor_id)
+        slot_events.publish(doctor_id, AVAILABILITY_CHANGED)
         return jsonify(availability.to_dict()), 201
 
+# Most entries accepted by one bulk availability request
+AVAILABILITY_BULK_MAX = 100
+
+@availability_routes.route('/doctors/<int:doctor_id>/availability/bulk', methods=['POST'])
+def bulk_upsert_doctor_availability(doctor_id):
+    """Create or update many days/dates of availability in one transaction"""
+    # Get user from session instead of JWT
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not authenticated'}), 401
+        
+    user = principal_cache.get(user_id)
+    
+    if not user or user.role != 'doctor' or user.id != doctor_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    data = request.get_json() or {}
+    entries = data.get('entries') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'Provide a non-empty list of availability entries'}), 400
+    
+    if len(entries) > AVAILABILITY_BULK_MAX:
+        return jsonify({'error': f'At most {AVAILABILITY_BULK_MAX} entries per request'}), 400
+    
+    # Validate every entry before writing anything
+    parsed = []
+    errors = []
+    seen = set()
+    for index, entry in enumerate(entries):
+        try:
+            values = parse_availability_entry(entry)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        
+        key = availability_key(values)
+        if key in seen:
+            errors.append({'index': index, 'error': 'Duplicate entry for the same date or day of week'})
+            continue
+        seen.add(key)
+        parsed.append(values)
+    
+    if errors:
+        return jsonify({'error': 'Invalid availability entries', 'results': errors}), 400
+    
+    saved = upsert_availability(doctor_id, parsed)
+    invalidation_bus.bump('schedule', doctor_id)
+    slot_events.publish(doctor_id, AVAILABILITY_CHANGED)
+    
+    return jsonify({
+        'results': [
+            {'index': index, 'status': 'created' if created else 'updated', 'availability': availability.to_dict()}
+            for index, (availability, created) in enumerate(saved)
+        ]
+    }), 200
+
 @bp.route('/appointments', methods=['POST'])
 @jwt_required()
+@idempotent
+@rate_limiter.limited('booking', 'booking', identity=get_jwt_identity)
 def create_appointment():
     identity = get_jwt_identity()
-    user = User.query.get(int(identity))
+    user = principal_cache.get(identity)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -295,7 +669,7 @@ def create_appointment():
         patient_id = data['patientId']
         
         # Verify the patient exists
-        patient = User.query.get(patient_id)
+        patient = principal_cache.get(patient_id)
         if not patient or patient.role != 'patient':
             return jsonify({'error': 'Patient not found'}), 404
             
@@ -306,7 +680,7 @@ def create_appointment():
         return jsonify({'error': 'Only patients and doctors can book appointments'}), 403
     
     # Validate doctor exists
-    doctor = User.query.get(data['doctorId'])
+    doctor = principal_cache.get(data['doctorId'])
     if not doctor or doctor.role != 'doctor':
         return jsonify({'error': 'Doctor not found'}), 404
     
@@ -316,70 +690,205 @@ def create_appointment():
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use ISO format'}), 400
     
+    try:
+        duration = parse_duration(data.get('duration', 30))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Create new appointment
-    appointment = Appointment(
-        doctor_id=data['doctorId'],
-        patient_id=patient_id,
-        date=appointment_date,
-        duration=data.get('duration', 30),
-        type=data['type'],
-        status='scheduled',
-        notes=data.get('notes', '')
-    )
+    def build_appointment():
+        return Appointment(
+            doctor_id=data['doctorId'],
+            patient_id=patient_id,
+            date=appointment_date,
+            duration=duration,
+            type=data['type'],
+            status='scheduled',
+            notes=data.get('notes', '')
+        )
     
-    db.session.add(appointment)
-    db.session.commit()
+    # Commit only if the doctor has no overlapping scheduled appointment
+    try:
+        appointment = save_booking(build_appointment)
+    except BookingConflict:
+        return jsonify({'error': 'This time slot is already booked'}), 409
+    invalidation_bus.bump('schedule', appointment.doctor_id)
+    slot_events.publish_booking(appointment.doctor_id, None, (appointment.date, appointment.duration))
     
     return jsonify(appointment.to_dict()), 201
 
+@bp.route('/appointments/import', methods=['POST'])
+@jwt_required()
+def import_doctor_appointments():
+    """Stream a CSV or NDJSON request body of the current doctor's historical appointments into the database"""
+    identity = get_jwt_identity()
+    doctor = principal_cache.get(identity)
+    
+    if not doctor or doctor.role != 'doctor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': f"Invalid format. Use one of: {', '.join(IMPORT_FORMATS)}"}), 400
+    
+    # Read the body as a stream so large files are never held in memory
+    report = import_appointments(request.stream, fmt, doctor_id=doctor.id)
+    invalidation_bus.bump('schedule', doctor.id)
+    
+    return jsonify(report.to_dict()), 200
+
+@bp.route('/appointments/export', methods=['GET'])
+@jwt_required()
+def export_appointments():
+    """Stream the current user's appointments as NDJSON or CSV without building the result in memory"""
+    identity = get_jwt_identity()
+    user = principal_cache.get(identity)
+    
+    if not user or user.role not in ('doctor', 'patient'):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    if user.role == 'doctor':
+        query = export_query(doctor_id=user.id)
+    else:
+        query = export_query(patient_id=user.id)
+    
+    # Validate the filters before the response starts, errors can't be reported once rows are streaming
+    try:
+        query = filter_appointments(query, request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    response = Response(stream_with_context(stream_appointments(query, fmt)), mimetype=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=appointments.{fmt}'
+    return response
+
 @bp.route('/appointments/doctor', methods=['GET'])
 @jwt_required()
 def get_doctor_appointments():
     identity = get_jwt_identity()
-    doctor = User.query.get(int(identity))
+    doctor = principal_cache.get(identity)
     
     if not doctor or doctor.role != 'doctor':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    appointments = Appointment.query.filter_by(doctor_id=doctor.id).all()
+    # Answer revalidations from the user's appointment list version without running the list query
+    etag = version_etag('appointments', doctor.id, user_version(User.appointments_version, doctor.id))
+    response = not_modified(etag)
+    if response:
+        return response
+    
+    query = doctor_appointments_query(doctor.id)
+    
+    try:
+        query = filter_appointments(query, request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    # Paginate only when the client asks for it so existing callers keep getting a plain list
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    if paginated:
+        try:
+            rows, next_cursor = fetch_appointment_page(query, request.args)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor or limit'}), 400
+    else:
+        rows = query.order_by(Appointment.date, Appointment.id).all()
     
-    # Include patient name in response
-    results = []
-    for appointment in appointments:
-        data = appointment.to_dict()
-        patient = User.query.get(appointment.patient_id)
-        data['patientName'] = patient.full_name if patient else "Unknown"
-        results.append(data)
+    results = appointment_list_entries(rows, 'doctor')
     
-    return jsonify(results), 200
+    if paginated:
+        return with_etag(json_response({'appointments': results, 'next_cursor': next_cursor}), etag)
+    
+    return with_etag(json_response(results), etag)
 
 @bp.route('/appointments/patient', methods=['GET'])
 @jwt_required()
 def get_patient_appointments():
     identity = get_jwt_identity()
-    patient = User.query.get(int(identity))
+    patient = principal_cache.get(identity)
     
     if not patient or patient.role != 'patient':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    appointments = Appointment.query.filter_by(patient_id=patient.id).all()
+    # Answer revalidations from the user's appointment list version without running the list query
+    etag = version_etag('appointments', patient.id, user_version(User.appointments_version, patient.id))
+    response = not_modified(etag)
+    if response:
+        return response
+    
+    query = patient_appointments_query(patient.id)
     
-    # Include doctor name and specialization in response
-    results = []
-    for appointment in appointments:
-        data = appointment.to_dict()
-        doctor = User.query.get(appointment.doctor_id)
-        data['doctorName'] = doctor.full_name if doctor else "Unknown"
-        data['doctorSpecialization'] = doctor.specialization if doctor else ""
-        results.append(data)
+    try:
+        query = filter_appointments(query, request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    # Paginate only when the client asks for it so existing callers keep getting a plain list
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    if paginated:
+        try:
+            rows, next_cursor = fetch_appointment_page(query, request.args)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor or limit'}), 400
+    else:
+        rows = query.order_by(Appointment.date, Appointment.id).all()
+    
+    results = appointment_list_entries(rows, 'patient')
+    
+    if paginated:
+        return with_etag(json_response({'appointments': results, 'next_cursor': next_cursor}), etag)
+    
+    return with_etag(json_response(results), etag)
+
+@bp.route('/appointments/changes', methods=['GET'])
+@jwt_required()
+# Cursors only settle CHANGES_SETTLE behind now; a lagging replica could let one skip changes
+@reads_primary
+def get_appointment_changes():
+    """Appointments of the current doctor or patient created, updated or cancelled since the `since` cursor"""
+    identity = get_jwt_identity()
+    user = principal_cache.get(identity)
+    
+    if not user or user.role not in ('doctor', 'patient'):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if user.role == 'doctor':
+        query = doctor_appointments_query(user.id)
+    else:
+        query = patient_appointments_query(user.id)
+    query = query.add_columns(Appointment.updated_at, Appointment.version)
     
-    return jsonify(results), 200
+    try:
+        rows, next_cursor, has_more = fetch_appointment_changes(query, request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    # Same entries as the appointment lists, plus what changed
+    changes = appointment_list_entries(rows, user.role)
+    updated = utc_to_chicago_isoformats([row.updated_at for row in rows])
+    for row, data, updated_at in zip(rows, changes, updated):
+        data['version'] = row.version
+        data['updatedAt'] = updated_at
+        if row.version == 1:
+            data['change'] = 'created'
+        elif row.status == 'cancelled':
+            data['change'] = 'cancelled'
+        else:
+            data['change'] = 'updated'
+    
+    return json_response({'changes': changes, 'next_cursor': next_cursor, 'has_more': has_more})
 
 @bp.route('/appointments/<int:appointment_id>', methods=['PUT'])
 @jwt_required()
+@idempotent
+@rate_limiter.limited('booking', 'booking', identity=get_jwt_identity)
 def update_appointment(appointment_id):
     identity = get_jwt_identity()
-    user = User.query.get(int(identity))
+    user = principal_cache.get(identity)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -395,28 +904,52 @@ def update_appointment(appointment_id):
     
     data = request.get_json() or {}
     
-    # Update fields
-    if 'status' in data:
-        appointment.status = data['status']
+    # The slot the appointment held, for the slot events published after the update
+    booked_before = (appointment.date, appointment.duration) if appointment.status == 'scheduled' else None
     
-    if 'notes' in data:
-        appointment.notes = data['notes']
+    # Validate the new date up front; it only applies if the appointment stays "scheduled"
+    new_date = None
+    if data.get('status', appointment.status) == 'scheduled' and 'date' in data:
+        try:
+            new_date = parse_iso_in_chicago(data['date'])
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use ISO format'}), 400
     
-    # Only allow rescheduling if status is still "scheduled"
-    if appointment.status == 'scheduled':
-        if 'date' in data:
-            try:
-                appointment.date = parse_iso_in_chicago(data['date'])
-            except ValueError:
-                return jsonify({'error': 'Invalid date format. Use ISO format'}), 400
+    if 'duration' in data:
+        try:
+            parse_duration(data['duration'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    def apply_changes():
+        # Update fields
+        if 'status' in data:
+            appointment.status = data['status']
         
-        if 'duration' in data:
-            appointment.duration = data['duration']
+        if 'notes' in data:
+            appointment.notes = data['notes']
         
-        if 'type' in data:
-            appointment.type = data['type']
+        # Only allow rescheduling if status is still "scheduled"
+        if appointment.status == 'scheduled':
+            if new_date is not None:
+                appointment.date = new_date
+            
+            if 'duration' in data:
+                appointment.duration = data['duration']
+            
+            if 'type' in data:
+                appointment.type = data['type']
+        
+        return appointment
     
-    db.session.commit()
+    # Moving the appointment (or scheduling it again) must not overlap another booking
+    try:
+        save_booking(apply_changes, check_conflicts=any(k in data for k in ('date', 'duration', 'status')))
+    except BookingConflict:
+        return jsonify({'error': 'This time slot is already booked'}), 409
+    invalidation_bus.bump('schedule', appointment.doctor_id)
+    booked_after = (appointment.date, appointment.duration) if appointment.status == 'scheduled' else None
+    slot_events.publish_booking(appointment.doctor_id, booked_before, booked_after)
     
     return jsonify(appointment.to_dict()), 200
 
@@ -424,12 +957,20 @@ def update_appointment(appointment_id):
 @jwt_required()
 def get_profile():
     identity = get_jwt_identity()
+    
+    # Every write to the users row moves updated_at, so it versions the profile
+    updated_at = user_version(User.updated_at, int(identity))
+    etag = version_etag('profile', identity, updated_at and updated_at.isoformat())
+    response = not_modified(etag)
+    if response:
+        return response
+    
     user = User.query.get(int(identity))
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    return jsonify(user.to_dict()), 200
+    return with_etag(jsonify(user.to_dict()), etag), 200
 
 @profile_routes.route('/profile', methods=['PUT'])
 @jwt_required()
@@ -505,7 +1046,18 @@ def update_profile():
     # Update the timestamp
     user.updated_at = datetime.utcnow()
     
+    # Appointment lists of the user's doctors/patients show this name and specialization
+    state = db.inspect(user)
+    if state.attrs.full_name.history.has_changes() or state.attrs.specialization.history.has_changes():
+        bump_counterpart_versions(user)
+    
     db.session.commit()
+    invalidation_bus.bump('user', user.id)
+    
+    # The doctor's specialization and directory entry may have changed
+    if user.role == 'doctor':
+        invalidation_bus.bump('schedule', user.id)
+        invalidation_bus.bump('directory', user.id)
     
     return jsonify(user.to_dict()), 200
 
@@ -515,7 +1067,8 @@ def get_doctor_booked_slots(doctor_id):
     date_filter = request.args.get('date')
     
     # Query for scheduled appointments for this doctor
-    query = Appointment.query.filter_by(doctor_id=doctor_id, status='scheduled')
+    query = db.session.query(Appointment.date, Appointment.status)\
+        .filter(Appointment.doctor_id == doctor_id, Appointment.status == 'scheduled')
     
     # Apply date filter if provided
     if date_filter:
@@ -544,18 +1097,14 @@ def get_doctor_booked_slots(doctor_id):
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    appointments = query.all()
-    
-    # Return only time slot information, no personal data
-    slots = []
-    for appointment in appointments:
-        # Get the date in Chicago timezone
-        utc_date = pytz.utc.localize(appointment.date) if appointment.date.tzinfo is None else appointment.date
-        chicago_date = utc_date.astimezone(CHICAGO_TZ)
-        
-        slots.append({
-            'date': chicago_date.isoformat(),
-            'status': appointment.status
-        })
-    
-    return jsonify(slots), 200
\ No newline at end of file
+    # Return only time slot information (dates in Chicago time), no personal data
+    def load_slots():
+        rows = query.all()
+        dates = utc_to_chicago_isoformats([date for date, _ in rows])
+        return dumps([{'date': date, 'status': status} for date, (_, status) in zip(dates, rows)])
+    
+    # Concurrent requests for the same day and version of the doctor's appointments share one query
+    version = user_version(User.appointments_version, doctor_id)
+    db.session.close()  # Not holding a pooled connection while waiting for another request's query
+    body = public_reads.do(('doctor-slots', doctor_id, date_filter, version), load_slots)
+    return json_body_response(body)
\ No newline at end of file
@@ -0,0 +1,71 @@
+from flask import current_app
+from app.models import Appointment, Availability
+from app.timezones import utc_to_chicago_isoformats
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder when orjson isn't installed
+    orjson = None
+    import json
+
+# Columns selected by the list endpoints instead of whole ORM instances; each row serializer
+# below unpacks them in this order
+APPOINTMENT_COLUMNS = (
+    Appointment.id, Appointment.patient_id, Appointment.doctor_id, Appointment.date,
+    Appointment.duration, Appointment.type, Appointment.status, Appointment.notes
+)
+
+AVAILABILITY_COLUMNS = (
+    Availability.id, Availability.doctor_id, Availability.day_of_week, Availability.date,
+    Availability.start_time, Availability.end_time, Availability.is_available, Availability.available_slots
+)
+
+def appointment_rows(rows):
+    """Appointment.to_dict() of each row that starts with APPOINTMENT_COLUMNS.
+    The dates of all rows are converted to Chicago time together."""
+    dates = utc_to_chicago_isoformats([row[3] for row in rows])
+    return [{
+        'id': row[0],
+        'patientId': row[1],
+        'doctorId': row[2],
+        'date': date,
+        'duration': row[4],
+        'type': row[5],
+        'status': row[6],
+        'notes': row[7]
+    } for row, date in zip(rows, dates)]
+
+def availability_row(row):
+    """Availability.to_dict() of an AVAILABILITY_COLUMNS row"""
+    return {
+        'id': row[0],
+        'doctorId': row[1],
+        'dayOfWeek': row[2],
+        'date': row[3].isoformat() if row[3] else None,
+        'startTime': row[4],
+        'endTime': row[5],
+        'isAvailable': row[6],
+        'availableSlots': row[7]
+    }
+
+def field_row(row, fields):
+    """Dict of the named fields of a column row, with dates in ISO format"""
+    entry = dict(zip(fields, row))
+    for field, value in entry.items():
+        if hasattr(value, 'isoformat'):
+            entry[field] = value.isoformat()
+    return entry
+
+def dumps(data):
+    """Encode JSON the way Flask's jsonify does (sorted keys, trailing newline), with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+def json_response(data, status=200):
+    """Response with the same body as `jsonify(data)`, for list endpoints that return many rows"""
+    return json_body_response(dumps(data), status)
+
+def json_body_response(body, status=200):
+    """JSON response for a body already encoded with dumps()"""
+    return current_app.response_class(body, status=status, mimetype='application/json')
@@ -0,0 +1,72 @@
+import threading
+
+class Flight:
+    """One in-flight call and the requests waiting for its result"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one.
+
+    The first caller of do(key, load) runs load(); callers with the same key that arrive while
+    it runs wait for it and get the same result (or exception) instead of running load()
+    themselves. Nothing is cached: once the call returns the next caller runs load() again.
+    Keys are tuples starting with a name (the route) that the metrics are grouped by. Put the
+    data's version in the key so a request never joins a call that started before a write it
+    has already seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> Flight
+        self._counts = {}  # name -> [calls, executions]
+
+    def do(self, key, load):
+        with self._lock:
+            counts = self._counts.setdefault(key[0], [0, 0])
+            counts[0] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                counts[1] += 1
+                flight = self._flights[key] = Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = load()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        """Per name: calls, executions (calls that ran the load), coalesced calls and their ratio to all calls"""
+        with self._lock:
+            return {
+                name: {
+                    'calls': calls,
+                    'executions': executions,
+                    'coalesced': calls - executions,
+                    'coalescing_ratio': round((calls - executions) / calls, 4) if calls else 0.0
+                }
+                for name, (calls, executions) in self._counts.items()
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts.clear()
+
+# Shared by the public read endpoints of this process
+public_reads = SingleFlight()
@@ -0,0 +1,74 @@
+# Fixed-width bitmap encoding of a day's slots: bit i is the slot starting i * SLOT_MINUTES
+# after midnight (Chicago time). 48 half-hour slots fit in a single BIGINT column, and
+# availability/booking arithmetic becomes bitwise AND/OR instead of string-list processing.
+
+# Length of a bookable slot in minutes (the frontend offers 30-minute slots)
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+def time_to_minutes(value):
+    """Convert an 'HH:MM' string to minutes after midnight"""
+    hour, minute = map(int, value.split(':'))
+    return hour * 60 + minute
+
+def minutes_to_time(minutes):
+    """Convert minutes after midnight to an 'HH:MM' string"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def slot_index(value):
+    """Bit index of the slot starting at 'HH:MM', raising ValueError if it is not on the slot grid"""
+    minutes = time_to_minutes(value)
+    if minutes % SLOT_MINUTES or not 0 <= minutes < 24 * 60:
+        raise ValueError(f"Slot {value} is not on the {SLOT_MINUTES}-minute grid")
+    return minutes // SLOT_MINUTES
+
+def slot_time(index):
+    """'HH:MM' start time of the slot at a bit index"""
+    return minutes_to_time(index * SLOT_MINUTES)
+
+def slots_to_bitmap(slots):
+    """Encode a list of 'HH:MM' slot start times"""
+    bitmap = 0
+    for slot in slots:
+        bitmap |= 1 << slot_index(slot)
+    return bitmap
+
+def minutes_to_bitmap(start_minutes, end_minutes):
+    """Bits of every slot overlapping [start_minutes, end_minutes), clipped to the day"""
+    first = max(start_minutes, 0) // SLOT_MINUTES
+    last = min(-(-end_minutes // SLOT_MINUTES), SLOTS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+def range_to_bitmap(start_time, end_time):
+    """Encode the slots between two 'HH:MM' times (end exclusive)"""
+    return minutes_to_bitmap(time_to_minutes(start_time), time_to_minutes(end_time))
+
+def offered_bitmap(available_slots, start_time, end_time):
+    """Bitmap of an availability row's slots: explicit available_slots win, otherwise the start/end range"""
+    if available_slots:
+        return slots_to_bitmap(available_slots)
+    return range_to_bitmap(start_time, end_time)
+
+def iter_slot_indexes(bitmap):
+    """Yield the indexes of the set bits in ascending order"""
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+def bitmap_to_slots(bitmap):
+    """Decode a bitmap into sorted 'HH:MM' slot start times"""
+    return [slot_time(index) for index in iter_slot_indexes(bitmap)]
+
+def first_slot_index(bitmap):
+    """Index of the earliest set slot, or None for an empty bitmap"""
+    return (bitmap & -bitmap).bit_length() - 1 if bitmap else None
+
+def bitmap_bounds(bitmap):
+    """('HH:MM' start of the first slot, 'HH:MM' end of the last slot), or None for an empty bitmap"""
+    if not bitmap:
+        return None
+    return slot_time(first_slot_index(bitmap)), minutes_to_time(bitmap.bit_length() * SLOT_MINUTES)
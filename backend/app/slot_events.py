@@ -0,0 +1,169 @@
+from collections import deque, namedtuple
+import threading
+import uuid
+from app.serializers import dumps
+from app.timezones import utc_to_chicago_isoformat
+from app.invalidation import invalidation_bus
+
+# Recent events kept per watched doctor, replayed to clients that reconnect with Last-Event-ID
+SLOT_EVENT_BACKLOG = 100
+
+# Seconds between keep-alive comments on a stream without events (proxies drop silent connections)
+SLOT_EVENT_HEARTBEAT = 15
+
+# Milliseconds the browser waits before reconnecting a dropped stream
+SLOT_EVENT_RETRY = 3000
+
+# Bus channel that carries events to the other workers
+SLOT_EVENT_CHANNEL = 'slot_events'
+
+# Event types
+SLOT_BOOKED = 'slot-booked'
+SLOT_CANCELLED = 'slot-cancelled'
+AVAILABILITY_CHANGED = 'availability-changed'
+# Sent instead of events the stream can't replay (unknown Last-Event-ID, or the client fell more
+# than the backlog behind); the client should refetch the doctor's slots
+RESYNC = 'resync'
+
+# seq orders the events of this process; data is the JSON sent to the client
+SlotEvent = namedtuple('SlotEvent', ['seq', 'type', 'data'])
+
+class DoctorChannel:
+    """Backlog of one doctor's events and the condition its subscribers wait on"""
+
+    def __init__(self, backlog):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=backlog)
+        self.dropped_through = 0  # seq of the newest event pushed out of the backlog
+        self.subscribers = 0
+
+class SlotEventHub:
+    """In-process pub/sub of doctor slot changes for Server-Sent Events streams.
+
+    Writers publish after committing; the event is appended to the doctor's backlog and every
+    stream waiting on that doctor wakes up. Subscribers hold no queue of their own, just their
+    position in the backlog, so an idle stream costs one waiting generator. Events are relayed
+    to the other workers through the invalidation bus, which deliver them to their own streams.
+    Only doctors that have been watched in this process keep a backlog.
+    """
+
+    def __init__(self, backlog=SLOT_EVENT_BACKLOG, heartbeat=SLOT_EVENT_HEARTBEAT):
+        self.backlog = backlog
+        self.heartbeat = heartbeat
+        # Event ids are only meaningful to the process that issued them
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._channels = {}  # doctor_id -> DoctorChannel
+
+    def publish(self, doctor_id, event_type, **data):
+        """Send an event to every stream of the doctor, in all workers (call after commit)"""
+        payload = dict(data, doctorId=doctor_id)
+        self._deliver(doctor_id, event_type, payload)
+        invalidation_bus.relay(SLOT_EVENT_CHANNEL, {'type': event_type, 'data': payload})
+
+    def publish_booking(self, doctor_id, before, after):
+        """Publish what an appointment write did to the doctor's slots. `before` and `after` are the
+        appointment's (date, duration) while it was / is scheduled, or None when it wasn't / isn't."""
+        if before == after:
+            return
+        if before is not None:
+            self.publish(doctor_id, SLOT_CANCELLED, date=utc_to_chicago_isoformat(before[0]), duration=before[1])
+        if after is not None:
+            self.publish(doctor_id, SLOT_BOOKED, date=utc_to_chicago_isoformat(after[0]), duration=after[1])
+
+    def subscriber_count(self, doctor_id=None):
+        """Open streams of a doctor, or of all doctors, in this process"""
+        with self._lock:
+            channels = self._channels.values() if doctor_id is None else [self._channels.get(doctor_id)]
+            return sum(channel.subscribers for channel in channels if channel is not None)
+
+    def event_id(self, event):
+        return f'{self.epoch}-{event.seq}'
+
+    def subscribe(self, doctor_id, last_event_id=None):
+        """Generator of a doctor's events for one stream: those after last_event_id that are still
+        in the backlog (or a RESYNC event if they aren't), then new events as they are published.
+        Yields None after `heartbeat` seconds without events. Close it to unsubscribe."""
+        with self._lock:
+            channel = self._channels.get(doctor_id)
+            if channel is None:
+                channel = self._channels[doctor_id] = DoctorChannel(self.backlog)
+            channel.subscribers += 1
+            position = self._seq
+
+        try:
+            if last_event_id:
+                replay_from = self._parse_event_id(last_event_id)
+                with channel.condition:
+                    if replay_from is None or replay_from < channel.dropped_through:
+                        resync = True
+                    else:
+                        resync = False
+                        position = min(position, replay_from)
+                if resync:
+                    yield SlotEvent(position, RESYNC, {'doctorId': doctor_id})
+
+            while True:
+                with channel.condition:
+                    pending = self._pending(channel, position)
+                    if pending == []:
+                        channel.condition.wait(self.heartbeat)
+                        pending = self._pending(channel, position)
+                    if pending is None:
+                        # Fell more than the backlog behind
+                        position = channel.events[-1].seq
+                        pending = [SlotEvent(position, RESYNC, {'doctorId': doctor_id})]
+
+                if not pending:
+                    yield None
+                for event in pending:
+                    position = max(position, event.seq)
+                    yield event
+        finally:
+            with self._lock:
+                channel.subscribers -= 1
+
+    def _pending(self, channel, position):
+        """Events after position, or None if some of them were already dropped from the backlog"""
+        if channel.dropped_through > position:
+            return None
+        return [event for event in channel.events if event.seq > position]
+
+    def _parse_event_id(self, event_id):
+        epoch, _, seq = event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _deliver(self, doctor_id, event_type, data):
+        with self._lock:
+            channel = self._channels.get(doctor_id)
+        if channel is None:
+            return
+
+        with channel.condition:
+            # Numbered while holding the condition so each backlog stays in seq order
+            with self._lock:
+                self._seq += 1
+                seq = self._seq
+            if len(channel.events) == channel.events.maxlen:
+                channel.dropped_through = channel.events[0].seq
+            channel.events.append(SlotEvent(seq, event_type, data))
+            channel.condition.notify_all()
+
+    def _receive(self, message):
+        data = message['data']
+        self._deliver(data['doctorId'], message['type'], data)
+
+    def format(self, event):
+        """The event (or a keep-alive comment for None) in text/event-stream framing"""
+        if event is None:
+            return b': keep-alive\n\n'
+        return b'id: %s\nevent: %s\ndata: %s\n' % (
+            self.event_id(event).encode(), event.type.encode(), dumps(event.data)
+        )
+
+# Shared by all requests of this process
+slot_events = SlotEventHub()
+invalidation_bus.listen(SLOT_EVENT_CHANNEL, slot_events._receive)
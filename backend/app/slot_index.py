@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+import threading
+import time
+import pytz
+from app.models import User
+from app.slots import free_slot_bitmaps, slot_start_utc
+from app.slot_bitmap import SLOT_MINUTES, FULL_DAY, iter_slot_indexes, first_slot_index
+from app.timezones import utc_to_chicago
+from app.invalidation import invalidation_bus
+from app.replicas import primary
+
+# Number of days, starting today (Chicago), that the index covers
+INDEX_HORIZON_DAYS = 60
+
+# Rebuild the whole index at least this often (seconds) to pick up writes made by other processes
+INDEX_MAX_AGE = 300
+
+class FreeSlotIndex:
+    """In-memory index of free slots for every doctor over the next INDEX_HORIZON_DAYS days.
+
+    For each (specialization, date) it keeps the OR of the doctors' free-slot bitmaps and, per
+    slot, the set of doctors free at that time. Finding the earliest open slot for a
+    specialization then walks the requested days, not the doctors. Writes mark the affected
+    doctor dirty and the doctor is recomputed (one bulk query per table) before the next search.
+    """
+
+    def __init__(self, horizon_days=INDEX_HORIZON_DAYS, max_age=INDEX_MAX_AGE):
+        self.horizon_days = horizon_days
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._start_date = None
+        self._built_at = 0
+        self._dirty = set()
+        self._specializations = {}  # doctor_id -> specialization
+        self._doctor_days = {}  # doctor_id -> {date: free bitmap}
+        self._day_bitmaps = {}  # (specialization, date) -> OR of the doctors' free bitmaps
+        self._slot_doctors = {}  # (specialization, date) -> {slot index: set of doctor ids}
+
+    def invalidate_doctor(self, doctor_id):
+        """Mark a doctor's free slots as stale after an appointment, availability or profile write
+        (every doctor's with None)"""
+        if doctor_id is None:
+            self.invalidate_all()
+            return
+        with self._lock:
+            self._dirty.add(doctor_id)
+
+    def invalidate_all(self):
+        """Force a full rebuild on the next search"""
+        with self._lock:
+            self._start_date = None
+
+    def horizon_end(self, today):
+        """Last date the index covers when built on `today`"""
+        return today + timedelta(days=self.horizon_days - 1)
+
+    def earliest_slot(self, specialization, start_date, end_date, now=None):
+        """Earliest free slot of any doctor with the given specialization between two Chicago dates.
+        Returns (doctor_id, aware UTC start) or None. Dates outside the index horizon are ignored."""
+        now = now or datetime.now(pytz.utc)
+        local_now = utc_to_chicago(now)
+        today = local_now.date()
+
+        with self._lock:
+            # Refreshed only on invalidation, so read from the primary rather than a lagging replica
+            with primary():
+                self._ensure_fresh(today)
+
+            day = max(start_date, today)
+            last = min(end_date, self.horizon_end(today))
+            while day <= last:
+                bitmap = self._day_bitmaps.get((specialization, day), 0)
+                if day == today:
+                    # Only slots that have not started yet
+                    minutes = local_now.hour * 60 + local_now.minute
+                    first_open = -(-minutes // SLOT_MINUTES)
+                    bitmap &= FULL_DAY & ~((1 << first_open) - 1)
+                if bitmap:
+                    index = first_slot_index(bitmap)
+                    doctor_id = min(self._slot_doctors[(specialization, day)][index])
+                    return doctor_id, slot_start_utc(day, index)
+                day += timedelta(days=1)
+        return None
+
+    def _ensure_fresh(self, today):
+        if self._start_date != today or time.monotonic() - self._built_at > self.max_age:
+            self._rebuild(today)
+        elif self._dirty:
+            self._refresh(self._dirty)
+        self._dirty = set()
+
+    def _rebuild(self, today):
+        # Query before touching the index, so a failed query leaves it stale (and rebuilt on the
+        # next search) rather than fresh and empty
+        doctors = User.query.with_entities(User.id, User.specialization).filter(User.role == 'doctor').all()
+        free = free_slot_bitmaps([doctor_id for doctor_id, _ in doctors], today, self.horizon_end(today))
+
+        self._start_date = today
+        self._built_at = time.monotonic()
+        self._specializations = {}
+        self._doctor_days = {}
+        self._day_bitmaps = {}
+        self._slot_doctors = {}
+        for doctor_id, specialization in doctors:
+            self._add_doctor(doctor_id, specialization, free[doctor_id])
+
+    def _refresh(self, doctor_ids):
+        doctor_ids = list(doctor_ids)
+        doctors = User.query.with_entities(User.id, User.specialization)\
+            .filter(User.id.in_(doctor_ids), User.role == 'doctor')\
+            .all()
+        free = free_slot_bitmaps([doctor_id for doctor_id, _ in doctors],
+                                 self._start_date, self.horizon_end(self._start_date))
+
+        for doctor_id in doctor_ids:
+            self._remove_doctor(doctor_id)
+        for doctor_id, specialization in doctors:
+            self._add_doctor(doctor_id, specialization, free[doctor_id])
+
+    def _add_doctor(self, doctor_id, specialization, days):
+        self._specializations[doctor_id] = specialization
+        self._doctor_days[doctor_id] = days
+        for day, bitmap in days.items():
+            key = (specialization, day)
+            self._day_bitmaps[key] = self._day_bitmaps.get(key, 0) | bitmap
+            slots = self._slot_doctors.setdefault(key, {})
+            for index in iter_slot_indexes(bitmap):
+                slots.setdefault(index, set()).add(doctor_id)
+
+    def _remove_doctor(self, doctor_id):
+        specialization = self._specializations.pop(doctor_id, None)
+        for day, bitmap in self._doctor_days.pop(doctor_id, {}).items():
+            key = (specialization, day)
+            slots = self._slot_doctors[key]
+            for index in iter_slot_indexes(bitmap):
+                slots[index].discard(doctor_id)
+                if not slots[index]:
+                    del slots[index]
+                    self._day_bitmaps[key] &= ~(1 << index)
+
+# Invalidated by appointment, availability and doctor profile writes of every worker
+free_slot_index = FreeSlotIndex()
+invalidation_bus.subscribe('schedule', free_slot_index.invalidate_doctor)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import or_
+from app import db
+from app.models import Appointment, Availability
+from app.timezones import utc_to_chicago, chicago_to_utc, chicago_day_start_utc
+from app.slot_bitmap import SLOT_MINUTES, minutes_to_bitmap, iter_slot_indexes
+
+# How far before the range we look for bookings that may run into it
+BOOKING_LOOKBACK = timedelta(days=1)
+
+def js_day_of_week(day):
+    """Day of week as stored in Availability.day_of_week (0 = Sunday, like JavaScript's getDay)"""
+    return (day.weekday() + 1) % 7
+
+def expand_availability(availabilities, start_date, end_date):
+    """Yield (date, availability) for each working day between two dates (inclusive).
+    A row for a specific date overrides the weekly template for that day, and a row
+    marked unavailable makes the day a day off."""
+    weekly = {}
+    specific = {}
+    for availability in availabilities:
+        if availability.date is None:
+            weekly.setdefault(availability.day_of_week, availability)
+        else:
+            specific.setdefault(availability.date, availability)
+
+    day = start_date
+    while day <= end_date:
+        if day in specific:
+            availability = specific[day]
+        else:
+            availability = weekly.get(js_day_of_week(day))
+        if availability is not None and availability.is_available:
+            yield day, availability
+        day += timedelta(days=1)
+
+def booked_bitmaps(bookings):
+    """Map each Chicago date to the bitmap of slots overlapped by the given (start, duration) bookings.
+    Bookings that run past midnight also mark the start of the next day."""
+    booked = {}
+    for start, duration in bookings:
+        local_start = utc_to_chicago(start)
+        day = local_start.date()
+        start_minutes = local_start.hour * 60 + local_start.minute
+        end_minutes = start_minutes + (duration or SLOT_MINUTES)
+        while end_minutes > 0:
+            booked[day] = booked.get(day, 0) | minutes_to_bitmap(start_minutes, end_minutes)
+            day += timedelta(days=1)
+            start_minutes, end_minutes = 0, end_minutes - 24 * 60
+    return booked
+
+def free_slot_bitmaps(doctor_ids, start_date, end_date):
+    """Free-slot bitmaps per doctor and Chicago date between two dates (inclusive).
+    Returns {doctor_id: {date: bitmap}} with only non-empty days. Runs one availability query
+    and one appointment query no matter how many doctors or days are requested."""
+    doctor_ids = list(doctor_ids)
+    if not doctor_ids:
+        return {}
+
+    range_start = chicago_day_start_utc(start_date)
+    range_end = chicago_day_start_utc(end_date + timedelta(days=1))
+
+    availabilities = Availability.query.filter(
+        Availability.doctor_id.in_(doctor_ids),
+        or_(Availability.date.is_(None), Availability.date.between(start_date, end_date))
+    ).all()
+
+    bookings = db.session.query(Appointment.doctor_id, Appointment.date, Appointment.duration)\
+        .filter(
+            Appointment.doctor_id.in_(doctor_ids),
+            Appointment.status == 'scheduled',
+            Appointment.date >= range_start - BOOKING_LOOKBACK,
+            Appointment.date < range_end
+        )\
+        .all()
+
+    availabilities_by_doctor = {doctor_id: [] for doctor_id in doctor_ids}
+    for availability in availabilities:
+        availabilities_by_doctor[availability.doctor_id].append(availability)
+
+    bookings_by_doctor = {doctor_id: [] for doctor_id in doctor_ids}
+    for doctor_id, date, duration in bookings:
+        bookings_by_doctor[doctor_id].append((date, duration))
+
+    free = {}
+    for doctor_id in doctor_ids:
+        booked = booked_bitmaps(bookings_by_doctor[doctor_id])
+        days = {}
+        for day, availability in expand_availability(availabilities_by_doctor[doctor_id], start_date, end_date):
+            bitmap = availability.offered_slot_bitmap() & ~booked.get(day, 0)
+            if bitmap:
+                days[day] = bitmap
+        free[doctor_id] = days
+    return free
+
+def slot_start_utc(day, index):
+    """Aware UTC start of the slot at a bit index on a Chicago date"""
+    midnight = datetime.combine(day, datetime.min.time())
+    return chicago_to_utc(midnight + timedelta(minutes=index * SLOT_MINUTES))
+
+def find_free_slots(doctor_ids, start_date, end_date, now=None):
+    """Free slots per doctor between two Chicago dates (inclusive).
+    Returns {doctor_id: [(start, end), ...]} with aware UTC datetimes sorted by start.
+    Slots that start before `now` are dropped."""
+    now = now or datetime.now(pytz.utc)
+    free_slots = {}
+    for doctor_id, days in free_slot_bitmaps(doctor_ids, start_date, end_date).items():
+        slots = []
+        for day in sorted(days):
+            for index in iter_slot_indexes(days[day]):
+                start = slot_start_utc(day, index)
+                if start >= now:
+                    slots.append((start, start + timedelta(minutes=SLOT_MINUTES)))
+        free_slots[doctor_id] = slots
+    return free_slots
@@ -0,0 +1,102 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+import pytz
+
+# Set Chicago timezone for consistent handling with frontend
+CHICAGO_TZ = pytz.timezone('America/Chicago')
+
+# Range the transition table is built over, and the sampling step; Chicago's offset never
+# changes twice within a step, and pytz keeps the last offset after 2037
+TRANSITIONS_FROM_YEAR = 1850
+TRANSITIONS_TO_YEAR = 2040
+TRANSITIONS_STEP = timedelta(days=28)
+
+def chicago_offset_at(utc_naive):
+    """Chicago's UTC offset at a naive UTC instant"""
+    return pytz.utc.localize(utc_naive).astimezone(CHICAGO_TZ).utcoffset()
+
+def chicago_transitions():
+    """UTC instants (naive) at which Chicago's UTC offset changes, starting with datetime.min,
+    and the offset in effect from each. Found through the public tzinfo API: the offset is
+    sampled every TRANSITIONS_STEP and each change is narrowed down to the second."""
+    moment = datetime(TRANSITIONS_FROM_YEAR, 1, 1)
+    transitions, offsets = [datetime.min], [chicago_offset_at(moment)]
+    while moment.year < TRANSITIONS_TO_YEAR:
+        following = moment + TRANSITIONS_STEP
+        if chicago_offset_at(following) != offsets[-1]:
+            low, high = 0, int(TRANSITIONS_STEP.total_seconds())
+            while high - low > 1:
+                middle = (low + high) // 2
+                if chicago_offset_at(moment + timedelta(seconds=middle)) == offsets[-1]:
+                    low = middle
+                else:
+                    high = middle
+            transitions.append(moment + timedelta(seconds=high))
+            offsets.append(chicago_offset_at(transitions[-1]))
+        moment = following
+    return transitions, offsets
+
+# UTC instants at which Chicago's UTC offset changes, and the (offset, ISO suffix) in effect from each.
+# Built once at import so bulk rendering needs no per-value pytz calls
+CHICAGO_TRANSITIONS, _offsets = chicago_transitions()
+CHICAGO_OFFSETS = [(offset, datetime(2000, 1, 1, tzinfo=timezone(offset)).isoformat()[19:]) for offset in _offsets]
+del _offsets
+
+# Helper functions for timezone handling
+def utc_to_chicago(utc_dt):
+    """Convert UTC datetime to Chicago timezone"""
+    if utc_dt.tzinfo is None:
+        utc_dt = pytz.utc.localize(utc_dt)
+    return utc_dt.astimezone(CHICAGO_TZ)
+
+def chicago_to_utc(chicago_dt):
+    """Convert Chicago datetime to UTC timezone"""
+    if chicago_dt.tzinfo is None:
+        chicago_dt = CHICAGO_TZ.localize(chicago_dt)
+    return chicago_dt.astimezone(pytz.utc)
+
+def parse_iso_in_chicago(iso_string):
+    """Parse ISO string into a UTC datetime, interpreting offsets correctly and assuming Chicago local time when no offset is present"""
+    # Handle ISO strings ending with 'Z' (UTC)
+    if iso_string.endswith('Z'):
+        # Convert 'Z' to +00:00 for fromisoformat
+        dt = datetime.fromisoformat(iso_string.replace('Z', '+00:00'))
+        # Already in UTC, return as-is
+        return dt.astimezone(pytz.utc)
+    # Parse with possible offset
+    dt = datetime.fromisoformat(iso_string)
+    # If no tzinfo, assume it's in Chicago local time
+    if dt.tzinfo is None:
+        dt = CHICAGO_TZ.localize(dt)
+    # Convert to UTC for storage
+    return dt.astimezone(pytz.utc)
+
+def chicago_day_start_utc(day):
+    """Return the UTC datetime at which the given Chicago calendar day starts"""
+    return CHICAGO_TZ.localize(datetime.combine(day, datetime.min.time())).astimezone(pytz.utc)
+
+def utc_to_chicago_isoformats(values):
+    """Render a column of UTC datetimes (naive as stored, or aware) as Chicago ISO strings in one pass.
+    Gives the same strings as utc_to_chicago(value).isoformat(); None stays None. Each value is looked
+    up in the transition table, and consecutive values in the same DST period (the usual case for
+    date-ordered rows) reuse the previous lookup."""
+    results = []
+    period_start = period_end = None
+    offset = suffix = None
+    for value in values:
+        if value is None:
+            results.append(None)
+            continue
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.utc).replace(tzinfo=None)
+        if period_start is None or not period_start <= value < period_end:
+            index = bisect_right(CHICAGO_TRANSITIONS, value) - 1
+            period_start = CHICAGO_TRANSITIONS[index]
+            period_end = CHICAGO_TRANSITIONS[index + 1] if index + 1 < len(CHICAGO_TRANSITIONS) else datetime.max
+            offset, suffix = CHICAGO_OFFSETS[index]
+        results.append((value + offset).isoformat() + suffix)
+    return results
+
+def utc_to_chicago_isoformat(value):
+    """Chicago ISO string of a single UTC datetime, through the same table as utc_to_chicago_isoformats"""
+    return utc_to_chicago_isoformats([value])[0]
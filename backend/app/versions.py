@@ -0,0 +1,57 @@
+import hashlib
+from flask import request, current_app
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from app import db
+from app.models import User, Appointment
+
+def bump_versions(column, user_ids):
+    """Increment a version counter column of users, in the caller's transaction.
+    `user_ids` is a list of ids or a SELECT of ids. users.updated_at is left alone: it versions
+    the profile, which a counter bump doesn't change."""
+    if not isinstance(user_ids, Select):
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        if not user_ids:
+            return
+    db.session.query(User).filter(User.id.in_(user_ids))\
+        .update({column: column + 1, User.updated_at: User.updated_at}, synchronize_session=False)
+
+def bump_availability_version(doctor_id):
+    """Call before committing a change to a doctor's availability rows"""
+    bump_versions(User.availability_version, [doctor_id])
+
+def bump_appointment_versions(user_ids):
+    """Call before committing a change to appointments of these doctors and patients"""
+    bump_versions(User.appointments_version, user_ids)
+
+def bump_counterpart_versions(user):
+    """Appointment lists show the other party's name (and a doctor's specialization), so when
+    those change, bump the lists of everyone with an appointment with `user`"""
+    if user.role == 'doctor':
+        counterparts = select(Appointment.patient_id).where(Appointment.doctor_id == user.id)
+    else:
+        counterparts = select(Appointment.doctor_id).where(Appointment.patient_id == user.id)
+    bump_appointment_versions(counterparts.distinct())
+
+def user_version(column, user_id):
+    """Current value of a user's version column (None if there is no such user), without loading the row"""
+    return db.session.query(column).filter(User.id == user_id).scalar()
+
+def version_etag(*parts):
+    """Strong ETag for a resource version; the request's query string is part of it since
+    filters and cursors select different documents"""
+    raw = '|'.join(str(part) for part in parts) + '|' + request.query_string.decode()
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def not_modified(etag):
+    """304 response when the client already has this version (If-None-Match), else None"""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        return with_etag(response, etag)
+    return None
+
+def with_etag(response, etag, cache_control='private, no-cache'):
+    """Tag a response and make clients revalidate it before reusing it"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+Login throughput benchmark: inline vs offloaded password hashing.
+Runs concurrent POST /api/login bursts with hashing inline on the request threads
+(PASSWORD_HASH_WORKERS=0) and in the process pool, while another thread keeps requesting
+GET /health. Reports logins per second and the latency of both; with inline hashing a login
+burst delays every other request of the worker.
+
+Also checks that wrong passwords are refused, that a hash made with other parameters is
+upgraded on login, and that a full hashing queue answers 503 with Retry-After.
+
+Usage: python bench_login.py [threads] [logins per thread] [pool workers]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# The app config requires DATABASE_URL; this benchmark always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import User
+from app.passwords import password_hasher
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'bench_login.db')
+
+PASSWORD = 'bench-password'
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+    # Measures hashing, not the login rate limits (every request comes from one address)
+    RATE_LIMITS_ENABLED = False
+    TESTING = True
+
+def make_app(workers, queue_max=BenchConfig.PASSWORD_HASH_QUEUE_MAX):
+    class ModeConfig(BenchConfig):
+        PASSWORD_HASH_WORKERS = workers
+        PASSWORD_HASH_QUEUE_MAX = queue_max
+    return create_app(ModeConfig)
+
+def seed(app, users):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    with app.app_context():
+        db.create_all()
+        # One hash for everyone: seeding shouldn't take users x hashing time
+        password_hash = generate_password_hash(PASSWORD, BenchConfig.PASSWORD_HASH_METHOD)
+        db.session.add_all([
+            User(username=f'bench_{index}', email=f'bench_{index}@example.com', password=password_hash,
+                 full_name=f'Bench {index}', role='patient')
+            for index in range(users)
+        ])
+        db.session.commit()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def run(workers, threads, logins):
+    """One burst of threads x logins; returns (logins/s, login latencies, /health latencies, statuses)"""
+    app = make_app(workers)
+    seed(app, threads)
+    # Start the pool before timing, as a running worker would have it
+    password_hasher.hash('warm-up')
+
+    login_times, health_times, statuses = [], [], []
+    done = threading.Event()
+
+    def login(index):
+        client = app.test_client()
+        for _ in range(logins):
+            started = time.perf_counter()
+            response = client.post('/api/login', json={'username': f'bench_{index}', 'password': PASSWORD})
+            login_times.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/health')
+            health_times.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    started = time.perf_counter()
+    workers_ = [threading.Thread(target=login, args=(index,)) for index in range(threads)]
+    for thread in workers_:
+        thread.start()
+    for thread in workers_:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    prober.join()
+    password_hasher.shutdown()
+    return len(login_times) / elapsed, login_times, health_times, statuses
+
+def check_behaviour(workers):
+    ok = True
+    app = make_app(workers, queue_max=1)
+    seed(app, 1)
+    client = app.test_client()
+
+    response = client.post('/api/login', json={'username': 'bench_0', 'password': 'wrong'})
+    passed = response.status_code == 401
+    print(f"{'✅' if passed else '❌'} a wrong password is refused")
+    ok = ok and passed
+
+    with app.app_context():
+        user = User.query.filter_by(username='bench_0').first()
+        user.password = generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000')
+        db.session.commit()
+    response = client.post('/api/login', json={'username': 'bench_0', 'password': PASSWORD})
+    with app.app_context():
+        stored = User.query.filter_by(username='bench_0').first().password
+    passed = response.status_code == 200 and not password_hasher.needs_rehash(stored)
+    print(f"{'✅' if passed else '❌'} an outdated hash is upgraded on login ({stored.split('$')[0]})")
+    ok = ok and passed
+
+    # With a queue of one, concurrent logins beyond it must be refused rather than queued
+    statuses = []
+    def login():
+        response = app.test_client().post('/api/login', json={'username': 'bench_0', 'password': PASSWORD})
+        statuses.append((response.status_code, response.headers.get('Retry-After')))
+    threads = [threading.Thread(target=login) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    refused = [status for status in statuses if status[0] == 503]
+    passed = refused and all(retry_after for _, retry_after in refused) and (200, None) in statuses
+    print(f"{'✅' if passed else '❌'} a full hashing queue answers 503 with Retry-After "
+          f"({len(refused)} of {len(statuses)} refused)")
+    ok = ok and bool(passed)
+    password_hasher.shutdown()
+    return ok
+
+def bench(threads, logins, workers):
+    ok = check_behaviour(workers)
+    print(f"\n{threads} threads x {logins} logins, {BenchConfig.PASSWORD_HASH_METHOD} hashes, {os.cpu_count()} CPU(s)")
+    print(f"{'hashing':<18}{'logins/s':>10}{'login p50':>11}{'login p95':>11}{'health p50':>12}{'health p95':>12}")
+    for label, mode_workers in (('inline', 0), (f'pool ({workers})', workers)):
+        rate, login_times, health_times, statuses = run(mode_workers, threads, logins)
+        print(f"{label:<18}{rate:>10.1f}{percentile(login_times, 0.5) * 1000:>9.0f}ms"
+              f"{percentile(login_times, 0.95) * 1000:>9.0f}ms{percentile(health_times, 0.5) * 1000:>10.1f}ms"
+              f"{percentile(health_times, 0.95) * 1000:>10.1f}ms")
+        passed = all(status == 200 for status in statuses)
+        if not passed:
+            print(f"❌ {label}: {len([s for s in statuses if s != 200])} logins failed")
+        ok = ok and passed
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else max(2, os.cpu_count() or 1)
+    sys.exit(0 if bench(threads, logins, workers) else 1)
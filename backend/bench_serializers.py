@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+Microbenchmark of list endpoint serialization.
+Compares the per-row cost of the ORM path (load Appointment/Availability/User instances,
+call to_dict() or read load_only attributes, encode with jsonify) with the row path the
+list endpoints use (select column tuples, app.serializers row functions, orjson), and
+per-value pytz timestamp conversion with the bulk utc_to_chicago_isoformats.
+Both sides of each comparison produce the same JSON.
+
+Usage: python bench_serializers.py [rows] [repeats]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# The app config requires DATABASE_URL; the benchmark always runs against an in-memory database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import json
+from sqlalchemy.orm import load_only
+
+from app import create_app, db
+from app.models import User, Appointment, Availability
+from app.timezones import utc_to_chicago, utc_to_chicago_isoformats
+from app.serializers import (
+    APPOINTMENT_COLUMNS, AVAILABILITY_COLUMNS, appointment_rows, availability_row, field_row, dumps
+)
+from config import Config
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    TESTING = True
+
+DIRECTORY_FIELDS = ('id', 'fullName', 'specialization', 'city', 'experienceYears', 'consultationFee', 'dateOfBirth')
+
+def seed(rows):
+    doctor = User(username='bench_doctor', email='bench_doctor@example.com', password='x',
+                  full_name='Dr. Bench', role='doctor', specialization='Cardiology')
+    patient = User(username='bench_patient', email='bench_patient@example.com', password='x',
+                   full_name='Bench Patient', role='patient')
+    db.session.add_all([doctor, patient])
+    db.session.flush()
+
+    start = datetime(2025, 1, 6, 15)
+    db.session.add_all(Appointment(doctor_id=doctor.id, patient_id=patient.id, date=start + timedelta(minutes=30 * i),
+                                   duration=30, type='checkup', status='scheduled', notes='Bench')
+                       for i in range(rows))
+    db.session.add_all(Availability(doctor_id=doctor.id, day_of_week=i % 7, date=None if i < 7 else start.date() + timedelta(days=i),
+                                    start_time='09:00', end_time='17:00', is_available=True,
+                                    available_slots=['09:00', '09:30', '10:00'])
+                       for i in range(rows))
+    db.session.add_all(User(username=f'bench_doctor_{i}', email=f'bench_doctor_{i}@example.com', password='x',
+                            full_name=f'Dr. Bench {i}', role='doctor', specialization='Cardiology', city='Chicago',
+                            experience_years=i % 30, consultation_fee=150.0)
+                       for i in range(rows))
+    db.session.commit()
+
+def orm_appointments():
+    return json.dumps([a.to_dict() for a in Appointment.query.order_by(Appointment.date, Appointment.id)])
+
+def row_appointments():
+    rows = db.session.query(*APPOINTMENT_COLUMNS).order_by(Appointment.date, Appointment.id).all()
+    return dumps(appointment_rows(rows))
+
+def orm_availability():
+    return json.dumps([a.to_dict() for a in Availability.query])
+
+def row_availability():
+    return dumps([availability_row(row) for row in db.session.query(*AVAILABILITY_COLUMNS)])
+
+DIRECTORY_COLUMNS = (User.id, User.full_name, User.specialization, User.city, User.experience_years,
+                     User.consultation_fee, User.date_of_birth)
+
+def orm_directory():
+    # User instances loaded with load_only, read attribute by attribute
+    doctors = User.query.options(load_only(*DIRECTORY_COLUMNS)).filter(User.role == 'doctor').order_by(User.id)
+    results = []
+    for doctor in doctors:
+        entry = {field: getattr(doctor, column.key) for field, column in zip(DIRECTORY_FIELDS, DIRECTORY_COLUMNS)}
+        if entry['dateOfBirth']:
+            entry['dateOfBirth'] = entry['dateOfBirth'].isoformat()
+        results.append(entry)
+    return json.dumps(results)
+
+def row_directory():
+    rows = db.session.query(*DIRECTORY_COLUMNS).filter(User.role == 'doctor').order_by(User.id)
+    return dumps([field_row(row, DIRECTORY_FIELDS) for row in rows])
+
+def per_row_microseconds(func, rows, repeats):
+    """Best-of-`repeats` time of one call, per row, with a fresh session each time"""
+    best = None
+    for _ in range(repeats):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / rows * 1e6
+
+def bench_serializers(rows=5000, repeats=5):
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        seed(rows)
+
+        # Timestamp rendering alone: pytz per value against the bulk transition-table conversion
+        dates = [date for date, in db.session.query(Appointment.date).order_by(Appointment.date)]
+
+        def pytz_timestamps():
+            return dumps([utc_to_chicago(date).isoformat() for date in dates])
+
+        def bulk_timestamps():
+            return dumps(utc_to_chicago_isoformats(dates))
+
+        ok = True
+        for name, before, after in (
+            ('timestamp rendering', pytz_timestamps, bulk_timestamps),
+            ('appointments', orm_appointments, row_appointments),
+            ('availability', orm_availability, row_availability),
+            ('doctor directory', orm_directory, row_directory),
+        ):
+            # Both paths must produce the same document
+            if json.loads(before()) != json.loads(after()):
+                print(f"❌ {name}: row serializer output differs from to_dict()")
+                ok = False
+                continue
+            orm_cost = per_row_microseconds(before, rows, repeats)
+            row_cost = per_row_microseconds(after, rows, repeats)
+            print(f"✅ {name}: {orm_cost:.1f} µs/row before, {row_cost:.1f} µs/row after ({orm_cost / row_cost:.1f}x)")
+
+        db.session.remove()
+        db.drop_all()
+    return ok
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(0 if bench_serializers(*args) else 1)
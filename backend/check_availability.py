@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+Availability API round-trip check.
+- Slots saved through the availability routes come back exactly as the client sent them
+  (the doctor page sends unpadded times like '8:00' and re-selects saved slots by string).
+- The same slots are offered as free slots, whichever way they were written.
+- Slots off the 30-minute grid or not sent as a list are refused with 400.
+
+Usage: python check_availability.py
+"""
+
+import os
+import sys
+import tempfile
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app, db
+from app.models import User
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_availability.db')
+
+# A Monday far enough ahead that its slots are all in the future
+DATE = '2030-05-06'
+
+# As the doctor availability page builds them: `${hour}:${minutes}`
+SLOTS = ['8:00', '8:30', '9:30', '13:00']
+
+class CheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+    PASSWORD_HASH_WORKERS = 0
+    TESTING = True
+
+def report(description, passed):
+    print(f"{'✅' if passed else '❌'} {description}")
+    return passed
+
+def check_availability():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(CheckConfig)
+    client = app.test_client()
+    ok = True
+
+    with app.app_context():
+        db.create_all()
+        doctor = User(username='av_doctor', email='av_doctor@example.com', password='x',
+                      full_name='Dr. Avail', role='doctor', specialization='Cardiology')
+        db.session.add(doctor)
+        db.session.commit()
+        doctor_id = doctor.id
+        db.session.remove()
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = doctor_id
+
+    def saved_slots(date):
+        rows = client.get(f'/api/doctors/{doctor_id}/availability').get_json()
+        return next((row['availableSlots'] for row in rows if row['date'] == date), None)
+
+    def free_slots(date):
+        body = client.get(f'/api/doctors/{doctor_id}/free-slots?from={date}&to={date}').get_json()
+        return [slot for day in body['days'] for slot in day['slots']]
+
+    response = client.post(f'/api/doctors/{doctor_id}/availability',
+                           json={'dayOfWeek': 1, 'date': DATE, 'isAvailable': True, 'availableSlots': SLOTS})
+    ok &= report(f"a saved entry echoes the slots as sent ({response.status_code}, {response.get_json()['availableSlots']})",
+                 response.status_code == 201 and response.get_json()['availableSlots'] == SLOTS)
+    ok &= report(f'reading the availability back returns them unchanged ({saved_slots(DATE)})', saved_slots(DATE) == SLOTS)
+    ok &= report(f'they are offered as free slots ({free_slots(DATE)})',
+                 free_slots(DATE) == ['08:00', '08:30', '09:30', '13:00'])
+
+    updated = ['8:00', '10:30']
+    response = client.post(f'/api/doctors/{doctor_id}/availability',
+                           json={'dayOfWeek': 1, 'date': DATE, 'isAvailable': True, 'availableSlots': updated})
+    ok &= report(f'an update is read back as sent ({response.status_code}, {saved_slots(DATE)})',
+                 response.status_code == 200 and saved_slots(DATE) == updated
+                 and free_slots(DATE) == ['08:00', '10:30'])
+
+    bulk_date = '2030-05-07'
+    response = client.post(f'/api/doctors/{doctor_id}/availability/bulk',
+                           json={'entries': [{'dayOfWeek': 2, 'date': bulk_date, 'isAvailable': True,
+                                              'availableSlots': ['9:00', '9:30']}]})
+    ok &= report(f'the bulk upsert keeps the slots as sent too ({response.status_code}, {saved_slots(bulk_date)})',
+                 response.status_code == 200 and saved_slots(bulk_date) == ['9:00', '9:30']
+                 and free_slots(bulk_date) == ['09:00', '09:30'])
+
+    for description, slots in (('off the slot grid', ['8:15']), ('not a list', '8:00'), ('not a time', [800])):
+        response = client.post(f'/api/doctors/{doctor_id}/availability',
+                               json={'dayOfWeek': 1, 'date': DATE, 'isAvailable': True, 'availableSlots': slots})
+        ok &= report(f'slots {description} are refused ({response.status_code})',
+                     response.status_code == 400 and saved_slots(DATE) == updated)
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_availability() else 1)
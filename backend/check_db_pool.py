@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+Connection pool configuration and telemetry check.
+- The DB_POOL_* settings reach the engine (size, overflow, timeout, recycle, pre-ping).
+- /ready measures a SELECT 1 round trip and reports the pool counters.
+- With every connection checked out, /ready answers 503 at once instead of waiting for one,
+  requests that need a connection wait for the pool timeout, and /metrics counts the waits
+  and the timeouts.
+
+Usage: python check_db_pool.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import create_app, db
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_db_pool.db')
+
+POOL_SIZE = 2
+POOL_TIMEOUT = 1
+POOL_RECYCLE = 600
+
+class CheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+    DB_POOL_SIZE = POOL_SIZE
+    DB_MAX_OVERFLOW = 0
+    DB_POOL_TIMEOUT = POOL_TIMEOUT
+    DB_POOL_RECYCLE = POOL_RECYCLE
+    PASSWORD_HASH_WORKERS = 0
+    TESTING = True
+    # Answer pool timeouts with the app's 500 handler, as in production
+    PROPAGATE_EXCEPTIONS = False
+
+def report(description, passed):
+    print(f"{'✅' if passed else '❌'} {description}")
+    return passed
+
+def timed_get(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    return response, time.perf_counter() - started
+
+def check_db_pool():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(CheckConfig)
+    # The pool timeout below is expected; don't print its traceback
+    app.logger.disabled = True
+    client = app.test_client()
+    ok = True
+
+    with app.app_context():
+        db.create_all()
+        pool = db.engine.pool
+        ok &= report(f'pool settings reach the engine ({type(pool).__name__}, {pool.status()})',
+                     pool.size() == POOL_SIZE and pool._max_overflow == 0 and pool._timeout == POOL_TIMEOUT
+                     and pool._recycle == POOL_RECYCLE and pool._pre_ping)
+        db.session.remove()
+
+    response, _ = timed_get(client, '/ready')
+    body = response.get_json()
+    ok &= report(f"/ready measures SELECT 1 ({body['database']['latency_ms']} ms) and reports the pool",
+                 response.status_code == 200 and body['status'] == 'ready'
+                 and body['pool']['size'] == POOL_SIZE and body['pool']['checked_out'] == 0)
+
+    # Hold every connection of the pool, as long-running requests would
+    held, release = threading.Barrier(POOL_SIZE + 1), threading.Event()
+    def hold():
+        with app.app_context(), db.engine.connect():
+            held.wait()
+            release.wait()
+    holders = [threading.Thread(target=hold, daemon=True) for _ in range(POOL_SIZE)]
+    for thread in holders:
+        thread.start()
+    held.wait()
+
+    response, elapsed = timed_get(client, '/ready')
+    ok &= report(f'a saturated pool fails /ready without waiting ({response.status_code} in {elapsed * 1000:.0f} ms)',
+                 response.status_code == 503 and response.get_json()['status'] == 'saturated'
+                 and elapsed < POOL_TIMEOUT / 2)
+
+    response, elapsed = timed_get(client, '/api/doctors')
+    ok &= report(f'a request that needs a connection waits for the pool timeout ({response.status_code} '
+                 f'after {elapsed * 1000:.0f} ms)', response.status_code == 500 and elapsed >= POOL_TIMEOUT)
+
+    # Released while a request waits for a connection: it gets one and succeeds
+    threading.Timer(POOL_TIMEOUT / 4, release.set).start()
+    response, elapsed = timed_get(client, '/api/doctors')
+    for thread in holders:
+        thread.join()
+    ok &= report(f'a waiting request gets a released connection ({response.status_code} after {elapsed * 1000:.0f} ms)',
+                 response.status_code == 200 and elapsed < POOL_TIMEOUT)
+
+    stats = client.get('/metrics').get_json()['db_pool']
+    print(f"Pool metrics: {stats}")
+    ok &= report('/metrics counts the timed-out and the slow checkouts',
+                 stats['wait']['timeouts'] == 1 and stats['wait']['slow'] >= 2
+                 and stats['wait']['max_ms'] >= POOL_TIMEOUT * 1000 and not stats['saturated'])
+
+    response, _ = timed_get(client, '/ready')
+    ok &= report(f'/ready recovers once connections are returned ({response.status_code})', response.status_code == 200)
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_db_pool() else 1)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""
+Idempotency-Key check for the booking routes.
+- A booking retried with the same key returns the first response without running any SQL
+  beyond the key lookup and without creating a second appointment; without a key the retry
+  is a new request.
+- A retry that reaches another worker process gets the same stored response.
+- The same key with a different body is refused with 422.
+- Keys are scoped per user: another patient using the same key gets their own booking.
+- Updates are replayed the same way.
+- A stored response expires after the TTL and the key can be used again.
+
+Usage: python check_idempotency.py
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.idempotency import idempotency_store
+from app.models import User
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_idempotency.db')
+
+# Short enough to wait out in the check
+TTL = 1
+
+class CheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+    PASSWORD_HASH_WORKERS = 0
+    # Every booking comes from one address in quick succession
+    RATE_LIMITS_ENABLED = False
+    IDEMPOTENCY_TTL = TTL
+    TESTING = True
+
+def report(description, passed):
+    print(f"{'✅' if passed else '❌'} {description}")
+    return passed
+
+def send(client, method, url, headers, body):
+    """Issue the request and return (response, number of SQL statements executed other than
+    the idempotency store's)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if 'idempotency_keys' not in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.open(url, method=method, headers=headers, json=body)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response, len(statements)
+
+def other_worker(token, ready, requests, results):
+    """Another worker process: once told, retry a booking with a key this process already used"""
+    from app import create_app
+    app = create_app(CheckConfig)
+    ready.set()
+    key, body = requests.get(timeout=60)
+    response = app.test_client().post('/api/appointments', json=body,
+                                      headers={'Authorization': f'Bearer {token}', 'Idempotency-Key': key})
+    results.put((response.status_code, response.get_data(), response.headers.get('Idempotent-Replayed')))
+
+def appointment_count():
+    with db.engine.connect() as connection:
+        return connection.exec_driver_sql('SELECT COUNT(*) FROM appointments').scalar()
+
+def check_idempotency():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(CheckConfig)
+    client = app.test_client()
+    ok = True
+
+    with app.app_context():
+        db.create_all()
+        doctor = User(username='ik_doctor', email='ik_doctor@example.com', password='x',
+                      full_name='Dr. Key', role='doctor', specialization='Cardiology')
+        patients = [User(username=f'ik_patient_{index}', email=f'ik_patient_{index}@example.com',
+                         password='x', full_name=f'Pat Key {index}', role='patient') for index in range(2)]
+        db.session.add_all([doctor] + patients)
+        db.session.commit()
+        doctor_id = doctor.id
+        tokens = [create_access_token(identity=str(patient.id)) for patient in patients]
+
+        def headers(patient=0, key=None):
+            result = {'Authorization': f'Bearer {tokens[patient]}'}
+            if key:
+                result['Idempotency-Key'] = key
+            return result
+
+        def booking(hour):
+            return {'doctorId': doctor_id, 'date': f'2030-05-06T{hour:02d}:00:00', 'type': 'checkup'}
+
+        # Started ahead so it is ready to retry well within the TTL
+        context = multiprocessing.get_context('spawn')
+        ready, requests, results = context.Event(), context.Queue(), context.Queue()
+        worker = context.Process(target=other_worker, args=(tokens[0], ready, requests, results))
+        worker.start()
+        ready.wait(60)
+
+        first, _ = send(client, 'POST', '/api/appointments', headers(key='book-1'), booking(9))
+        retry, statements = send(client, 'POST', '/api/appointments', headers(key='book-1'), booking(9))
+        ok &= report(f'a retried booking returns the first response ({first.status_code}, {retry.status_code})',
+                     first.status_code == 201 and retry.status_code == 201
+                     and retry.get_data() == first.get_data()
+                     and retry.headers.get('Idempotent-Replayed') == 'true')
+        ok &= report(f'the replay runs no SQL beyond the key lookup ({statements} statements)', statements == 0)
+        ok &= report(f'only one appointment was created ({appointment_count()})', appointment_count() == 1)
+
+        requests.put(('book-1', booking(9)))
+        status, body, replayed = results.get(timeout=60)
+        worker.join(10)
+        ok &= report(f'a retry reaching another worker gets the stored response ({status})',
+                     status == 201 and body == first.get_data() and replayed == 'true'
+                     and appointment_count() == 1)
+
+        again, _ = send(client, 'POST', '/api/appointments', headers(), booking(9))
+        ok &= report(f'without a key the retry is a new booking and conflicts ({again.status_code})',
+                     again.status_code == 409)
+
+        mismatch, _ = send(client, 'POST', '/api/appointments', headers(key='book-1'), booking(10))
+        ok &= report(f'the same key with a different body is refused ({mismatch.status_code})',
+                     mismatch.status_code == 422 and appointment_count() == 1)
+
+        other, _ = send(client, 'POST', '/api/appointments', headers(patient=1, key='book-1'), booking(11))
+        ok &= report(f"another user's key doesn't collide ({other.status_code})",
+                     other.status_code == 201 and 'Idempotent-Replayed' not in other.headers
+                     and appointment_count() == 2)
+
+        appointment_id = first.get_json()['id']
+        update = {'notes': 'Bring the referral letter'}
+        updated, _ = send(client, 'PUT', f'/api/appointments/{appointment_id}', headers(key='update-1'), update)
+        replayed, statements = send(client, 'PUT', f'/api/appointments/{appointment_id}', headers(key='update-1'), update)
+        ok &= report(f'a retried update is replayed without running it ({updated.status_code}, {statements} statements)',
+                     updated.status_code == 200 and replayed.get_data() == updated.get_data()
+                     and replayed.headers.get('Idempotent-Replayed') == 'true' and statements == 0)
+
+        time.sleep(TTL + 0.1)
+        expired, _ = send(client, 'POST', '/api/appointments', headers(key='book-1'), booking(9))
+        ok &= report(f'after the TTL the key runs the booking again ({expired.status_code})',
+                     expired.status_code == 409 and 'Idempotent-Replayed' not in expired.headers)
+
+        stats = client.get('/metrics').get_json()['idempotency']
+        ok &= report(f"this worker's replays are counted in /metrics: {stats}",
+                     stats['replayed'] == idempotency_store.replayed == 2)
+
+        db.session.remove()
+        db.drop_all()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_idempotency() else 1)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+"""
+Cross-worker cache invalidation check.
+Starts a second worker process that warms its principal cache and free-slot index, then
+updates a doctor's profile through PUT /api/profile in this process and verifies the
+other worker receives the 'user' and 'schedule' bumps and drops its cached entries, even
+though another 'user' handler fails. Then checks that a resync (what the Postgres listener
+does on every reconnect) empties the worker's caches.
+
+Uses the file stand-in for LISTEN/NOTIFY by default. Set CHECK_BUS_URL=postgresql://...
+(with CHECK_DATABASE_URL pointing at the same scratch database) to exercise Postgres.
+
+Usage: python check_invalidation_bus.py
+"""
+
+from datetime import date
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_invalidation_bus.db')
+BUS_PATH = os.path.join(tempfile.gettempdir(), 'check_invalidation_bus.log')
+
+# Seconds the worker waits for a bump to arrive
+DELIVERY_TIMEOUT = 5
+
+def make_config():
+    from config import Config
+
+    class BusConfig(Config):
+        SQLALCHEMY_DATABASE_URI = os.environ.get('CHECK_DATABASE_URL') or f'sqlite:///{DB_PATH}'
+        INVALIDATION_BUS_URL = os.environ.get('CHECK_BUS_URL') or f'file://{BUS_PATH}'
+        TESTING = True
+
+    return BusConfig
+
+def failing_handler(entity_id):
+    raise RuntimeError('broken cache')
+
+def worker(doctor_id, ready, results):
+    """Other worker: cache the doctor, then wait for the profile update to be broadcast"""
+    from app import create_app
+    from app.invalidation import invalidation_bus
+    from app.principals import principal_cache
+    from app.slot_index import free_slot_index
+    from app.directory import doctor_directory
+
+    app = create_app(make_config())
+    # The profile update publishes 'user' before 'schedule': the schedule bump only arrives if the
+    # listener survives this handler. Its failure is expected, don't print the traceback.
+    invalidation_bus.subscribe('user', failing_handler)
+    logging.getLogger('app.invalidation').disabled = True
+    with app.app_context():
+        principal_cache.get(doctor_id)
+        cached = doctor_id in principal_cache._entries
+        ready.set()
+
+        deadline = time.monotonic() + DELIVERY_TIMEOUT
+        while time.monotonic() < deadline:
+            if invalidation_bus.version('user', doctor_id) and invalidation_bus.version('schedule', doctor_id):
+                break
+            time.sleep(0.05)
+
+        principal_dropped = doctor_id not in principal_cache._entries
+        index_dirty = doctor_id in free_slot_index._dirty
+
+        # Fill the caches again, then resync as after a reconnect
+        principal_cache.get(doctor_id)
+        free_slot_index.earliest_slot('Neurology', date.today(), date.today())
+        doctor_directory.current()
+        invalidation_bus._resync()
+
+        results.put({
+            'cached': cached,
+            'user_bumps': invalidation_bus.version('user', doctor_id),
+            'schedule_bumps': invalidation_bus.version('schedule', doctor_id),
+            'principal_dropped': principal_dropped,
+            'index_dirty': index_dirty,
+            'resynced': not principal_cache._entries and free_slot_index._start_date is None
+                        and doctor_directory._stale
+        })
+
+def check_invalidation_bus():
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models import User
+
+    for path in (DB_PATH, BUS_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+    app = create_app(make_config())
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doctor = User(username='bus_doctor', email='bus_doctor@example.com', password='x',
+                      full_name='Dr. Bus', role='doctor', specialization='Cardiology')
+        db.session.add(doctor)
+        db.session.commit()
+        doctor_id = doctor.id
+        token = create_access_token(identity=str(doctor_id))
+
+    context = multiprocessing.get_context('spawn')
+    ready, results = context.Event(), context.Queue()
+    process = context.Process(target=worker, args=(doctor_id, ready, results))
+    process.start()
+
+    ok = True
+    if not ready.wait(30):
+        print("❌ Worker process did not start")
+        ok = False
+    else:
+        client = app.test_client()
+        response = client.put('/api/profile', headers={'Authorization': f'Bearer {token}'},
+                              json={'specialization': 'Neurology'})
+        if response.status_code != 200:
+            print(f"❌ PUT /api/profile returned {response.status_code}")
+            ok = False
+
+        result = results.get(timeout=DELIVERY_TIMEOUT + 30)
+        print(f"Worker saw {result['user_bumps']} user and {result['schedule_bumps']} schedule bumps")
+        checks = (
+            ('worker cached the doctor before the update', result['cached']),
+            ('worker dropped the cached principal', result['principal_dropped']),
+            ('worker marked the doctor dirty in the free-slot index', result['index_dirty']),
+            ('a resync emptied the principal cache, free-slot index and directory', result['resynced']),
+        )
+        for description, passed in checks:
+            print(f"{'✅' if passed else '❌'} {description}")
+            ok = ok and passed
+
+    process.join(10)
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+    for path in (DB_PATH, BUS_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_invalidation_bus() else 1)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+Regression check for N+1 queries in the appointment list endpoints.
+Seeds a throwaway SQLite database with a small and a large number of appointments
+and verifies that the number of SQL statements per request does not grow with the row count.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# The app config requires DATABASE_URL; this check always runs against its own SQLite file
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.principals import principal_cache
+from app.models import User, Appointment
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_query_counts.db')
+
+class CheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+    TESTING = True
+
+def seed(doctor_id, patient_id, count):
+    """Replace all appointments with `count` appointments for the doctor and for the patient,
+    each against a distinct counterpart so per-row lookups cannot be served from the identity map"""
+    Appointment.query.delete()
+    User.query.filter(User.username.like('qc_extra_%')).delete(synchronize_session=False)
+    start = datetime(2025, 1, 6, 15, 0)
+    for i in range(count):
+        extra_patient = User(username=f'qc_extra_patient_{i}', email=f'qc_extra_patient_{i}@example.com',
+                             password='x', full_name=f'Patient {i}', role='patient')
+        extra_doctor = User(username=f'qc_extra_doctor_{i}', email=f'qc_extra_doctor_{i}@example.com',
+                            password='x', full_name=f'Dr. {i}', role='doctor', specialization='Cardiology')
+        db.session.add_all([extra_patient, extra_doctor])
+        db.session.flush()
+        date = start + timedelta(minutes=30 * i)
+        db.session.add(Appointment(doctor_id=doctor_id, patient_id=extra_patient.id, date=date,
+                                   duration=30, type='checkup', status='scheduled'))
+        db.session.add(Appointment(doctor_id=extra_doctor.id, patient_id=patient_id, date=date,
+                                   duration=30, type='checkup', status='scheduled'))
+    db.session.commit()
+
+def count_queries(client, url, user_id):
+    """Issue a GET as the given user and return (status code, number of SQL statements executed)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    # Start from an empty identity map and principal cache so cached objects cannot hide per-row lookups
+    db.session.expunge_all()
+    principal_cache.clear()
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, len(statements)
+
+def check_query_counts():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(CheckConfig)
+    client = app.test_client()
+    ok = True
+
+    with app.app_context():
+        db.create_all()
+
+        doctor = User(username='qc_doctor', email='qc_doctor@example.com', password='x',
+                      full_name='Dr. Query Count', role='doctor', specialization='Cardiology')
+        patient = User(username='qc_patient', email='qc_patient@example.com', password='x',
+                       full_name='Query Count', role='patient')
+        db.session.add_all([doctor, patient])
+        db.session.commit()
+        doctor_id, patient_id = doctor.id, patient.id
+
+        for url, user_id in (('/api/appointments/doctor', doctor_id), ('/api/appointments/patient', patient_id)):
+            counts = []
+            for rows in (1, 200):
+                seed(doctor_id, patient_id, rows)
+                status, queries = count_queries(client, url, user_id)
+                if status != 200:
+                    print(f"❌ {url} returned {status} with {rows} appointments")
+                    ok = False
+                counts.append(queries)
+                print(f"{url}: {rows} appointments -> {queries} queries")
+
+            if counts[0] != counts[1]:
+                print(f"❌ {url} query count grows with row count: {counts}")
+                ok = False
+            else:
+                print(f"✅ {url} uses a fixed number of queries")
+
+        db.session.remove()
+        db.drop_all()
+
+    os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_counts() else 1)
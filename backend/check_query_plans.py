@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+"""
+Query-plan check for the API routes.
+Seeds a throwaway database, calls each route, captures the SQL it runs and EXPLAINs every
+statement, failing if any of them falls back to a full table scan.
+
+Runs against a temporary SQLite file by default. Set CHECK_DATABASE_URL to a scratch
+PostgreSQL database to check Postgres plans instead (all tables in it are dropped).
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, date, timedelta
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.principals import principal_cache
+from app.directory import doctor_directory
+from app.models import User, Appointment, Availability
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_query_plans.db')
+
+class CheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('CHECK_DATABASE_URL') or f'sqlite:///{DB_PATH}'
+    TESTING = True
+
+def seed():
+    """Create a few doctors and patients with a realistic spread of appointments and availability"""
+    doctors = [User(username=f'plan_doctor_{i}', email=f'plan_doctor_{i}@example.com',
+                    password=generate_password_hash('doctor123'), full_name=f'Dr. Plan {i}',
+                    role='doctor', specialization=('Cardiology', 'Dermatology')[i % 2], city='Chicago')
+               for i in range(10)]
+    patients = [User(username=f'plan_patient_{i}', email=f'plan_patient_{i}@example.com',
+                     password=generate_password_hash('patient123'), full_name=f'Patient Plan {i}',
+                     role='patient')
+                for i in range(50)]
+    db.session.add_all(doctors + patients)
+    db.session.flush()
+
+    start = datetime(2025, 1, 6, 15, 0)
+    for i in range(2000):
+        db.session.add(Appointment(
+            doctor_id=doctors[i % len(doctors)].id,
+            patient_id=patients[i % len(patients)].id,
+            date=start + timedelta(hours=i),
+            duration=30,
+            type='checkup',
+            status=('scheduled', 'completed', 'cancelled')[i % 3]
+        ))
+
+    for doctor in doctors:
+        for day in range(7):
+            db.session.add(Availability(doctor_id=doctor.id, day_of_week=day, start_time='09:00',
+                                        end_time='17:00', is_available=True, available_slots=[]))
+        for offset in range(30):
+            specific = date(2025, 1, 6) + timedelta(days=offset)
+            db.session.add(Availability(doctor_id=doctor.id, day_of_week=specific.weekday(), date=specific,
+                                        start_time='09:00', end_time='12:00', is_available=True,
+                                        available_slots=['09:00', '09:30']))
+    db.session.commit()
+    return doctors[0].id, patients[0].id
+
+def route_calls(doctor_id, patient_id):
+    """(description, method, url, user id for JWT auth, session user id, JSON body) for each checked call"""
+    return [
+        ('doctor directory', 'GET', '/api/doctors', None, None, None),
+        ('doctor directory filtered', 'GET', '/api/doctors?specialization=Cardiology&city=Chicago&limit=5', None, None, None),
+        ('doctor availability', 'GET', f'/api/doctors/{doctor_id}/availability', None, None, None),
+        ('free slots for a week', 'GET', f'/api/doctors/{doctor_id}/free-slots?from=2025-01-13&to=2025-01-19', None, None, None),
+        ('earliest slot search', 'GET', '/api/search/earliest-slot?specialization=Cardiology', None, None, None),
+        ('booked slots for a day', 'GET', f'/api/doctor-slots/{doctor_id}?date=2025-01-20', None, None, None),
+        ('doctor appointments', 'GET', '/api/appointments/doctor', doctor_id, None, None),
+        ('doctor appointments page', 'GET', '/api/appointments/doctor?from=2025-01-10&status=scheduled&limit=20', doctor_id, None, None),
+        ('patient appointments', 'GET', '/api/appointments/patient', patient_id, None, None),
+        ('patient appointments page', 'GET', '/api/appointments/patient?from=2025-01-10&to=2025-02-10&limit=20', patient_id, None, None),
+        ('doctor appointment changes', 'GET', '/api/appointments/changes?limit=50', doctor_id, None, None),
+        ('patient appointment changes', 'GET', '/api/appointments/changes?limit=50', patient_id, None, None),
+        ('doctor appointment export', 'GET', '/api/appointments/export?from=2025-01-01&to=2025-12-31&format=csv', doctor_id, None, None),
+        ('profile', 'GET', '/api/profile', patient_id, None, None),
+        ('book appointment', 'POST', '/api/appointments', patient_id, None,
+         {'doctorId': doctor_id, 'date': '2030-01-07T09:00:00', 'type': 'checkup'}),
+        ('login', 'POST', '/api/login', None, None, {'username': 'plan_patient_0', 'password': 'patient123'}),
+        ('weekly availability update', 'POST', f'/api/doctors/{doctor_id}/availability', None, doctor_id,
+         {'dayOfWeek': 1, 'isAvailable': True, 'startTime': '09:00', 'endTime': '17:00'}),
+        ('date availability update', 'POST', f'/api/doctors/{doctor_id}/availability', None, doctor_id,
+         {'dayOfWeek': 1, 'date': '2025-01-07', 'isAvailable': True, 'availableSlots': ['10:00']}),
+        ('bulk availability upsert', 'POST', f'/api/doctors/{doctor_id}/availability/bulk', None, doctor_id,
+         {'entries': [{'dayOfWeek': day, 'isAvailable': True, 'startTime': '08:00', 'endTime': '12:00'} for day in range(7)]
+          + [{'dayOfWeek': 3, 'date': '2025-01-08', 'isAvailable': True, 'availableSlots': ['09:00']}]}),
+    ]
+
+def capture_statements(client, method, url, jwt_user_id, session_user_id, body):
+    """Call a route and return the (statement, parameters) pairs of the SELECTs it executed"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    headers = {}
+    if jwt_user_id is not None:
+        headers['Authorization'] = f'Bearer {create_access_token(identity=str(jwt_user_id))}'
+    if session_user_id is not None:
+        with client.session_transaction() as sess:
+            sess['user_id'] = session_user_id
+
+    # Start cold so every query the route can issue is captured
+    db.session.expunge_all()
+    principal_cache.clear()
+    doctor_directory.invalidate()
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.open(url, method=method, headers=headers, json=body)
+        # Drain streamed responses so the queries their generators run are captured too
+        response.get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, statements
+
+def full_scans(conn, statement, parameters):
+    """EXPLAIN a statement and return the plan lines that scan a whole table"""
+    if conn.dialect.name == 'sqlite':
+        plan = [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+        # "SCAN users USING INDEX ..." walks an index; a bare "SCAN <table>" reads every row
+        return [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+
+    plan = [row[0] for row in conn.exec_driver_sql(f'EXPLAIN {statement}', parameters)]
+    return [line for line in plan if 'Seq Scan' in line]
+
+def check_query_plans():
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(CheckConfig)
+    client = app.test_client()
+    ok = True
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doctor_id, patient_id = seed()
+
+        with db.engine.connect() as conn:
+            if conn.dialect.name != 'sqlite':
+                # Tiny seeded tables would otherwise make sequential scans look cheapest
+                conn.exec_driver_sql('SET enable_seqscan = off')
+
+            for description, method, url, jwt_user_id, session_user_id, body in route_calls(doctor_id, patient_id):
+                status, statements = capture_statements(client, method, url, jwt_user_id, session_user_id, body)
+                if status >= 400:
+                    print(f"❌ {description}: {method} {url} returned {status}")
+                    ok = False
+                    continue
+
+                scans = []
+                for statement, parameters in statements:
+                    scans.extend(full_scans(conn, statement, parameters))
+
+                if scans:
+                    print(f"❌ {description}: {method} {url} falls back to a full table scan: {scans}")
+                    ok = False
+                else:
+                    print(f"✅ {description}: {len(statements)} queries, no full table scans")
+
+        db.session.remove()
+        db.drop_all()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_plans() else 1)
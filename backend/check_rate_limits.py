@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+"""
+Rate limiting and load shedding check for the auth and booking routes.
+- Login attempts against one account from one address are refused with 429 and Retry-After
+  once its bucket is empty, while other accounts from the same address still get through
+  until the address's own bucket is empty. Refused attempts don't use up the address's
+  bucket, and the account's owner can still log in from another address.
+- Booking requests of one user are limited the same way.
+- Concurrent logins beyond the auth concurrency limit are shed with 503 and Retry-After.
+- The adaptive limit shrinks while p99 latency is over target and grows back under it.
+- Two worker processes sharing the shm:// backend enforce one bucket between them, where
+  the in-process backend lets each worker allow a full burst.
+
+Usage: python check_rate_limits.py
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_rate_limits.db')
+SHM_NAME = f'check_rate_limits_{os.getpid()}'
+
+# Small buckets that barely refill, so the check needs few requests
+LOGIN_IP_BURST = 8
+LOGIN_IDENTITY_BURST = 3
+BOOKING_IDENTITY_BURST = 4
+
+def make_config(**overrides):
+    from config import Config
+    from app.rate_limits import RateLimit, ConcurrencyPolicy
+
+    class LimitsConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+        PASSWORD_HASH_WORKERS = 0
+        RATE_LIMITS = {
+            'login': {'ip': RateLimit(0.001, LOGIN_IP_BURST), 'identity': RateLimit(0.001, LOGIN_IDENTITY_BURST)},
+            'register': {'ip': RateLimit(0.001, 100)},
+            'booking': {'ip': RateLimit(0.001, 100), 'identity': RateLimit(0.001, BOOKING_IDENTITY_BURST)},
+        }
+        CONCURRENCY_LIMITS = {
+            'auth': ConcurrencyPolicy(max_limit=64, min_limit=2, target=10),
+            'booking': ConcurrencyPolicy(max_limit=64, min_limit=4, target=10),
+        }
+        TESTING = True
+
+    for key, value in overrides.items():
+        setattr(LimitsConfig, key, value)
+    return LimitsConfig
+
+def report(description, passed):
+    print(f"{'✅' if passed else '❌'} {description}")
+    return passed
+
+def login(client, username, password='wrong'):
+    return client.post('/api/login', json={'username': username, 'password': password})
+
+def worker(storage_url, attempts, results):
+    """Another worker process: try to log in to the shared victim account"""
+    from app import create_app
+    app = create_app(make_config(RATE_LIMIT_STORAGE_URL=storage_url))
+    client = app.test_client()
+    results.put([login(client, 'victim').status_code for _ in range(attempts)])
+
+def allowed_across_workers(storage_url):
+    """Login attempts on one account that two workers let through (not 429) between them"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(storage_url, LOGIN_IDENTITY_BURST + 2, results))
+                 for _ in range(2)]
+    for process in processes:
+        process.start()
+    statuses = results.get(timeout=60) + results.get(timeout=60)
+    for process in processes:
+        process.join(10)
+    return len([status for status in statuses if status != 429])
+
+def check_rate_limits():
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models import User
+    from app.rate_limits import ConcurrencyLimiter, ConcurrencyPolicy, ADJUST_EVERY
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(make_config())
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doctor = User(username='rl_doctor', email='rl_doctor@example.com', password='x',
+                      full_name='Dr. Limit', role='doctor', specialization='Cardiology')
+        patient = User(username='rl_patient', email='rl_patient@example.com', password='x',
+                       full_name='Pat Limit', role='patient')
+        members = [User(username=f'rl_member_{index}', email=f'rl_member_{index}@example.com',
+                        full_name=f'Member {index}', role='patient') for index in range(6)]
+        for member in members:
+            member.set_password('secret')
+        db.session.add_all([doctor, patient] + members)
+        db.session.commit()
+        doctor_id = doctor.id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(patient.id))}'}
+
+    ok = True
+    client = app.test_client()
+
+    statuses = [login(client, 'victim').status_code for _ in range(LOGIN_IDENTITY_BURST + 1)]
+    refused = login(client, 'victim')
+    ok &= report(f'attempts on one account are refused after {LOGIN_IDENTITY_BURST}: {statuses}',
+                 statuses == [401] * LOGIN_IDENTITY_BURST + [429] and refused.status_code == 429)
+    ok &= report('429 carries Retry-After', int(refused.headers.get('Retry-After', 0)) >= 1)
+
+    others = [login(client, f'other_{index}').status_code for index in range(LOGIN_IP_BURST)]
+    ok &= report(f'the address can still try other accounts until its own bucket is empty: {others}',
+                 others == [401] * (LOGIN_IP_BURST - LOGIN_IDENTITY_BURST) + [429] * LOGIN_IDENTITY_BURST)
+
+    owner = app.test_client()
+    owner.environ_base['REMOTE_ADDR'] = '192.0.2.10'
+    response = login(owner, 'rl_member_0', 'secret')
+    ok &= report(f'the owner of an account under attack still logs in from their own address ({response.status_code})',
+                 response.status_code == 200)
+
+    statuses = [client.post('/api/appointments', headers=headers, json={
+        'doctorId': doctor_id, 'date': f'2030-03-04T{9 + index:02d}:00:00', 'type': 'checkup'
+    }).status_code for index in range(BOOKING_IDENTITY_BURST + 1)]
+    ok &= report(f'bookings of one user are limited after {BOOKING_IDENTITY_BURST}: {statuses}',
+                 statuses == [201] * BOOKING_IDENTITY_BURST + [429])
+
+    # Real password hashing keeps six concurrent logins in flight; only two may run at once
+    shedding = create_app(make_config(
+        CONCURRENCY_LIMITS={'auth': ConcurrencyPolicy(max_limit=2, min_limit=2, target=10),
+                            'booking': ConcurrencyPolicy(max_limit=64, min_limit=4, target=10)}
+    ))
+    responses = []
+    start = threading.Barrier(len(members))
+    def member_login(index):
+        member_client = shedding.test_client()
+        start.wait()
+        responses.append(login(member_client, f'rl_member_{index}', 'secret'))
+    threads = [threading.Thread(target=member_login, args=(index,)) for index in range(len(members))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    shed = [response for response in responses if response.status_code == 503]
+    ok &= report(f'logins beyond the concurrency limit are shed: {sorted(r.status_code for r in responses)}',
+                 bool(shed) and all(response.headers.get('Retry-After') for response in shed)
+                 and any(response.status_code == 200 for response in responses))
+    metrics = shedding.test_client().get('/metrics').get_json()['rate_limits']['concurrency']['auth']
+    ok &= report(f"shed requests are counted in /metrics: {metrics}", metrics['shed'] == len(shed))
+
+    limiter = ConcurrencyLimiter(ConcurrencyPolicy(max_limit=20, min_limit=2, target=0.1))
+    for _ in range(ADJUST_EVERY):
+        limiter.acquire()
+        limiter.release(0.5)
+    shrunk = limiter.limit
+    for _ in range(ADJUST_EVERY):
+        limiter.acquire()
+        limiter.release(0.01)
+    ok &= report(f'the concurrency limit shrinks over target p99 and grows back: 20 -> {shrunk} -> {limiter.limit}',
+                 shrunk < 20 and limiter.limit == shrunk + 1)
+
+    with app.app_context():
+        db.session.remove()
+
+    local = allowed_across_workers(None)
+    shared = allowed_across_workers(f'shm://{SHM_NAME}')
+    print(f"Two workers allowed {local} attempts with per-process buckets, {shared} with shared memory")
+    ok &= report('workers sharing the shm:// backend enforce one bucket',
+                 local == 2 * LOGIN_IDENTITY_BURST and shared == LOGIN_IDENTITY_BURST)
+
+    from multiprocessing import shared_memory
+    try:
+        shared_memory.SharedMemory(name=SHM_NAME).unlink()
+    except FileNotFoundError:
+        pass
+    lock_path = os.path.join(tempfile.gettempdir(), f'{SHM_NAME}.lock')
+    if os.path.exists(lock_path):
+        os.remove(lock_path)
+
+    with app.app_context():
+        db.drop_all()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_rate_limits() else 1)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+"""
+Read-replica routing check with two SQLite files standing in for a primary and a replica.
+The replica is only brought up to date when the check copies the primary over it, so every
+read that reaches it while it is behind is visible in the responses.
+- GET requests read from the replica; writes go to the primary.
+- A user who just booked reads from the primary (sees the booking) until the stickiness
+  window ends, while other users read the lagging replica; a user marked sticky by another
+  worker reads from the primary too.
+- Stickiness also covers public routes without a JWT check (by the session cookie, or by a
+  bearer token sent anyway) and the session-authenticated availability writes.
+- The change feed and the doctor directory cache read from the primary.
+- /ready pings the replica and /metrics counts the routed statements.
+
+Usage: python check_replicas.py
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# The app config requires DATABASE_URL; this check always runs against its own databases
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.invalidation import invalidation_bus
+from app.models import User
+from app.replicas import replica_router
+from config import Config
+
+PRIMARY_PATH = os.path.join(tempfile.gettempdir(), 'check_replicas_primary.db')
+REPLICA_PATH = os.path.join(tempfile.gettempdir(), 'check_replicas_replica.db')
+
+# Short enough to wait out in the check
+STICKY_SECONDS = 1
+
+class CheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{PRIMARY_PATH}'
+    REPLICA_DATABASE_URLS = [f'sqlite:///{REPLICA_PATH}']
+    REPLICA_STICKY_SECONDS = STICKY_SECONDS
+    PASSWORD_HASH_WORKERS = 0
+    RATE_LIMITS_ENABLED = False
+    TESTING = True
+
+def report(description, passed):
+    print(f"{'✅' if passed else '❌'} {description}")
+    return passed
+
+def replicate():
+    """Bring the replica up to date with the primary"""
+    source, target = sqlite3.connect(PRIMARY_PATH), sqlite3.connect(REPLICA_PATH)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+class StatementCounter:
+    """Statements run on each engine during a request"""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.counts = {}
+
+    def send(self, client, method, url, token=None, body=None):
+        self.counts = {key: 0 for key in self.engines}
+        listeners = {}
+        for key, engine in self.engines.items():
+            def before_cursor_execute(*args, key=key):
+                self.counts[key] += 1
+            listeners[key] = before_cursor_execute
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            return client.open(url, method=method, headers=headers, json=body)
+        finally:
+            for key, engine in self.engines.items():
+                event.remove(engine, 'before_cursor_execute', listeners[key])
+
+def check_replicas():
+    for path in (PRIMARY_PATH, REPLICA_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+    app = create_app(CheckConfig)
+    # One client (cookie jar) per user, as with separate browsers and apps
+    patient_clients = [app.test_client(), app.test_client()]
+    doctor_client, browser, mobile, anonymous = (app.test_client() for _ in range(4))
+    ok = True
+
+    with app.app_context():
+        db.create_all()
+        doctor = User(username='rr_doctor', email='rr_doctor@example.com', password='x',
+                      full_name='Dr. Replica', role='doctor', specialization='Cardiology')
+        patients = [User(username=f'rr_patient_{index}', email=f'rr_patient_{index}@example.com',
+                         password='x', full_name=f'Pat Replica {index}', role='patient') for index in range(2)]
+        db.session.add_all([doctor] + patients)
+        db.session.commit()
+        doctor_id = doctor.id
+        doctor_token = create_access_token(identity=str(doctor.id))
+        patient_tokens = [create_access_token(identity=str(patient.id)) for patient in patients]
+        engines = {'primary': db.engines[None], 'replica': db.engines['replica_1']}
+        db.session.remove()
+    replicate()
+    counter = StatementCounter(engines)
+    with browser.session_transaction() as browser_session:
+        browser_session['user_id'] = doctor_id
+
+    def booking(hour):
+        return {'doctorId': doctor_id, 'date': f'2030-06-03T{hour:02d}:00:00', 'type': 'checkup'}
+
+    response = counter.send(patient_clients[0], 'GET', '/api/appointments/patient', patient_tokens[0])
+    ok &= report(f'a GET reads from the replica ({counter.counts})',
+                 response.status_code == 200 and counter.counts['replica'] > 0)
+
+    response = counter.send(patient_clients[0], 'POST', '/api/appointments', patient_tokens[0], booking(9))
+    ok &= report(f'a booking writes to the primary only ({response.status_code}, {counter.counts})',
+                 response.status_code == 201 and counter.counts['replica'] == 0)
+
+    response = counter.send(patient_clients[0], 'GET', '/api/appointments/patient', patient_tokens[0])
+    ok &= report(f'the patient who booked reads it back from the primary ({counter.counts})',
+                 len(response.get_json()) == 1 and counter.counts['replica'] == 0)
+
+    response = counter.send(doctor_client, 'GET', '/api/appointments/doctor', doctor_token)
+    ok &= report(f'another user reads the lagging replica and does not see it yet ({counter.counts})',
+                 response.get_json() == [] and counter.counts['replica'] > 0)
+
+    response = counter.send(doctor_client, 'GET', '/api/appointments/changes', doctor_token)
+    ok &= report(f'the change feed reads from the primary ({counter.counts})',
+                 len(response.get_json()['changes']) == 1 and counter.counts['replica'] == 0)
+
+    slots_url = f'/api/doctor-slots/{doctor_id}?date=2030-06-03'
+    response = counter.send(patient_clients[0], 'GET', slots_url)
+    ok &= report(f'a public GET in the same browser reads from the primary by the session cookie ({counter.counts})',
+                 response.status_code == 200 and len(response.get_json()) == 1 and counter.counts['replica'] == 0)
+
+    response = counter.send(mobile, 'GET', slots_url, patient_tokens[0])
+    ok &= report(f'a public GET without cookies reads from the primary by its bearer token ({counter.counts})',
+                 response.status_code == 200 and len(response.get_json()) == 1 and counter.counts['replica'] == 0)
+
+    response = counter.send(anonymous, 'GET', slots_url)
+    ok &= report(f'an anonymous public GET reads the lagging replica ({counter.counts})',
+                 response.get_json() == [] and counter.counts['replica'] > 0)
+
+    availability_url = f'/api/doctors/{doctor_id}/availability'
+    response = counter.send(browser, 'POST', availability_url,
+                            body={'dayOfWeek': 1, 'isAvailable': True, 'startTime': '09:00', 'endTime': '12:00'})
+    ok &= report(f'a session-authenticated availability write goes to the primary ({response.status_code}, {counter.counts})',
+                 response.status_code == 201 and counter.counts['replica'] == 0)
+
+    response = counter.send(browser, 'GET', availability_url)
+    ok &= report(f'the doctor reads their new availability back from the primary ({counter.counts})',
+                 len(response.get_json()) == 1 and counter.counts['replica'] == 0)
+
+    response = counter.send(anonymous, 'GET', availability_url)
+    ok &= report(f"others read the lagging replica's availability ({counter.counts})",
+                 response.get_json() == [] and counter.counts['replica'] > 0)
+
+    replicate()
+    response = counter.send(doctor_client, 'GET', '/api/appointments/doctor', doctor_token)
+    ok &= report('once replicated the other user sees it', len(response.get_json()) == 1)
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    response = counter.send(patient_clients[0], 'GET', '/api/appointments/patient', patient_tokens[0])
+    ok &= report(f'after the stickiness window the patient reads from the replica again ({counter.counts})',
+                 len(response.get_json()) == 1 and counter.counts['replica'] > 0)
+
+    # As relayed by another worker after this patient wrote there
+    replica_router._receive({'user': str(patients[1].id), 'seconds': STICKY_SECONDS})
+    counter.send(patient_clients[1], 'GET', '/api/appointments/patient', patient_tokens[1])
+    ok &= report(f"a write in another worker keeps the user's reads on the primary ({counter.counts})",
+                 counter.counts['replica'] == 0)
+
+    with app.app_context():
+        new_doctor = User(username='rr_doctor_new', email='rr_doctor_new@example.com', password='x',
+                          full_name='Dr. New', role='doctor', specialization='Cardiology')
+        db.session.add(new_doctor)
+        db.session.commit()
+        invalidation_bus.bump('directory', new_doctor.id)
+        db.session.remove()
+    response = counter.send(anonymous, 'GET', '/api/doctors')
+    ok &= report(f'the doctor directory cache is rebuilt from the primary ({len(response.get_json())} doctors)',
+                 len(response.get_json()) == 2)
+
+    response = anonymous.get('/ready')
+    replicas = response.get_json().get('database', {}).get('replicas', {})
+    ok &= report(f'/ready pings the replica ({replicas})', response.status_code == 200 and 'replica_1' in replicas)
+
+    stats = anonymous.get('/metrics').get_json()['replicas']
+    print(f"Routing metrics: {stats}")
+    ok &= report('/metrics counts statements per target',
+                 stats['replicas'] == 1 and stats['statements']['replica'] > 0 and stats['statements']['primary'] > 0)
+
+    with app.app_context():
+        db.session.remove()
+        for engine in engines.values():
+            engine.dispose()
+    for path in (PRIMARY_PATH, REPLICA_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_replicas() else 1)
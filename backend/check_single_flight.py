@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+Request coalescing check for the hot public reads.
+Fires bursts of concurrent identical GETs at /api/doctors/<id>/availability and
+/api/doctor-slots/<id>?date= with every query slowed down, and verifies that they share a
+few executions of the list query instead of each running it, that every response has the
+same body, and that a write between bursts is visible to the next burst. Reports the
+coalescing ratio from GET /metrics.
+
+Usage: python check_single_flight.py [concurrent requests]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User, Appointment, Availability
+from app.single_flight import public_reads
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_single_flight.db')
+
+CONCURRENT_REQUESTS = 50
+
+# Seconds each list query is held up so the burst overlaps it
+QUERY_DELAY = 0.2
+
+class FlightConfig(Config):
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+    TESTING = True
+
+def burst(app, url, count, table):
+    """GET url from `count` threads at once; returns (bodies, statuses, list queries executed)"""
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and f'FROM {table}' in statement:
+            executed.append(statement)
+            time.sleep(QUERY_DELAY)
+
+    bodies, statuses = [None] * count, [None] * count
+    start = threading.Barrier(count)
+
+    def request(index):
+        client = app.test_client()
+        start.wait()
+        response = client.get(url)
+        bodies[index], statuses[index] = response.get_data(), response.status_code
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        threads = [threading.Thread(target=request, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return bodies, statuses, len(executed)
+
+def check_single_flight(count):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(FlightConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doctor = User(username='sf_doctor', email='sf_doctor@example.com', password='x',
+                      full_name='Dr. Flight', role='doctor', specialization='Cardiology')
+        patient = User(username='sf_patient', email='sf_patient@example.com', password='x',
+                       full_name='Pat Flight', role='patient')
+        db.session.add_all([doctor, patient])
+        db.session.flush()
+        for day in range(7):
+            availability = Availability(doctor_id=doctor.id, day_of_week=day, is_available=True)
+            availability.set_slots(None, '09:00', '17:00')
+            db.session.add(availability)
+        db.session.add(Appointment(doctor_id=doctor.id, patient_id=patient.id, date=datetime(2030, 3, 4, 16, 0),
+                                   duration=30, type='checkup', status='scheduled'))
+        db.session.commit()
+        doctor_id, patient_id = doctor.id, patient.id
+        token = create_access_token(identity=str(patient_id))
+
+    public_reads.reset_stats()
+    ok = True
+    routes = (
+        ('availability', f'/api/doctors/{doctor_id}/availability', 'availability'),
+        ('doctor-slots', f'/api/doctor-slots/{doctor_id}?date=2030-03-04', 'appointments'),
+    )
+    for name, url, table in routes:
+        bodies, statuses, executed = burst(app, url, count, table)
+        print(f"{name}: {count} concurrent requests ran the list query {executed} time(s)")
+        passed = all(status == 200 for status in statuses) and len(set(bodies)) == 1
+        print(f"{'✅' if passed else '❌'} {name}: every request got the same 200 response")
+        ok = ok and passed
+        # Requests that miss the first flight by a scheduling hiccup start a second one
+        passed = executed <= max(2, count // 10)
+        print(f"{'✅' if passed else '❌'} {name}: concurrent requests shared the list query")
+        ok = ok and passed
+
+    # A booking bumps the doctor's appointments version, so the next burst must not reuse the old body
+    client = app.test_client()
+    before = client.get(f'/api/doctor-slots/{doctor_id}?date=2030-03-04').get_json()
+    client.post('/api/appointments', headers={'Authorization': f'Bearer {token}'},
+                json={'doctorId': doctor_id, 'date': '2030-03-04T14:00:00', 'type': 'checkup'})
+    bodies, statuses, executed = burst(app, f'/api/doctor-slots/{doctor_id}?date=2030-03-04', count, 'appointments')
+    after = [len(client.application.json.loads(body)) for body in bodies]
+    passed = after == [len(before) + 1] * count
+    print(f"{'✅' if passed else '❌'} a burst after a booking sees the new appointment")
+    ok = ok and passed
+
+    metrics = client.get('/metrics').get_json()['single_flight']
+    for name, stats in sorted(metrics.items()):
+        print(f"{name}: {stats['calls']} calls, {stats['executions']} executions, "
+              f"coalescing ratio {stats['coalescing_ratio']:.2f}")
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else CONCURRENT_REQUESTS
+    sys.exit(0 if check_single_flight(count) else 1)
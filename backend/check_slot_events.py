@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+Server-Sent Events check for GET /api/doctors/<id>/slot-events.
+Opens a stream for a doctor, books, moves and cancels appointments and changes the doctor's
+availability through the API, and verifies the stream receives slot-booked, slot-cancelled
+and availability-changed events in order. Then reconnects with Last-Event-ID and checks the
+missed events are replayed, and that an unknown Last-Event-ID gets a resync event.
+
+With gevent installed it also opens many idle subscriptions in a monkey-patched worker
+process (as under `gunicorn -k gevent`), reports their memory cost and checks one publish
+reaches all of them.
+
+Usage: python check_slot_events.py [idle subscribers]
+"""
+
+import importlib.util
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# The app config requires DATABASE_URL; this check always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'check_slot_events.db')
+
+# Seconds to wait for events to arrive on a stream
+DELIVERY_TIMEOUT = 5
+
+IDLE_SUBSCRIBERS = 5000
+
+def make_config():
+    from config import Config
+
+    class EventsConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_PATH}'
+        TESTING = True
+
+    return EventsConfig
+
+def read_events(response, count, events):
+    """Parse text/event-stream frames from a streamed test response into `events` until `count` arrived"""
+    buffer = b''
+    for chunk in response.response:
+        buffer += chunk
+        while b'\n\n' in buffer:
+            frame, buffer = buffer.split(b'\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in frame.decode().split('\n') if ': ' in line)
+            if 'event' in fields:
+                events.append(fields)
+        if len(events) >= count:
+            break
+    response.close()
+
+def open_stream(client, doctor_id, count, last_event_id=None):
+    """Start reading `count` events from a doctor's stream in a thread once it is subscribed"""
+    from app.slot_events import slot_events
+
+    subscribed = slot_events.subscriber_count(doctor_id)
+    headers = {'Last-Event-ID': last_event_id} if last_event_id else {}
+    response = client.get(f'/api/doctors/{doctor_id}/slot-events', headers=headers, buffered=False)
+    events = []
+    reader = threading.Thread(target=read_events, args=(response, count, events), daemon=True)
+    reader.start()
+
+    deadline = time.monotonic() + DELIVERY_TIMEOUT
+    while slot_events.subscriber_count(doctor_id) <= subscribed and reader.is_alive() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return response, reader, events
+
+def report(description, passed):
+    print(f"{'✅' if passed else '❌'} {description}")
+    return passed
+
+def check_stream():
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models import User
+    from app.principals import principal_cache
+    from app.slot_events import slot_events
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(make_config())
+    slot_events.heartbeat = 0.2
+    ok = True
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doctor = User(username='sse_doctor', email='sse_doctor@example.com', password='x',
+                      full_name='Dr. Stream', role='doctor', specialization='Cardiology')
+        patient = User(username='sse_patient', email='sse_patient@example.com', password='x',
+                       full_name='Pat Stream', role='patient')
+        db.session.add_all([doctor, patient])
+        db.session.commit()
+        doctor_id, patient_id = doctor.id, patient.id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(patient_id))}'}
+        principal_cache.clear()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = doctor_id
+
+    ok &= report('404 for a user that is not a doctor',
+                 client.get(f'/api/doctors/{patient_id}/slot-events').status_code == 404)
+
+    response, reader, events = open_stream(client, doctor_id, 5)
+    ok &= report('stream is text/event-stream', response.mimetype == 'text/event-stream')
+
+    booked = client.post('/api/appointments', headers=headers,
+                         json={'doctorId': doctor_id, 'date': '2030-03-04T10:00:00', 'type': 'checkup'})
+    appointment_id = booked.get_json()['id']
+    client.put(f'/api/appointments/{appointment_id}', headers=headers, json={'date': '2030-03-04T11:00:00'})
+    client.put(f'/api/appointments/{appointment_id}', headers=headers, json={'status': 'cancelled'})
+    client.post(f'/api/doctors/{doctor_id}/availability',
+                json={'dayOfWeek': 1, 'startTime': '09:00', 'endTime': '12:00', 'isAvailable': True})
+    reader.join(DELIVERY_TIMEOUT)
+
+    received = [(event['event'], event['data']) for event in events]
+    expected = [
+        ('slot-booked', '2030-03-04T10:00:00-06:00'),
+        ('slot-cancelled', '2030-03-04T10:00:00-06:00'),
+        ('slot-booked', '2030-03-04T11:00:00-06:00'),
+        ('slot-cancelled', '2030-03-04T11:00:00-06:00'),
+        ('availability-changed', None),
+    ]
+    print(f"Received {[name for name, _ in received]}")
+    ok &= report('book, move, cancel and availability events arrive in order',
+                 [name for name, _ in received] == [name for name, _ in expected]
+                 and all(date is None or date in data for (_, data), (_, date) in zip(received, expected)))
+    ok &= report('events carry no patient data', all('patient' not in data.lower() for _, data in received))
+
+    if len(events) == len(expected):
+        response, reader, replayed = open_stream(client, doctor_id, 4, last_event_id=events[0]['id'])
+        reader.join(DELIVERY_TIMEOUT)
+        ok &= report('reconnecting with Last-Event-ID replays the missed events',
+                     [event['id'] for event in replayed] == [event['id'] for event in events[1:]])
+
+    response, reader, resynced = open_stream(client, doctor_id, 1, last_event_id='unknown-1')
+    reader.join(DELIVERY_TIMEOUT)
+    ok &= report('an unknown Last-Event-ID gets a resync event',
+                 [event['event'] for event in resynced] == ['resync'])
+
+    time.sleep(slot_events.heartbeat * 3)
+    ok &= report('closed streams unsubscribe', slot_events.subscriber_count(doctor_id) == 0)
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    return ok
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def idle_worker(subscribers, connection):
+    """gevent worker process: park many idle subscriptions, then publish once"""
+    from gevent import monkey
+    monkey.patch_all()
+    import gevent
+    from app.slot_events import SlotEventHub
+
+    hub = SlotEventHub(heartbeat=60)
+    received = []
+
+    def subscriber(doctor_id):
+        for event in hub.subscribe(doctor_id):
+            if event is not None:
+                received.append(event)
+                return
+
+    before = rss_kb()
+    greenlets = [gevent.spawn(subscriber, index % 10) for index in range(subscribers)]
+    gevent.sleep(0.5)
+    parked = hub.subscriber_count()
+    after = rss_kb()
+
+    started = time.monotonic()
+    for doctor_id in range(10):
+        hub.publish(doctor_id, 'slot-booked', date='2030-03-04T10:00:00-06:00', duration=30)
+    gevent.joinall(greenlets, timeout=DELIVERY_TIMEOUT)
+    # A pipe rather than a Queue, whose feeder thread is a greenlet after monkey-patching
+    connection.send({
+        'parked': parked,
+        'received': len(received),
+        'kb_per_subscriber': (after - before) / subscribers,
+        'fanout_seconds': time.monotonic() - started
+    })
+
+def check_idle_subscribers(subscribers):
+    if importlib.util.find_spec('gevent') is None:
+        print("gevent is not installed; skipping the idle subscriber check")
+        return True
+
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=idle_worker, args=(subscribers, sender))
+    process.start()
+    if not receiver.poll(60):
+        process.kill()
+        return report('gevent worker reported back', False)
+    result = receiver.recv()
+    process.join(10)
+
+    print(f"{result['parked']} idle subscribers, {result['kb_per_subscriber']:.1f} KB each; "
+          f"one publish per doctor reached {result['received']} in {result['fanout_seconds'] * 1000:.0f} ms")
+    ok = report('all idle subscribers were parked', result['parked'] == subscribers)
+    ok &= report('every subscriber received its doctor\'s event', result['received'] == subscribers)
+    return ok
+
+if __name__ == "__main__":
+    subscribers = int(sys.argv[1]) if len(sys.argv) > 1 else IDLE_SUBSCRIBERS
+    ok = check_stream()
+    ok = check_idle_subscribers(subscribers) and ok
+    sys.exit(0 if ok else 1)
@@ -18,6 +18,26 @@ class Config:
     
     SQLALCHEMY_DATABASE_URI = db_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Connection pool of each worker (see app/db_pool.py): DB_POOL_SIZE kept-open connections plus
+    # up to DB_MAX_OVERFLOW more under load, waiting at most DB_POOL_TIMEOUT seconds for one,
+    # replacing connections older than DB_POOL_RECYCLE seconds and testing each before use.
+    # Postgres cancels statements running longer than DB_STATEMENT_TIMEOUT_MS (0 for no limit).
+    # SQLALCHEMY_ENGINE_OPTIONS is built from these unless a config sets it explicitly.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() != 'false'
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    
+    # Read replicas (comma-separated URLs) for the SELECTs of GET requests; a user who wrote reads
+    # from the primary for REPLICA_STICKY_SECONDS afterwards, which should exceed the replication lag
+    REPLICA_DATABASE_URLS = [
+        url.strip().replace('postgres://', 'postgresql://', 1)
+        for url in os.environ.get('REPLICA_DATABASE_URLS', '').split(',') if url.strip()
+    ]
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
@@ -26,5 +46,25 @@ class Config:
     JWT_COOKIE_CSRF_PROTECT = True
     JWT_COOKIE_SAMESITE = "Lax"
     
+    # Cross-worker cache invalidation: 'postgresql' (LISTEN/NOTIFY on the app database),
+    # a postgresql:// URL, or file:///path; unset keeps invalidation within each process
+    INVALIDATION_BUS_URL = os.environ.get('INVALIDATION_BUS_URL')
+    
+    # Password hashing: werkzeug method for new hashes (older ones are rehashed on login),
+    # processes per worker that hash off the request threads (0 hashes inline) and how many
+    # hashing jobs may wait before logins and registrations get 503
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_MAX = int(os.environ.get('PASSWORD_HASH_QUEUE_MAX', 32))
+    
+    # Per-client rate limits and load shedding on the auth and booking routes; bucket state is
+    # kept per process unless RATE_LIMIT_STORAGE_URL=shm://<name> shares it between a host's workers
+    RATE_LIMITS_ENABLED = os.environ.get('RATE_LIMITS_ENABLED', 'true').lower() != 'false'
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL')
+    
+    # Responses to booking requests sent with an Idempotency-Key, kept in the idempotency_keys
+    # table and replayed to retries (on any worker) for IDEMPOTENCY_TTL seconds
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+    
     # Server configuration
     PORT = int(os.environ.get('PORT', 5000))
\ No newline at end of file
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+Export every appointment of the clinic as NDJSON or CSV for reporting.
+Rows are streamed from a server-side cursor straight to the output, so memory use
+stays flat however large the date range is.
+
+Usage: python export_appointments.py [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--format ndjson|csv] [--output FILE]
+"""
+
+import argparse
+import os
+import sys
+
+# Manually read the .env file
+if os.path.exists('.env'):
+    with open('.env', 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+from app import create_app
+from app.appointment_export import export_query, stream_appointments, EXPORT_FORMATS, EXPORT_BATCH_SIZE
+from app.routes import filter_appointments
+
+def main():
+    parser = argparse.ArgumentParser(description='Export appointments as NDJSON or CSV')
+    parser.add_argument('--from', dest='from_date', help='First day, YYYY-MM-DD (Chicago time)')
+    parser.add_argument('--to', dest='to_date', help='Last day, YYYY-MM-DD (Chicago time, inclusive)')
+    parser.add_argument('--status', help='Comma-separated statuses to include')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+    parser.add_argument('--output', help='Output file (default: stdout)')
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE,
+                        help=f'Rows fetched per round trip (default: {EXPORT_BATCH_SIZE})')
+    args = parser.parse_args()
+
+    filters = {'from': args.from_date, 'to': args.to_date, 'status': args.status}
+
+    app = create_app()
+    with app.app_context():
+        try:
+            query = filter_appointments(export_query(), filters)
+        except ValueError:
+            print("Invalid date format. Use YYYY-MM-DD", file=sys.stderr)
+            return 1
+
+        output = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            for chunk in stream_appointments(query, args.format, args.batch_size):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
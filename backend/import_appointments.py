@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+Import historical appointments from a CSV or NDJSON file.
+Streams the file in chunks, resolving doctors and patients by id, username or email,
+and prints a summary with the errors of any rejected rows.
+
+Usage: python import_appointments.py FILE [--format csv|ndjson] [--chunk-size N]
+"""
+
+import argparse
+import os
+import sys
+
+# Manually read the .env file
+if os.path.exists('.env'):
+    with open('.env', 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+from app import create_app
+from app.appointment_import import import_appointments, IMPORT_FORMATS, IMPORT_CHUNK_SIZE
+
+def main():
+    parser = argparse.ArgumentParser(description='Import historical appointments from CSV or NDJSON')
+    parser.add_argument('file', help='Path to the CSV or NDJSON file')
+    parser.add_argument('--format', choices=IMPORT_FORMATS,
+                        help='File format (default: guessed from the file extension)')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                        help=f'Rows per bulk insert (default: {IMPORT_CHUNK_SIZE})')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.file.lower().endswith('.csv') else 'ndjson')
+
+    app = create_app()
+    with app.app_context():
+        with open(args.file, 'rb') as stream:
+            report = import_appointments(stream, fmt, chunk_size=args.chunk_size)
+
+    print(f"Processed {report.processed} rows: {report.imported} imported, {report.failed} failed")
+    for error in report.errors:
+        print(f"  line {error['line']}: {error['error']}")
+    if report.failed > len(report.errors):
+        print(f"  ... and {report.failed - len(report.errors)} more errors")
+
+    return 0 if report.failed == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
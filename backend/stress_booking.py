@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""
+Multi-threaded booking stress test.
+Many patients race to book the same few slots of a handful of doctors through
+POST /api/appointments. Verifies that no doctor ends up double-booked and reports
+bookings-per-second throughput. Also checks that malformed durations are refused with 400.
+
+Runs against a temporary SQLite file by default. Set STRESS_DATABASE_URL to a scratch
+PostgreSQL database to exercise row locking there (all tables in it are dropped).
+SQLite has no row locks, so there only bookings with the same start time are guaranteed
+to be kept apart (by the unique slot index); a pass on SQLite doesn't prove that partially
+overlapping bookings can't race. Run against PostgreSQL for that.
+
+Usage: python stress_booking.py [threads] [requests per thread]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+# The app config requires DATABASE_URL; this test always runs against its own database
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.models import User, Appointment
+from app.booking import as_utc, MAX_DURATION
+from config import Config
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'stress_booking.db')
+
+DOCTORS = 4
+SLOTS_PER_DOCTOR = 6
+
+class StressConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('STRESS_DATABASE_URL') or f'sqlite:///{DB_PATH}'
+    # Let SQLite writers wait for each other instead of failing with "database is locked"
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}} if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else {}
+    # Every thread books from the same address as fast as it can; this test is about correctness
+    RATE_LIMITS_ENABLED = False
+    TESTING = True
+
+def seed(patient_count):
+    doctors = [User(username=f'stress_doctor_{i}', email=f'stress_doctor_{i}@example.com', password='x',
+                    full_name=f'Dr. Stress {i}', role='doctor', specialization='Cardiology')
+               for i in range(DOCTORS)]
+    patients = [User(username=f'stress_patient_{i}', email=f'stress_patient_{i}@example.com', password='x',
+                     full_name=f'Stress Patient {i}', role='patient')
+                for i in range(patient_count)]
+    db.session.add_all(doctors + patients)
+    db.session.commit()
+    return [doctor.id for doctor in doctors], [patient.id for patient in patients]
+
+def worker(app, patient_id, doctor_ids, requests, results):
+    client = app.test_client()
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(patient_id))}'}
+
+    for i in range(requests):
+        doctor_id = doctor_ids[(patient_id + i) % len(doctor_ids)]
+        # 30-minute slots on one morning; durations of 30 or 60 minutes so bookings also overlap partially
+        slot = (patient_id * 7 + i) % SLOTS_PER_DOCTOR
+        hour, minute = 9 + slot // 2, 30 * (slot % 2)
+        response = client.post('/api/appointments', headers=headers, json={
+            'doctorId': doctor_id,
+            'date': f'2030-03-04T{hour:02d}:{minute:02d}:00',
+            'duration': 30 if i % 2 else 60,
+            'type': 'stress'
+        })
+        results.append(response.status_code)
+
+def check_invalid_durations(app, doctor_id, patient_id):
+    """Durations that aren't whole minutes in range are refused before any booking is attempted"""
+    client = app.test_client()
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(patient_id))}'}
+
+    ok = True
+    for duration in ('60', None, 0, 30.5, True, MAX_DURATION + 1):
+        response = client.post('/api/appointments', headers=headers, json={
+            'doctorId': doctor_id, 'date': '2030-03-05T09:00:00', 'duration': duration, 'type': 'stress'
+        })
+        if response.status_code != 400:
+            print(f"❌ duration {duration!r} answered {response.status_code} instead of 400")
+            ok = False
+    if ok:
+        print("✅ Malformed durations are refused with 400")
+    return ok
+
+def double_bookings():
+    """Return pairs of overlapping scheduled appointments of the same doctor"""
+    appointments = Appointment.query.filter_by(status='scheduled')\
+        .order_by(Appointment.doctor_id, Appointment.date).all()
+    overlaps = []
+    for previous, current in zip(appointments, appointments[1:]):
+        if previous.doctor_id != current.doctor_id:
+            continue
+        if as_utc(previous.date) + timedelta(minutes=previous.duration) > as_utc(current.date):
+            overlaps.append((previous.id, current.id))
+    return overlaps
+
+def stress_booking(threads=16, requests_per_thread=10):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    app = create_app(StressConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doctor_ids, patient_ids = seed(threads)
+
+    durations_ok = check_invalid_durations(app, doctor_ids[0], patient_ids[0])
+
+    results = []
+    workers = [threading.Thread(target=worker, args=(app, patient_id, doctor_ids, requests_per_thread, results))
+               for patient_id in patient_ids]
+
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(results)
+    with app.app_context():
+        overlaps = double_bookings()
+        booked = Appointment.query.filter_by(status='scheduled').count()
+        db.session.remove()
+        db.drop_all()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    print(f"{threads} threads x {requests_per_thread} requests in {elapsed:.2f}s")
+    print(f"Responses: {dict(statuses)}")
+    print(f"Booked: {booked}, rejected as conflicts: {statuses.get(409, 0)}")
+    print(f"Throughput: {len(results) / elapsed:.1f} booking requests/s, {booked / elapsed:.1f} bookings/s")
+
+    ok = True
+    if overlaps:
+        print(f"❌ {len(overlaps)} double-bookings: {overlaps[:10]}")
+        ok = False
+    unexpected = {status: count for status, count in statuses.items() if status not in (201, 409)}
+    if unexpected:
+        print(f"❌ Unexpected responses: {unexpected}")
+        ok = False
+    if ok:
+        print("✅ No double-bookings")
+    return ok and durations_ok
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(0 if stress_booking(*args) else 1)
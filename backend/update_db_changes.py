@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+Add the updated_at and version columns to the appointments and availability tables of
+an existing database, backfill them, and create the change feed indexes.
+Existing rows start at version 1 with updated_at set to their creation time (or now).
+Safe to run repeatedly.
+"""
+
+from datetime import datetime
+import os
+
+# Manually read the .env file
+if os.path.exists('.env'):
+    with open('.env', 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+# Index builds and backfills can run longer than the statement timeout meant for requests
+os.environ['DB_STATEMENT_TIMEOUT_MS'] = '0'
+
+from sqlalchemy import inspect, text
+from app import create_app, db
+from app.models import Appointment
+
+CHANGE_INDEXES = ('ix_appointments_doctor_updated', 'ix_appointments_patient_updated')
+
+def update_changes():
+    app = create_app()
+    with app.app_context():
+        try:
+            with db.engine.begin() as conn:
+                for table, created in (('appointments', 'created_at'), ('availability', None)):
+                    columns = [column['name'] for column in inspect(conn).get_columns(table)]
+                    if 'updated_at' not in columns:
+                        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP"))
+                        # Naive UTC like the app writes; CURRENT_TIMESTAMP would be the server's local time
+                        backfill = f"COALESCE({created}, :now)" if created else ":now"
+                        conn.execute(text(f"UPDATE {table} SET updated_at = {backfill}"), {'now': datetime.utcnow()})
+                        print(f"Added and backfilled updated_at column in {table} table")
+                    else:
+                        print(f"updated_at column already exists in {table} table")
+                    if 'version' not in columns:
+                        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+                        print(f"Added version column to {table} table")
+                    else:
+                        print(f"version column already exists in {table} table")
+
+                for index in Appointment.__table__.indexes:
+                    if index.name in CHANGE_INDEXES:
+                        # checkfirst skips indexes that already exist
+                        index.create(conn, checkfirst=True)
+                        print(f"Ensured index {index.name} on appointments")
+            print("Database updated successfully!")
+        except Exception as e:
+            print(f"Error updating database: {e}")
+            raise
+
+if __name__ == "__main__":
+    update_changes()
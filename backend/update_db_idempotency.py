@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""
+Add the idempotency_keys table, which keeps the responses to requests sent with an
+Idempotency-Key for every worker, to an existing database.
+Safe to run repeatedly.
+"""
+
+import os
+
+# Manually read the .env file
+if os.path.exists('.env'):
+    with open('.env', 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+# Index builds and backfills can run longer than the statement timeout meant for requests
+os.environ['DB_STATEMENT_TIMEOUT_MS'] = '0'
+
+from sqlalchemy import inspect
+from app import create_app, db
+from app.models import IdempotencyKey
+
+def update_idempotency():
+    app = create_app()
+    with app.app_context():
+        try:
+            if inspect(db.engine).has_table(IdempotencyKey.__tablename__):
+                print("idempotency_keys table already exists")
+            else:
+                # Creates the table with its expires_at index
+                IdempotencyKey.__table__.create(db.engine)
+                print("Created idempotency_keys table")
+            print("Database updated successfully!")
+        except Exception as e:
+            print(f"Error updating database: {e}")
+            raise
+
+if __name__ == "__main__":
+    update_idempotency()
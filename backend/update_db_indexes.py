@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""
+Add the composite scheduling indexes declared on the models to an existing database.
+Safe to run repeatedly: indexes that already exist are skipped.
+
+The unique indexes can't be created while a doctor has two scheduled appointments starting
+at the same time, or duplicate availability rows for the same day of week or date. The
+script looks for those first and stops, listing their ids, before creating any index.
+With --cancel-duplicates it cancels all but the oldest of each set of duplicate
+appointments instead; duplicate availability rows always have to be removed by hand.
+
+Usage: python update_db_indexes.py [--cancel-duplicates]
+"""
+
+from datetime import datetime
+from itertools import groupby
+import os
+import sys
+
+# Manually read the .env file
+if os.path.exists('.env'):
+    with open('.env', 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+# Index builds and backfills can run longer than the statement timeout meant for requests
+os.environ['DB_STATEMENT_TIMEOUT_MS'] = '0'
+
+from sqlalchemy import inspect, table, column, select, update, func, and_, Integer, String, DateTime, Date
+from app import create_app, db
+from app.models import User, Appointment, Availability
+
+# Indexes added on top of the original username/email indexes
+NEW_INDEXES = (
+    'ix_users_role_specialization',
+    'ix_appointments_doctor_status_date',
+    'ix_appointments_patient_date',
+    'uq_appointments_doctor_scheduled_date',
+    'ix_availability_doctor_date',
+    'ix_availability_doctor_day_date',
+    'uq_availability_doctor_weekly',
+    'uq_availability_doctor_date',
+)
+
+# Only the columns the duplicate checks need: the models also map columns that later
+# update_db_*.py scripts add, which an older database doesn't have yet
+appointments = table(
+    'appointments',
+    column('id', Integer),
+    column('doctor_id', Integer),
+    column('date', DateTime),
+    column('status', String),
+)
+availability = table(
+    'availability',
+    column('id', Integer),
+    column('doctor_id', Integer),
+    column('day_of_week', Integer),
+    column('date', Date),
+)
+
+def duplicate_ids(conn, source, keys, condition):
+    """Ids of the rows matching `condition` that share their `keys` values with another such
+    row, as one list per set of duplicates, oldest (lowest id) first"""
+    key_columns = [source.c[key] for key in keys]
+    duplicates = select(*key_columns).where(condition).group_by(*key_columns)\
+        .having(func.count() > 1).subquery()
+    rows = conn.execute(
+        select(source.c.id, *key_columns)
+        .join(duplicates, and_(*[source.c[key] == duplicates.c[key] for key in keys]))
+        .where(condition)
+        .order_by(*key_columns, source.c.id)
+    )
+    return [[row.id for row in group] for _, group in groupby(rows, key=lambda row: tuple(row[1:]))]
+
+def cancel_duplicates(conn, groups):
+    """Cancel all but the oldest appointment of each set of duplicates"""
+    extra_ids = [appointment_id for ids in groups for appointment_id in ids[1:]]
+    target, values = appointments, {'status': 'cancelled'}
+    # Once update_db_changes.py has run, let the change feed pick the cancellations up
+    if 'version' in [column['name'] for column in inspect(conn).get_columns('appointments')]:
+        target = table('appointments', column('id', Integer), column('status', String),
+                       column('version', Integer), column('updated_at', DateTime))
+        values.update(version=target.c.version + 1, updated_at=datetime.utcnow())
+    conn.execute(update(target).where(target.c.id.in_(extra_ids)).values(**values))
+    return extra_ids
+
+def update_indexes(cancel=False):
+    app = create_app()
+    with app.app_context():
+        try:
+            with db.engine.begin() as conn:
+                appointment_groups = duplicate_ids(conn, appointments, ('doctor_id', 'date'),
+                                                   appointments.c.status == 'scheduled')
+                availability_groups = duplicate_ids(conn, availability, ('doctor_id', 'day_of_week'),
+                                                    availability.c.date.is_(None))\
+                    + duplicate_ids(conn, availability, ('doctor_id', 'date'), availability.c.date.isnot(None))
+
+                if appointment_groups and cancel:
+                    cancelled = cancel_duplicates(conn, appointment_groups)
+                    print(f"Cancelled {len(cancelled)} duplicate scheduled appointments: {cancelled}")
+                elif appointment_groups:
+                    print("Scheduled appointments of the same doctor starting at the same time "
+                          "(cancel all but one, or rerun with --cancel-duplicates to keep the oldest):")
+                    for ids in appointment_groups:
+                        print(f"  appointment ids {ids}")
+                if availability_groups:
+                    print("Availability rows for the same doctor and day of week or date (remove all but one):")
+                    for ids in availability_groups:
+                        print(f"  availability ids {ids}")
+                if availability_groups or (appointment_groups and not cancel):
+                    print("No indexes were created.")
+                    # Leaving the block with an exception rolls back
+                    raise SystemExit(1)
+
+                for model in (User, Appointment, Availability):
+                    for index in model.__table__.indexes:
+                        if index.name not in NEW_INDEXES:
+                            continue
+                        # checkfirst skips indexes that already exist
+                        index.create(conn, checkfirst=True)
+                        print(f"Ensured index {index.name} on {model.__tablename__}")
+            print("Database indexes updated successfully!")
+        except Exception as e:
+            print(f"Error updating database indexes: {e}")
+            raise
+
+if __name__ == "__main__":
+    update_indexes(cancel='--cancel-duplicates' in sys.argv[1:])
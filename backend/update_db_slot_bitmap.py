@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Add the availability.slot_bitmap column to an existing database and backfill it
+from the available_slots / start_time / end_time columns.
+Safe to run repeatedly.
+"""
+
+import os
+
+# Manually read the .env file
+if os.path.exists('.env'):
+    with open('.env', 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+# Index builds and backfills can run longer than the statement timeout meant for requests
+os.environ['DB_STATEMENT_TIMEOUT_MS'] = '0'
+
+from sqlalchemy import inspect, text, table, column, select, update, bindparam, Integer, String, JSON, BigInteger
+from app import create_app, db
+from app.slot_bitmap import offered_bitmap
+
+# Rows backfilled per statement batch
+BACKFILL_BATCH = 500
+
+# Only the columns the backfill needs: the Availability model also maps columns that later
+# update_db_*.py scripts add, which an older database doesn't have yet
+availability = table(
+    'availability',
+    column('id', Integer),
+    column('start_time', String),
+    column('end_time', String),
+    column('available_slots', JSON),
+    column('slot_bitmap', BigInteger),
+)
+
+def update_slot_bitmap():
+    app = create_app()
+    with app.app_context():
+        try:
+            columns = [column['name'] for column in inspect(db.engine).get_columns('availability')]
+            if 'slot_bitmap' not in columns:
+                with db.engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE availability ADD COLUMN slot_bitmap BIGINT"))
+                print("Added slot_bitmap column to availability table")
+            else:
+                print("slot_bitmap column already exists in availability table")
+
+            set_bitmap = update(availability)\
+                .where(availability.c.id == bindparam('row_id'))\
+                .values(slot_bitmap=bindparam('bitmap'))
+            updated, last_id = 0, 0
+            while True:
+                rows = db.session.execute(
+                    select(availability.c.id, availability.c.available_slots,
+                           availability.c.start_time, availability.c.end_time)
+                    .where(availability.c.slot_bitmap.is_(None), availability.c.id > last_id)
+                    .order_by(availability.c.id)
+                    .limit(BACKFILL_BATCH)
+                ).all()
+                if not rows:
+                    break
+                db.session.execute(set_bitmap, [
+                    {'row_id': row.id, 'bitmap': offered_bitmap(row.available_slots, row.start_time, row.end_time)}
+                    for row in rows
+                ])
+                db.session.commit()
+                updated += len(rows)
+                last_id = rows[-1].id
+            print(f"Backfilled slot_bitmap for {updated} availability rows")
+            print("Database updated successfully!")
+        except Exception as e:
+            print(f"Error updating database: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    update_slot_bitmap()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+"""
+Add the users.availability_version and users.appointments_version change counters
+(used for ETags) to an existing database. Existing rows start at version 0.
+Safe to run repeatedly.
+"""
+
+import os
+
+# Manually read the .env file
+if os.path.exists('.env'):
+    with open('.env', 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+
+# Index builds and backfills can run longer than the statement timeout meant for requests
+os.environ['DB_STATEMENT_TIMEOUT_MS'] = '0'
+
+from sqlalchemy import inspect, text
+from app import create_app, db
+
+VERSION_COLUMNS = ('availability_version', 'appointments_version')
+
+def update_versions():
+    app = create_app()
+    with app.app_context():
+        try:
+            columns = [column['name'] for column in inspect(db.engine).get_columns('users')]
+            with db.engine.begin() as conn:
+                for column in VERSION_COLUMNS:
+                    if column in columns:
+                        print(f"{column} column already exists in users table")
+                        continue
+                    conn.execute(text(f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+                    print(f"Added {column} column to users table")
+            print("Database updated successfully!")
+        except Exception as e:
+            print(f"Error updating database: {e}")
+            raise
+
+if __name__ == "__main__":
+    update_versions()